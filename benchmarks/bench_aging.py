@@ -0,0 +1,76 @@
+"""Mede o aging das contas a pagar sobre uma tabela grande de contas sintéticas.
+
+Uso: python benchmarks/bench_aging.py [contas] [fornecedores]
+
+Roda contra um SQLite temporário. Para medir no PostgreSQL, defina
+BENCH_DATABASE_URL com a URL de um banco descartável.
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from sqlalchemy import insert
+from src.models.financeiro import db, ContaPagar, Fornecedor, TipoDespesa
+from src.migracoes import aplicar_migracoes
+from src.services.aging import aging_contas
+
+def popular(quantidade, fornecedores):
+    db.session.execute(insert(Fornecedor), [
+        {'razao_social': f'Fornecedor {i}', 'cnpj': f'{i:014d}'} for i in range(1, fornecedores + 1)
+    ])
+    db.session.execute(insert(TipoDespesa), [{'nome': f'Tipo {i}'} for i in range(1, 11)])
+
+    aleatorio = random.Random(42)
+    hoje = date.today()
+    status = ('PENDENTE', 'PENDENTE', 'VENCIDO', 'PAGO', 'CANCELADO')
+    for inicio in range(0, quantidade, 50000):
+        db.session.execute(insert(ContaPagar), [
+            {
+                'fornecedor_id': aleatorio.randint(1, fornecedores),
+                'tipo_despesa_id': aleatorio.randint(1, 10),
+                'descricao': f'Conta {i}',
+                'valor_original': Decimal(aleatorio.randint(1000, 500000)) / 100,
+                'data_vencimento': hoje + timedelta(days=aleatorio.randint(-200, 120)),
+                'status': aleatorio.choice(status)
+            }
+            for i in range(inicio, min(inicio + 50000, quantidade))
+        ])
+    db.session.commit()
+
+def main():
+    quantidade = int(sys.argv[1]) if len(sys.argv) > 1 else 500000
+    fornecedores = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+
+    app = Flask(__name__)
+    diretorio = tempfile.mkdtemp()
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv(
+        'BENCH_DATABASE_URL', f"sqlite:///{os.path.join(diretorio, 'bench.db')}"
+    )
+    db.init_app(app)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        aplicar_migracoes(db.engine)
+
+        inicio = time.perf_counter()
+        popular(quantidade, fornecedores)
+        print(f"{quantidade} contas, {fornecedores} fornecedores em {time.perf_counter() - inicio:.1f} s "
+              f"({app.config['SQLALCHEMY_DATABASE_URI'].split(':')[0]})")
+
+        for nome, usar_cache in (('sem cache', False), ('sem cache', False), ('cache frio', True), ('cache quente', True)):
+            inicio = time.perf_counter()
+            relatorio = aging_contas(usar_cache=usar_cache)
+            tempo = time.perf_counter() - inicio
+            print(f"{nome:<14} {tempo * 1000:>8.1f} ms   {relatorio['total']['quantidade']} contas em aberto")
+
+        db.drop_all()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""Mede a conciliação automática de extratos com 1 mil, 10 mil e 100 mil débitos.
+
+Uso: python benchmarks/bench_conciliacao.py [debitos ...]
+
+Para cada tamanho, cria um SQLite temporário com uma conta a pagar por
+débito ao longo de um ano (parte delas com valores recorrentes iguais, que
+disputam os mesmos débitos) e gera débitos a partir dessas contas, com datas
+deslocadas, valores arredondados e descrições com o nome do fornecedor
+(que inclui uma palavra comum a muitos outros) ou sem nome, mais 20% de
+débitos sem conta. Mede a carga do índice e a atribuição, e compara com a
+escolha independente por débito, que repete contas. Para medir no
+PostgreSQL, defina BENCH_DATABASE_URL com a URL de um banco descartável.
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import date, timedelta
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from flask import Flask
+from sqlalchemy import insert
+from src.models.financeiro import db, ContaPagar, Fornecedor, TipoDespesa
+from src.services import conciliacao_automatica as motor
+
+PALAVRAS = ('Alimentos', 'Transportes', 'Tecnologia', 'Papelaria', 'Energia', 'Limpeza', 'Seguros', 'Metalurgica')
+
+def popular(contas, fornecedores, aleatorio):
+    db.session.execute(insert(Fornecedor), [
+        {'razao_social': f'{aleatorio.choice(PALAVRAS)} Forn{i} Ltda', 'cnpj': f'{i:014d}'}
+        for i in range(1, fornecedores + 1)
+    ])
+    db.session.execute(insert(TipoDespesa), [{'nome': 'Geral'}])
+    recorrentes = [Decimal(valor) for valor in ('99.90', '250.00', '1000.00', '1500.00', '3200.00')]
+    for inicio in range(0, contas, 50000):
+        db.session.execute(insert(ContaPagar), [
+            {
+                'fornecedor_id': aleatorio.randint(1, fornecedores),
+                'tipo_despesa_id': 1,
+                'descricao': f'Conta {i}',
+                'valor_original': (aleatorio.choice(recorrentes) if aleatorio.random() < 0.2
+                                   else Decimal(round(10 ** aleatorio.uniform(1.3, 4.7), 2)).quantize(Decimal('0.01'))),
+                'data_vencimento': date(2025, 1, 1) + timedelta(days=aleatorio.randint(0, 364)),
+                'status': 'PENDENTE'
+            }
+            for i in range(inicio, min(inicio + 50000, contas))
+        ])
+    db.session.commit()
+
+def debitos_sinteticos(quantidade, fornecedores, aleatorio):
+    """(datas, valores, descrições, conta de origem ou None)"""
+    contas = db.session.query(ContaPagar.id, ContaPagar.valor_original, ContaPagar.data_vencimento,
+                              ContaPagar.fornecedor_id).all()
+    nomes = dict(db.session.query(Fornecedor.id, Fornecedor.razao_social).all())
+    aleatorio.shuffle(contas)
+    datas, valores, descricoes, origens = [], [], [], []
+    for i in range(quantidade):
+        if i < len(contas) and aleatorio.random() < 0.8:
+            conta_id, valor, vencimento, fornecedor_id = contas[i]
+            datas.append(vencimento + timedelta(days=aleatorio.randint(-5, 5)))
+            valores.append(-round(float(valor) * aleatorio.choice((1, 1, 1, 0.99, 1.01)), 2))
+            # O nome traz a palavra comum a 1/8 dos fornecedores ("PAG TIT ALIMENTOS FORN12")
+            nome = nomes[fornecedor_id].upper().removesuffix(' LTDA')
+            descricoes.append(f'PAG TIT {nome}' if aleatorio.random() < 0.5 else 'PAGAMENTO BOLETO')
+            origens.append(conta_id)
+        else:
+            datas.append(date(2025, 1, 1) + timedelta(days=aleatorio.randint(0, 364)))
+            valores.append(-round(10 ** aleatorio.uniform(1.3, 4.7), 2))
+            descricoes.append(f'DEB AUTOMATICO CONVENIO {aleatorio.randint(1, fornecedores * 2)}')
+            origens.append(None)
+    return datas, valores, descricoes, origens
+
+def escolha_independente(indice, datas, valores, descricoes):
+    """Cada débito com a sua aresta mais barata, sem excluir contas já escolhidas por outro"""
+    dias, centavos = motor._dias(datas), motor._centavos(valores)
+    linhas, colunas = indice.arestas(dias, centavos)
+    base = int(indice.fornecedores.max()) + 1
+    posicoes, fornecedores, notas = motor.semelhanca_fornecedores(descricoes, indice)
+    citados, unicos = np.unique(posicoes * base + fornecedores, return_index=True)
+    semelhanca = motor.semelhanca_das_arestas(citados, notas[unicos], linhas * base + indice.fornecedores[colunas])
+    linhas, colunas, _ = motor._podar(linhas, colunas, motor.custos(indice, linhas, colunas, dias, centavos, semelhanca), 1)
+    return [int(indice.ids[coluna]) for coluna in colunas]
+
+def medir(quantidade):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv(
+        'BENCH_DATABASE_URL', f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    )
+    db.init_app(app)
+    aleatorio = random.Random(42)
+    fornecedores = max(200, quantidade // 50)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        popular(quantidade, fornecedores, aleatorio)
+        datas, valores, descricoes, origens = debitos_sinteticos(quantidade, fornecedores, aleatorio)
+
+        inicio = time.perf_counter()
+        indice = motor.IndiceCandidatos.do_periodo(min(datas), max(datas))
+        carga = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        escolhas = motor.conciliar(indice, datas, valores, descricoes)
+        atribuicao = time.perf_counter() - inicio
+
+        conciliados = sum(1 for escolha in escolhas if escolha)
+        acertos = sum(1 for escolha, origem in zip(escolhas, origens) if origem and escolha == origem)
+        repetidas = sum(vezes - 1 for vezes in Counter(escolha_independente(indice, datas, valores, descricoes)).values())
+        print(f"{quantidade:>7} débitos  índice {carga * 1000:>8.1f} ms  atribuição {atribuicao * 1000:>9.1f} ms  "
+              f"{conciliados:>6} conciliados, {acertos:>6} na conta de origem "
+              f"(de {sum(1 for origem in origens if origem)}); escolha independente repete {repetidas} contas")
+        db.drop_all()
+
+def main():
+    for quantidade in [int(argumento) for argumento in sys.argv[1:]] or [1000, 10000, 100000]:
+        medir(quantidade)
+
+if __name__ == '__main__':
+    main()
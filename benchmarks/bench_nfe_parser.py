@@ -0,0 +1,107 @@
+"""Compara o parser original (ElementTree), o parser DOM (processar_xml_nfe) e o parser em streaming.
+
+O DOM e o streaming usam os mesmos esquemas de extração compilados de
+src/services/nfe_parser.py; o original é o de antes deles
+(benchmarks/nfe_parser_original.py).
+
+Uso: python benchmarks/bench_nfe_parser.py [itens] [repeticoes]
+
+Cada parser roda num subprocesso próprio e lê a nota de um arquivo, como na
+ingestão: o original e o DOM carregam os bytes e montam a árvore inteira, o
+streaming lê o arquivo aberto. O pico de memória é o aumento do RSS máximo
+(ru_maxrss) do processo durante a primeira leitura, que conta também o que o
+libxml2 aloca, invisível para o tracemalloc. No Linux o ru_maxrss de um
+processo novo parte do RSS do pai, então o processo principal só importa a
+biblioteca padrão e até a geração da nota roda num subprocesso.
+"""
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# ru_maxrss vem em KiB no Linux e em bytes no macOS
+_KIB_RSS = 1024 if sys.platform == 'darwin' else 1
+
+def _ler(caminho):
+    with open(caminho, 'rb') as arquivo:
+        return arquivo.read()
+
+def _original(caminho):
+    from nfe_parser_original import processar_xml_nfe
+    return processar_xml_nfe(_ler(caminho))
+
+def _dom(caminho):
+    from src.services.nfe_parser import processar_xml_nfe
+    return processar_xml_nfe(_ler(caminho))
+
+def _stream(caminho):
+    from src.services.nfe_parser import processar_xml_nfe_stream
+    with open(caminho, 'rb') as arquivo:
+        return processar_xml_nfe_stream(arquivo)
+
+PARSERS = {
+    'original': ('original (ElementTree)', _original),
+    'dom': ('DOM (lxml fromstring)', _dom),
+    'stream': ('streaming (lxml iterparse)', _stream),
+}
+
+def _rss_maximo_kib():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // _KIB_RSS
+
+def gerar(caminho, itens):
+    """No subprocesso: grava a nota sintética e confere que DOM e streaming extraem o mesmo"""
+    from nfe_sintetica import gerar_xml_nfe
+    with open(caminho, 'wb') as arquivo:
+        arquivo.write(gerar_xml_nfe(itens=itens, duplicatas=12, tamanho_inf_adic=200_000).encode('utf-8'))
+    assert _dom(caminho) == _stream(caminho)
+
+def executar(parser, caminho, repeticoes):
+    """No subprocesso: pico de memória da primeira leitura, depois o tempo médio"""
+    import nfe_parser_original  # noqa: F401 - as importações ficam fora da medição
+    import src.services.nfe_parser  # noqa: F401
+    _, funcao = PARSERS[parser]
+    antes = _rss_maximo_kib()
+    funcao(caminho)
+    pico = _rss_maximo_kib() - antes
+
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        funcao(caminho)
+    print(f"{(time.perf_counter() - inicio) * 1000 / repeticoes} {pico}")
+
+def _subprocesso(*argumentos):
+    return subprocess.run([sys.executable, os.path.abspath(__file__), *map(str, argumentos)],
+                          check=True, capture_output=True, text=True).stdout
+
+def medir(parser, caminho, repeticoes):
+    tempo_ms, pico = _subprocesso('--parser', parser, caminho, repeticoes).split()
+    tempo_ms, pico = float(tempo_ms), int(pico)
+    print(f"{PARSERS[parser][0]:<28} {tempo_ms:>9.2f} ms/nota   pico RSS +{pico:>8} KiB")
+    return tempo_ms
+
+def main():
+    if sys.argv[1:2] == ['--gerar']:
+        gerar(sys.argv[2], int(sys.argv[3]))
+        return
+    if sys.argv[1:2] == ['--parser']:
+        executar(sys.argv[2], sys.argv[3], int(sys.argv[4]))
+        return
+
+    itens = int(sys.argv[1]) if len(sys.argv) > 1 else 990
+    repeticoes = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho = os.path.join(pasta, 'nfe.xml')
+        _subprocesso('--gerar', caminho, itens)
+        print(f"NF-e sintética: {itens} itens, {os.path.getsize(caminho) / 1024:.0f} KiB, {repeticoes} repetições")
+        tempos = {parser: medir(parser, caminho, repeticoes) for parser in PARSERS}
+    print(f"em relação ao original: DOM {tempos['original'] / tempos['dom']:.2f}x, "
+          f"streaming {tempos['original'] / tempos['stream']:.2f}x")
+
+if __name__ == '__main__':
+    main()
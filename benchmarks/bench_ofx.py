@@ -0,0 +1,104 @@
+"""Mede a leitura em streaming de extratos OFX consolidados (várias contas, anos de histórico).
+
+Uso: python benchmarks/bench_ofx.py [transacoes ...]
+
+Gera um OFX SGML com cinco contas correntes e um cartão, com as transações
+divididas entre elas, e mede o tempo e o pico de memória (tracemalloc) de
+ler_ofx percorrendo o arquivo lote a lote (o tempo numa passada sem o
+tracemalloc, que o multiplica). Se o ofxparse estiver instalado, compara com
+OfxParser.parse, que monta o arquivo inteiro em memória, percorrendo as
+transações de todas as contas (ofx.accounts) dos dois lados, em arquivos de
+até LIMITE_OFXPARSE transações: acima disso ele leva dezenas de minutos. O
+tempo sai também por transação lida.
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.services.ofx_parser import ler_ofx
+
+CONTAS = 5
+LIMITE_OFXPARSE = 20000
+MEMORIAS = ('PAG TIT', 'PIX ENVIADO', 'TED RECEBIDA', 'PAG BOLETO', 'DEB AUT', 'TARIFA PACOTE')
+
+def gerar(caminho, quantidade, aleatorio):
+    por_extrato = quantidade // (CONTAS + 1)
+    with open(caminho, 'w', encoding='cp1252') as arquivo:
+        arquivo.write('OFXHEADER:100\nDATA:OFXSGML\nVERSION:102\nSECURITY:NONE\nENCODING:USASCII\n'
+                      'CHARSET:1252\nCOMPRESSION:NONE\nOLDFILEUID:NONE\nNEWFILEUID:NONE\n\n'
+                      '<OFX>\n<SIGNONMSGSRSV1>\n<SONRS>\n<STATUS>\n<CODE>0\n<SEVERITY>INFO\n</STATUS>\n'
+                      '<DTSERVER>20251231\n<LANGUAGE>POR\n<FI>\n<ORG>Banco Teste\n<FID>001\n</FI>\n</SONRS>\n'
+                      '</SIGNONMSGSRSV1>\n<BANKMSGSRSV1>\n')
+        for extrato in range(CONTAS + 1):
+            if extrato == CONTAS:
+                arquivo.write('</BANKMSGSRSV1>\n<CREDITCARDMSGSRSV1>\n<CCSTMTTRNRS>\n<TRNUID>1\n<CCSTMTRS>\n'
+                              '<CURDEF>BRL\n<CCACCTFROM>\n<ACCTID>5555000011112222\n</CCACCTFROM>\n')
+            else:
+                arquivo.write(f'<STMTTRNRS>\n<TRNUID>1\n<STMTRS>\n<CURDEF>BRL\n<BANKACCTFROM>\n<BANKID>001\n'
+                              f'<BRANCHID>1234\n<ACCTID>{10000 + extrato}\n<ACCTTYPE>CHECKING\n</BANKACCTFROM>\n')
+            arquivo.write('<BANKTRANLIST>\n<DTSTART>20200101\n<DTEND>20251231\n')
+            for i in range(por_extrato):
+                valor = round(10 ** aleatorio.uniform(0, 4.5), 2) * aleatorio.choice((-1, -1, -1, 1))
+                dia = date(2020, 1, 1) + timedelta(days=i * 2190 // por_extrato)
+                arquivo.write(f'<STMTTRN>\n<TRNTYPE>{"DEBIT" if valor < 0 else "CREDIT"}\n'
+                              f'<DTPOSTED>{dia:%Y%m%d}120000[-3:BRT]\n<TRNAMT>{valor:.2f}\n'
+                              f'<FITID>{extrato}{i:09d}\n<MEMO>{aleatorio.choice(MEMORIAS)} {aleatorio.randint(1, 99999)}\n'
+                              '</STMTTRN>\n')
+            arquivo.write('</BANKTRANLIST>\n<LEDGERBAL>\n<BALAMT>0.00\n<DTASOF>20251231\n</LEDGERBAL>\n')
+            arquivo.write('</CCSTMTRS>\n</CCSTMTTRNRS>\n' if extrato == CONTAS else '</STMTRS>\n</STMTTRNRS>\n')
+        arquivo.write('</CREDITCARDMSGSRSV1>\n</OFX>\n')
+
+def medido(funcao):
+    inicio = time.perf_counter()
+    resultado = funcao()
+    tempo = time.perf_counter() - inicio
+    tracemalloc.start()
+    funcao()
+    pico = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return resultado, tempo, pico
+
+def streaming(caminho):
+    contas, transacoes = set(), 0
+    for lote in ler_ofx(caminho):
+        contas.add((lote.conta.tipo, lote.conta.conta))
+        transacoes += sum(1 for _ in lote)
+    return len(contas), transacoes
+
+def ofxparse(caminho):
+    from ofxparse import OfxParser
+    with open(caminho, 'rb') as arquivo:
+        ofx = OfxParser.parse(arquivo)
+    return len(ofx.accounts), sum(len(conta.statement.transactions) for conta in ofx.accounts)
+
+def relatar(nome, transacoes, tamanho, tempo, pico, contas):
+    print(f"{transacoes:>8} transações ({tamanho:6.1f} MB)  {nome:<12} {tempo * 1000:>8.0f} ms "
+          f"({tempo * 1e6 / max(transacoes, 1):6.1f} µs/transação)  pico {pico / 2 ** 20:>7.1f} MB  {contas} contas")
+
+def medir(quantidade):
+    caminho = os.path.join(tempfile.mkdtemp(), 'extrato.ofx')
+    gerar(caminho, quantidade, random.Random(42))
+    tamanho = os.path.getsize(caminho) / 2 ** 20
+    (contas, transacoes), tempo, pico = medido(lambda: streaming(caminho))
+    relatar('ler_ofx', transacoes, tamanho, tempo, pico, contas)
+    if quantidade > LIMITE_OFXPARSE:
+        return
+    try:
+        import ofxparse as _  # noqa: F401
+    except ImportError:
+        return
+    (contas, transacoes), tempo, pico = medido(lambda: ofxparse(caminho))
+    relatar('OfxParser', transacoes, tamanho, tempo, pico, contas)
+
+def main():
+    for quantidade in [int(argumento) for argumento in sys.argv[1:]] or [10000, 100000, 1000000]:
+        medir(quantidade)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""Compara a gravação de uma NF-e objeto a objeto (ORM) com o caminho em massa.
+
+Uso: python benchmarks/bench_persistencia_nfe.py [itens] [notas]
+
+Roda contra um SQLite temporário. Para medir no PostgreSQL, defina
+BENCH_DATABASE_URL com a URL de um banco descartável.
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from flask import Flask
+from nfe_sintetica import gerar_xml_nfe
+from src.models.financeiro import db, NotaFiscal, ItemNotaFiscal, Fornecedor, ContaPagar, TipoDespesa
+from src.services.nfe_parser import processar_xml_nfe
+from src.services.nfe_persistencia import salvar_nota_fiscal
+
+def salvar_nota_fiscal_orm(dados_nfe, nome_arquivo):
+    """Caminho anterior: um objeto ORM e um INSERT por linha, com flush para obter IDs"""
+    fornecedor = Fornecedor.query.filter_by(cnpj=dados_nfe['fornecedor']['cnpj']).first()
+    if not fornecedor:
+        fornecedor = Fornecedor(**dados_nfe['fornecedor'])
+        db.session.add(fornecedor)
+        db.session.flush()
+
+    nota_fiscal = NotaFiscal(
+        numero=dados_nfe['numero'],
+        serie=dados_nfe['serie'],
+        chave_acesso=dados_nfe['chave_acesso'],
+        fornecedor_id=fornecedor.id,
+        data_emissao=dados_nfe['data_emissao'],
+        valor_total=dados_nfe['valor_total'],
+        valor_desconto=dados_nfe['valor_desconto'],
+        arquivo_xml=nome_arquivo,
+        status='PROCESSADA'
+    )
+    db.session.add(nota_fiscal)
+    db.session.flush()
+
+    for item_data in dados_nfe['itens']:
+        campos = {k: v for k, v in item_data.items() if k != 'numero_item'}
+        db.session.add(ItemNotaFiscal(nota_fiscal_id=nota_fiscal.id, **campos))
+
+    tipo_despesa = TipoDespesa.query.filter_by(nome='Fornecedores').first()
+    if not tipo_despesa:
+        tipo_despesa = TipoDespesa(nome='Fornecedores')
+        db.session.add(tipo_despesa)
+        db.session.flush()
+
+    for i, dup in enumerate(dados_nfe['duplicatas'], 1):
+        db.session.add(ContaPagar(
+            fornecedor_id=fornecedor.id,
+            tipo_despesa_id=tipo_despesa.id,
+            nota_fiscal_id=nota_fiscal.id,
+            descricao=f"NF {dados_nfe['numero']}/{dados_nfe['serie']} - Parcela {i}",
+            valor_original=dup['valor'],
+            data_vencimento=dup['data_vencimento'],
+            numero_parcela=i,
+            total_parcelas=len(dados_nfe['duplicatas']),
+            numero_documento=dup['numero'],
+            status='PENDENTE'
+        ))
+
+def medir(app, nome, funcao, notas, deslocamento):
+    with app.app_context():
+        inicio = time.perf_counter()
+        linhas = 0
+        for i, dados_nfe in enumerate(notas):
+            dados_nfe = dict(dados_nfe, chave_acesso=f"{deslocamento + i:044d}")
+            funcao(dados_nfe, 'bench.xml')
+            db.session.commit()
+            linhas += 1 + len(dados_nfe['itens']) + len(dados_nfe['duplicatas'])
+        tempo = time.perf_counter() - inicio
+    print(f"{nome:<24} {tempo * 1000 / len(notas):>8.1f} ms/nota   {linhas / tempo:>10.0f} linhas/s")
+    return tempo
+
+def main():
+    itens = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    quantidade = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    app = Flask(__name__)
+    diretorio = tempfile.mkdtemp()
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv(
+        'BENCH_DATABASE_URL', f"sqlite:///{os.path.join(diretorio, 'bench.db')}"
+    )
+    db.init_app(app)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+
+    notas = [
+        processar_xml_nfe(gerar_xml_nfe(sequencial=i, itens=itens, duplicatas=6))
+        for i in range(1, quantidade + 1)
+    ]
+    print(f"{quantidade} notas de {itens} itens, 6 duplicatas cada ({app.config['SQLALCHEMY_DATABASE_URI'].split(':')[0]})")
+
+    antes = medir(app, 'ORM (antes)', salvar_nota_fiscal_orm, notas, 0)
+    depois = medir(app, 'em massa (depois)', salvar_nota_fiscal, notas, quantidade)
+    print(f"speedup: {antes / depois:.2f}x")
+
+    with app.app_context():
+        db.drop_all()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""Mede serialização + compressão de uma página de contas a pagar (saída completa, com relações).
+
+Uso: python benchmarks/bench_respostas.py [linhas] [repeticoes]
+
+Compara o jsonify com o json padrão e com orjson, cada um sem compressão,
+com gzip e, se o pacote brotli estiver instalado, com brotli. No fim mede a
+rota GET /api/contas-pagar inteira, com os dois codificadores, contra um
+SQLite temporário.
+"""
+import os
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from sqlalchemy import insert
+from src.models.financeiro import db, ContaPagar, Fornecedor, TipoDespesa, NotaFiscal, ItemNotaFiscal
+from src.respostas import PROVEDORES, codificacoes_disponiveis, comprimir, configurar_respostas, orjson
+from src.routes.contas_pagar import contas_pagar_bp
+
+def popular(linhas):
+    db.session.execute(insert(Fornecedor), [
+        {'razao_social': f'Fornecedor {i} Comércio e Serviços Ltda', 'nome_fantasia': f'Fornecedor {i}',
+         'cnpj': f'{i:014d}', 'cidade': 'São Paulo', 'uf': 'SP', 'email': f'contato{i}@fornecedor.com.br'}
+        for i in range(1, 21)
+    ])
+    db.session.execute(insert(TipoDespesa), [{'nome': f'Tipo {i}', 'descricao': f'Despesas do tipo {i}'} for i in range(1, 6)])
+    db.session.execute(insert(NotaFiscal), [
+        {'chave_acesso': f'{i:044d}', 'numero': str(1000 + i), 'serie': '1', 'fornecedor_id': i % 20 + 1,
+         'data_emissao': date(2025, 1, 1) + timedelta(days=i), 'valor_total': Decimal('1500.00')}
+        for i in range(1, 51)
+    ])
+    db.session.execute(insert(ItemNotaFiscal), [
+        {'nota_fiscal_id': i % 50 + 1, 'codigo_produto': f'P{i}', 'descricao': f'Produto {i}', 'ncm': '84713012',
+         'cfop': '5102', 'unidade': 'UN', 'quantidade': Decimal('3'), 'valor_unitario': Decimal('100.00'),
+         'valor_total': Decimal('300.00')}
+        for i in range(1, 251)
+    ])
+    db.session.execute(insert(ContaPagar), [
+        {'fornecedor_id': i % 20 + 1, 'tipo_despesa_id': i % 5 + 1, 'nota_fiscal_id': i % 50 + 1 if i % 2 else None,
+         'descricao': f'NF {1000 + i % 50}/1 - Parcela {i % 6 + 1}', 'valor_original': Decimal('250.00') + i,
+         'data_vencimento': date(2025, 1, 1) + timedelta(days=i), 'numero_parcela': i % 6 + 1, 'total_parcelas': 6,
+         'numero_documento': f'DOC-{i}', 'status': 'PENDENTE'}
+        for i in range(linhas)
+    ])
+    db.session.commit()
+
+def medir(funcao, repeticoes):
+    funcao()  # aquecimento
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        resultado = funcao()
+    return (time.perf_counter() - inicio) * 1000 / repeticoes, resultado
+
+def main():
+    linhas = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    repeticoes = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    app.register_blueprint(contas_pagar_bp, url_prefix='/api')
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        popular(linhas)
+        pagina = {'success': True, 'data': [conta.to_dict() for conta in ContaPagar.query.limit(linhas)]}
+
+        codificadores = ['json'] + (['orjson'] if orjson else [])
+        print(f"página de {linhas} contas, {repeticoes} repetições (orjson {'instalado' if orjson else 'ausente'})")
+        print(f"{'codificador':<11} {'compressão':<10} {'serializar':>11} {'comprimir':>10} {'total':>9} {'bytes':>9}")
+        for nome in codificadores:
+            provedor = PROVEDORES[nome](app)
+            tempo_json, resposta = medir(lambda: provedor.response(pagina).get_data(), repeticoes)
+            print(f"{nome:<11} {'nenhuma':<10} {tempo_json:>8.2f} ms {'':>10} {tempo_json:>6.2f} ms {len(resposta):>9}")
+            for codificacao in codificacoes_disponiveis():
+                tempo_compressao, comprimido = medir(lambda: comprimir(resposta, codificacao), repeticoes)
+                print(f"{nome:<11} {codificacao:<10} {tempo_json:>8.2f} ms {tempo_compressao:>7.2f} ms "
+                      f"{tempo_json + tempo_compressao:>6.2f} ms {len(comprimido):>9}")
+
+    print(f"\nGET /api/contas-pagar?per_page={linhas} (consulta + serialização + gzip)")
+    for nome in codificadores:
+        app.json = PROVEDORES[nome](app)
+        if nome == codificadores[0]:
+            configurar_respostas(app, provedor=PROVEDORES[nome])
+        cliente = app.test_client()
+        tempo, resposta = medir(
+            lambda: cliente.get(f'/api/contas-pagar?per_page={linhas}', headers={'Accept-Encoding': 'gzip'}),
+            repeticoes
+        )
+        print(f"{nome:<11} {tempo:>8.2f} ms/requisição   {len(resposta.get_data()):>9} bytes ({resposta.headers.get('Content-Encoding')})")
+
+if __name__ == '__main__':
+    main()
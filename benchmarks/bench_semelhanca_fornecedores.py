@@ -0,0 +1,123 @@
+"""Mede a busca por trigramas de fornecedores citados em descrições abreviadas de extratos.
+
+Uso: python benchmarks/bench_semelhanca_fornecedores.py [fornecedores] [descricoes]
+
+Cria um SQLite temporário com fornecedores de nomes compostos (atividade,
+ramo, marca inventada, nome próprio e forma societária) e gera descrições como os bancos as
+mandam: prefixo da operação, palavras abreviadas ou omitidas e o texto
+cortado em 32 caracteres ("PAG TIT DISTRIB ALIM SAO J"). Mede a montagem
+do índice, o tempo por descrição e quantas vezes o fornecedor certo sai em
+primeiro ou entre os K_SEMELHANTES, e compara com o ILIKE '%palavra%' por
+palavra da descrição numa amostra.
+"""
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from sqlalchemy import insert, select
+from src.models.financeiro import db, Fornecedor
+from src.services.indice_fornecedores import K_SEMELHANTES, indice_fornecedores, texto_normalizado
+
+ATIVIDADES = ('Distribuidora', 'Comércio', 'Indústria', 'Transportes', 'Serviços', 'Construtora', 'Farmácia',
+              'Padaria', 'Auto Peças', 'Materiais', 'Informática', 'Papelaria', 'Supermercado', 'Metalúrgica',
+              'Gráfica', 'Laboratório', 'Atacadista', 'Confecções')
+RAMOS = ('de Alimentos', 'de Bebidas', 'Elétricos', 'Hidráulicos', 'de Construção', 'Agrícolas', 'Médicos',
+         'de Limpeza', 'Têxteis', 'de Embalagens', 'e Logística', 'de Papel', '')
+NOMES = ('São João', 'Santa Maria', 'Boa Vista', 'Nova Esperança', 'Silva', 'Souza', 'Oliveira', 'Pereira',
+         'Costa', 'Rodrigues', 'Almeida', 'Nascimento', 'Lima', 'Araújo', 'Ferreira', 'Carvalho', 'Gomes',
+         'Martins', 'Rocha', 'Ribeiro', 'Irmãos', 'Brasil', 'Paulista', 'Mineira')
+CONSOANTES = ('b', 'c', 'd', 'f', 'g', 'j', 'l', 'm', 'n', 'p', 'r', 's', 't', 'v', 'x', 'z', 'k', 'br', 'cr',
+              'dr', 'fr', 'gr', 'pr', 'tr', 'bl', 'cl', 'fl', 'pl', 'ch', 'lh', 'nh', 'qu', 'gu', 'st', 'w', 'y')
+VOGAIS = ('a', 'e', 'i', 'o', 'u', 'a', 'o', 'ai', 'ei', 'ou', 'ia', 'io')
+FINAIS = ('', '', '', 'n', 'r', 's', 'l', 'm', 'x')
+SUFIXOS = ('Ltda', 'Ltda', 'ME', 'EIRELI', 'S/A', 'EPP')
+PREFIXOS = ('PAG TIT', 'PIX ENVIADO', 'TED', 'PAG BOLETO', 'DEB AUT', 'PAGTO')
+LARGURA_DESCRICAO = 32
+
+def nome_fornecedor(aleatorio):
+    marca = ''.join(
+        aleatorio.choice(CONSOANTES) + aleatorio.choice(VOGAIS) + aleatorio.choice(FINAIS)
+        for _ in range(aleatorio.randint(2, 3))
+    ).capitalize()
+    partes = [aleatorio.choice(ATIVIDADES), aleatorio.choice(RAMOS), marca, aleatorio.choice(NOMES),
+              aleatorio.choice(SUFIXOS)]
+    return ' '.join(parte for parte in partes if parte)
+
+def descricao_bancaria(nome, aleatorio):
+    """Como o banco escreve: maiúsculas sem acento, palavras abreviadas ou omitidas, texto cortado"""
+    palavras = texto_normalizado(nome).upper().split()
+    abreviadas = [
+        palavra[:aleatorio.randint(3, 8)] for palavra in palavras
+        if aleatorio.random() < 0.85
+    ] or palavras[:1]
+    return f'{aleatorio.choice(PREFIXOS)} {" ".join(abreviadas)}'[:LARGURA_DESCRICAO]
+
+def por_ilike(descricao):
+    """Busca antiga: um ILIKE '%palavra%' na razão social por palavra com mais de 3 letras"""
+    encontrados = set()
+    for palavra in descricao.split():
+        if len(palavra) > 3:
+            encontrados.update(db.session.execute(
+                select(Fornecedor.id).where(Fornecedor.razao_social.ilike(f'%{palavra}%'))
+            ).scalars())
+    return encontrados
+
+def main():
+    quantidade = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    descricoes = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    db.init_app(app)
+    aleatorio = random.Random(42)
+    with app.app_context():
+        db.create_all()
+        nomes = [nome_fornecedor(aleatorio) for _ in range(quantidade)]
+        db.session.execute(insert(Fornecedor), [
+            {'razao_social': nome, 'cnpj': f'{i:014d}'} for i, nome in enumerate(nomes, 1)
+        ])
+        db.session.commit()
+        amostra = [aleatorio.randint(1, quantidade) for _ in range(descricoes)]
+        textos = [descricao_bancaria(nomes[fornecedor_id - 1], aleatorio) for fornecedor_id in amostra]
+
+        indice = indice_fornecedores()
+        inicio = time.perf_counter()
+        indice.semelhantes(['aquecimento'])
+        montagem = time.perf_counter() - inicio
+
+        tempos, resultados = [], []
+        for texto in textos:
+            inicio = time.perf_counter()
+            resultados.append(indice.semelhantes([texto])[0])
+            tempos.append(time.perf_counter() - inicio)
+        inicio = time.perf_counter()
+        indice.semelhantes(textos)
+        lote = time.perf_counter() - inicio
+
+        primeiro = sum(1 for certo, pares in zip(amostra, resultados) if pares and pares[0][0] == certo)
+        entre_k = sum(1 for certo, pares in zip(amostra, resultados) if certo in {i for i, _ in pares})
+        tempos.sort()
+        print(f"{quantidade} fornecedores, {descricoes} descrições (ex.: {textos[0]!r} -> {nomes[amostra[0] - 1]!r})")
+        print(f"trigramas: montagem {montagem * 1000:.0f} ms; por descrição mediana "
+              f"{statistics.median(tempos) * 1000:.3f} ms, p95 {tempos[int(len(tempos) * 0.95)] * 1000:.3f} ms; "
+              f"lote {lote * 1000 / descricoes:.3f} ms/descrição")
+        print(f"           fornecedor certo em 1º: {primeiro / descricoes:.1%}, "
+              f"entre os {K_SEMELHANTES}: {entre_k / descricoes:.1%}")
+
+        amostra_ilike = list(zip(amostra, textos))[:100]
+        inicio = time.perf_counter()
+        achados = [por_ilike(texto) for _, texto in amostra_ilike]
+        tempo_ilike = time.perf_counter() - inicio
+        acertos = sum(1 for (certo, _), ids in zip(amostra_ilike, achados) if certo in ids)
+        print(f"ILIKE por palavra ({len(amostra_ilike)} descrições): {tempo_ilike * 1000 / len(amostra_ilike):.1f} ms/descrição, "
+              f"fornecedor certo entre os achados: {acertos / len(amostra_ilike):.1%}, "
+              f"{statistics.mean(len(ids) for ids in achados):.0f} fornecedores achados em média")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,180 @@
+"""Parser de NF-e original (xml.etree.ElementTree, documento inteiro em memória),
+antes do parser em streaming e dos esquemas compilados: linha de base de
+benchmarks/bench_nfe_parser.py.
+"""
+import xml.etree.ElementTree as ET
+from datetime import datetime
+import re
+from decimal import Decimal
+
+def processar_xml_nfe(xml_content):
+    """Processa XML da NFe e extrai dados relevantes"""
+    try:
+        # Parse do XML
+        root = ET.fromstring(xml_content)
+        
+        # Namespace da NFe
+        ns = {'nfe': 'http://www.portalfiscal.inf.br/nfe'}
+        
+        # Busca o elemento infNFe
+        inf_nfe = root.find('.//nfe:infNFe', ns)
+        if inf_nfe is None:
+            raise ValueError("XML inválido: elemento infNFe não encontrado")
+        
+        # Dados da identificação
+        ide = inf_nfe.find('nfe:ide', ns)
+        numero = ide.find('nfe:nNF', ns).text if ide.find('nfe:nNF', ns) is not None else ''
+        serie = ide.find('nfe:serie', ns).text if ide.find('nfe:serie', ns) is not None else ''
+        data_emissao_str = ide.find('nfe:dhEmi', ns).text if ide.find('nfe:dhEmi', ns) is not None else ''
+        natureza_operacao = ide.find('nfe:natOp', ns).text if ide.find('nfe:natOp', ns) is not None else ''
+        
+        # Converte data de emissão
+        data_emissao = None
+        if data_emissao_str:
+            try:
+                # Remove timezone se presente
+                data_emissao_str = data_emissao_str.split('-03:00')[0].split('+')[0]
+                data_emissao = datetime.fromisoformat(data_emissao_str.replace('T', ' '))
+            except:
+                pass
+        
+        # Chave de acesso
+        chave_acesso = inf_nfe.get('Id', '').replace('NFe', '')
+        
+        # Dados do emitente (fornecedor)
+        emit = inf_nfe.find('nfe:emit', ns)
+        cnpj_emit = emit.find('nfe:CNPJ', ns).text if emit.find('nfe:CNPJ', ns) is not None else ''
+        razao_social_emit = emit.find('nfe:xNome', ns).text if emit.find('nfe:xNome', ns) is not None else ''
+        nome_fantasia_emit = emit.find('nfe:xFant', ns).text if emit.find('nfe:xFant', ns) is not None else ''
+        ie_emit = emit.find('nfe:IE', ns).text if emit.find('nfe:IE', ns) is not None else ''
+        
+        # Endereço do emitente
+        endereco_emit = emit.find('nfe:enderEmit', ns)
+        endereco_completo = ''
+        cidade = ''
+        uf = ''
+        cep = ''
+        telefone = ''
+        
+        if endereco_emit is not None:
+            logradouro = endereco_emit.find('nfe:xLgr', ns).text if endereco_emit.find('nfe:xLgr', ns) is not None else ''
+            numero_end = endereco_emit.find('nfe:nro', ns).text if endereco_emit.find('nfe:nro', ns) is not None else ''
+            complemento = endereco_emit.find('nfe:xCpl', ns).text if endereco_emit.find('nfe:xCpl', ns) is not None else ''
+            bairro = endereco_emit.find('nfe:xBairro', ns).text if endereco_emit.find('nfe:xBairro', ns) is not None else ''
+            cidade = endereco_emit.find('nfe:xMun', ns).text if endereco_emit.find('nfe:xMun', ns) is not None else ''
+            uf = endereco_emit.find('nfe:UF', ns).text if endereco_emit.find('nfe:UF', ns) is not None else ''
+            cep = endereco_emit.find('nfe:CEP', ns).text if endereco_emit.find('nfe:CEP', ns) is not None else ''
+            telefone = endereco_emit.find('nfe:fone', ns).text if endereco_emit.find('nfe:fone', ns) is not None else ''
+            
+            endereco_completo = f"{logradouro}, {numero_end}"
+            if complemento:
+                endereco_completo += f", {complemento}"
+            if bairro:
+                endereco_completo += f", {bairro}"
+        
+        # Formatar CNPJ
+        cnpj_formatado = ''
+        if cnpj_emit:
+            cnpj_limpo = re.sub(r'[^0-9]', '', cnpj_emit)
+            if len(cnpj_limpo) == 14:
+                cnpj_formatado = f"{cnpj_limpo[:2]}.{cnpj_limpo[2:5]}.{cnpj_limpo[5:8]}/{cnpj_limpo[8:12]}-{cnpj_limpo[12:14]}"
+        
+        # Totais da nota
+        total = inf_nfe.find('nfe:total/nfe:ICMSTot', ns)
+        valor_total = Decimal('0')
+        valor_desconto = Decimal('0')
+        valor_liquido = Decimal('0')
+        
+        if total is not None:
+            valor_total_elem = total.find('nfe:vNF', ns)
+            valor_desconto_elem = total.find('nfe:vDesc', ns)
+            
+            if valor_total_elem is not None:
+                valor_total = Decimal(valor_total_elem.text)
+                valor_liquido = valor_total
+            
+            if valor_desconto_elem is not None:
+                valor_desconto = Decimal(valor_desconto_elem.text)
+        
+        # Itens da nota
+        itens = []
+        detalhes = inf_nfe.findall('nfe:det', ns)
+        
+        for det in detalhes:
+            numero_item = int(det.get('nItem', 0))
+            prod = det.find('nfe:prod', ns)
+            
+            if prod is not None:
+                codigo_produto = prod.find('nfe:cProd', ns).text if prod.find('nfe:cProd', ns) is not None else ''
+                descricao = prod.find('nfe:xProd', ns).text if prod.find('nfe:xProd', ns) is not None else ''
+                ncm = prod.find('nfe:NCM', ns).text if prod.find('nfe:NCM', ns) is not None else ''
+                cfop = prod.find('nfe:CFOP', ns).text if prod.find('nfe:CFOP', ns) is not None else ''
+                unidade = prod.find('nfe:uCom', ns).text if prod.find('nfe:uCom', ns) is not None else ''
+                quantidade = Decimal(prod.find('nfe:qCom', ns).text) if prod.find('nfe:qCom', ns) is not None else Decimal('0')
+                valor_unitario = Decimal(prod.find('nfe:vUnCom', ns).text) if prod.find('nfe:vUnCom', ns) is not None else Decimal('0')
+                valor_total_item = Decimal(prod.find('nfe:vProd', ns).text) if prod.find('nfe:vProd', ns) is not None else Decimal('0')
+                valor_desconto_item = Decimal(prod.find('nfe:vDesc', ns).text) if prod.find('nfe:vDesc', ns) is not None else Decimal('0')
+                
+                itens.append({
+                    'numero_item': numero_item,
+                    'codigo_produto': codigo_produto,
+                    'descricao': descricao,
+                    'ncm': ncm,
+                    'cfop': cfop,
+                    'unidade': unidade,
+                    'quantidade': quantidade,
+                    'valor_unitario': valor_unitario,
+                    'valor_total': valor_total_item,
+                    'valor_desconto': valor_desconto_item
+                })
+        
+        # Dados de cobrança (duplicatas)
+        duplicatas = []
+        cobr = inf_nfe.find('nfe:cobr', ns)
+        if cobr is not None:
+            dups = cobr.findall('nfe:dup', ns)
+            for dup in dups:
+                numero_dup = dup.find('nfe:nDup', ns).text if dup.find('nfe:nDup', ns) is not None else ''
+                data_venc_str = dup.find('nfe:dVenc', ns).text if dup.find('nfe:dVenc', ns) is not None else ''
+                valor_dup = Decimal(dup.find('nfe:vDup', ns).text) if dup.find('nfe:vDup', ns) is not None else Decimal('0')
+                
+                data_vencimento = None
+                if data_venc_str:
+                    try:
+                        data_vencimento = datetime.strptime(data_venc_str, '%Y-%m-%d').date()
+                    except:
+                        pass
+                
+                duplicatas.append({
+                    'numero': numero_dup,
+                    'data_vencimento': data_vencimento,
+                    'valor': valor_dup
+                })
+        
+        return {
+            'numero': numero,
+            'serie': serie,
+            'chave_acesso': chave_acesso,
+            'data_emissao': data_emissao,
+            'natureza_operacao': natureza_operacao,
+            'valor_total': valor_total,
+            'valor_desconto': valor_desconto,
+            'valor_liquido': valor_liquido,
+            'fornecedor': {
+                'cnpj': cnpj_formatado,
+                'razao_social': razao_social_emit,
+                'nome_fantasia': nome_fantasia_emit,
+                'endereco': endereco_completo,
+                'cidade': cidade,
+                'uf': uf,
+                'cep': cep,
+                'telefone': telefone,
+                'inscricao_estadual': ie_emit
+            },
+            'itens': itens,
+            'duplicatas': duplicatas
+        }
+        
+    except Exception as e:
+        raise ValueError(f"Erro ao processar XML: {str(e)}")
+
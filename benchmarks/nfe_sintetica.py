@@ -0,0 +1,41 @@
+"""Gerador de XMLs de NF-e sintéticos usados pelos benchmarks"""
+
+def chave_acesso(sequencial):
+    return f"3526091234567800019555001{sequencial:09d}1234567890"[:44]
+
+def _item(n):
+    valor = n * 10.5
+    return (
+        f'<det nItem="{n}"><prod><cProd>P{n:05d}</cProd><cEAN/>'
+        f'<xProd>PRODUTO DE TESTE NUMERO {n}</xProd><NCM>22021000</NCM><CFOP>5102</CFOP>'
+        f'<uCom>UN</uCom><qCom>{n}.0000</qCom><vUnCom>10.5000</vUnCom><vProd>{valor:.2f}</vProd>'
+        f'<vDesc>0.50</vDesc></prod><imposto><ICMS><ICMS00><orig>0</orig><CST>00</CST>'
+        f'<vBC>{valor:.2f}</vBC><pICMS>18.00</pICMS><vICMS>1.89</vICMS></ICMS00></ICMS>'
+        f'<IPI><IPITrib><vIPI>0.50</vIPI></IPITrib></IPI><PIS><PISAliq><vPIS>0.17</vPIS></PISAliq></PIS>'
+        f'<COFINS><COFINSAliq><vCOFINS>0.80</vCOFINS></COFINSAliq></COFINS></imposto></det>'
+    )
+
+def gerar_xml_nfe(sequencial=1, itens=3, duplicatas=2, tamanho_inf_adic=0, cnpj='12345678000195'):
+    """Monta um nfeProc 4.00 com o número de itens e duplicatas pedido"""
+    dups = ''.join(
+        f'<dup><nDup>{j:03d}</nDup><dVenc>2026-{(j - 1) % 12 + 1:02d}-15</dVenc><vDup>100.00</vDup></dup>'
+        for j in range(1, duplicatas + 1)
+    )
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<nfeProc xmlns="http://www.portalfiscal.inf.br/nfe" versao="4.00"><NFe>'
+        f'<infNFe Id="NFe{chave_acesso(sequencial)}" versao="4.00">'
+        f'<ide><cUF>35</cUF><natOp>VENDA DE MERCADORIA</natOp><serie>1</serie><nNF>{sequencial}</nNF>'
+        '<dhEmi>2026-09-10T10:00:00-03:00</dhEmi></ide>'
+        f'<emit><CNPJ>{cnpj}</CNPJ><xNome>DISTRIBUIDORA DE ALIMENTOS SÃO JOSÉ LTDA</xNome>'
+        '<xFant>SÃO JOSÉ</xFant><enderEmit><xLgr>RUA DAS FLORES</xLgr><nro>100</nro>'
+        '<xBairro>CENTRO</xBairro><xMun>SAO PAULO</xMun><UF>SP</UF><CEP>01000000</CEP>'
+        '<fone>1133334444</fone></enderEmit><IE>111111111111</IE></emit>'
+        + ''.join(_item(n) for n in range(1, itens + 1)) +
+        '<total><ICMSTot><vBC>0.00</vBC><vICMS>18.90</vICMS><vST>0.00</vST><vProd>200.00</vProd>'
+        '<vFrete>5.00</vFrete><vSeg>1.00</vSeg><vDesc>2.00</vDesc><vIPI>3.00</vIPI><vPIS>1.10</vPIS>'
+        '<vCOFINS>5.10</vCOFINS><vOutro>0.00</vOutro><vNF>200.00</vNF></ICMSTot></total>'
+        f'<cobr><fat><nFat>{sequencial}</nFat></fat>{dups}</cobr>'
+        f'<infAdic><infCpl>{"OBSERVACAO " * (tamanho_inf_adic // 11)}</infCpl></infAdic>'
+        '</infNFe></NFe></nfeProc>'
+    )
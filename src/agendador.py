@@ -0,0 +1,149 @@
+"""Agendador das tarefas periódicas do sistema.
+
+Cada tarefa roda na inicialização e depois uma vez por dia, no horário
+configurado (hora local). A duração e as linhas afetadas de cada execução
+ficam registradas na tabela execucoes_tarefas.
+
+Uso:
+    python -m src.agendador                    # processo próprio, até SIGTERM/SIGINT
+    python -m src.agendador --uma-vez          # roda as tarefas e sai (para cron)
+    python -m src.agendador --horario 02:30
+
+Dentro da aplicação, src/main.py liga o agendador em segundo plano quando
+AGENDADOR_TAREFAS=1 ou ao rodar o servidor de desenvolvimento.
+"""
+import os
+import sys
+
+# DON'T CHANGE THIS !!!
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import argparse
+import logging
+import signal
+import threading
+import time
+from datetime import datetime, timedelta
+
+logger = logging.getLogger('agendador')
+
+HORARIO_PADRAO = '00:05'
+
+def _contas_vencidas():
+    from src.services.vencimentos import marcar_contas_vencidas
+    return marcar_contas_vencidas()
+
+# Nome -> função que roda a tarefa sem commit e retorna as linhas afetadas
+TAREFAS = {
+    'contas_vencidas': _contas_vencidas,
+}
+
+def executar_tarefa(nome, origem='AGENDADOR'):
+    """Roda a tarefa `nome` em sua própria transação e registra a execução; retorna o ExecucaoTarefa"""
+    from src.models.financeiro import db, ExecucaoTarefa
+
+    inicio = datetime.utcnow()
+    cronometro = time.perf_counter()
+    try:
+        linhas_afetadas = TAREFAS[nome]()
+        db.session.commit()
+        status, mensagem = 'SUCESSO', None
+    except Exception as e:
+        db.session.rollback()
+        linhas_afetadas, status, mensagem = None, 'ERRO', str(e)
+    duracao_ms = int((time.perf_counter() - cronometro) * 1000)
+
+    execucao = ExecucaoTarefa(
+        tarefa=nome,
+        origem=origem,
+        status=status,
+        inicio=inicio,
+        duracao_ms=duracao_ms,
+        linhas_afetadas=linhas_afetadas,
+        mensagem=mensagem
+    )
+    db.session.add(execucao)
+    db.session.commit()
+
+    if status == 'SUCESSO':
+        logger.info("%s: %s linhas em %d ms", nome, linhas_afetadas, duracao_ms)
+    else:
+        logger.error("%s falhou após %d ms: %s", nome, duracao_ms, mensagem)
+    return execucao
+
+def interpretar_horario(horario):
+    """'HH:MM' -> (hora, minuto)"""
+    try:
+        hora, minuto = (int(parte) for parte in horario.split(':'))
+    except ValueError:
+        raise ValueError(f'Horário inválido: {horario!r} (use HH:MM)')
+    if not (0 <= hora < 24 and 0 <= minuto < 60):
+        raise ValueError(f'Horário inválido: {horario!r} (use HH:MM)')
+    return hora, minuto
+
+def proxima_execucao(horario, agora):
+    hora, minuto = horario
+    alvo = agora.replace(hour=hora, minute=minuto, second=0, microsecond=0)
+    if alvo <= agora:
+        alvo += timedelta(days=1)
+    return alvo
+
+class Agendador:
+    def __init__(self, app, horario=HORARIO_PADRAO):
+        self.app = app
+        self.horario = interpretar_horario(horario)
+        self.parar = threading.Event()
+
+    def rodar_tarefas(self):
+        from src.models.financeiro import db
+
+        for nome in TAREFAS:
+            try:
+                executar_tarefa(nome)
+            except Exception as e:
+                # Nem o registro da execução foi gravado (banco fora do ar): tenta no próximo horário
+                db.session.rollback()
+                logger.error("%s: não foi possível registrar a execução: %s", nome, e)
+        db.session.remove()
+
+    def executar(self, uma_vez=False):
+        with self.app.app_context():
+            while not self.parar.is_set():
+                self.rodar_tarefas()
+                if uma_vez:
+                    break
+                alvo = proxima_execucao(self.horario, datetime.now())
+                logger.info("Próxima execução em %s", alvo.strftime('%Y-%m-%d %H:%M'))
+                self.parar.wait((alvo - datetime.now()).total_seconds())
+
+    def iniciar_em_segundo_plano(self):
+        thread = threading.Thread(target=self.executar, name='agendador', daemon=True)
+        thread.start()
+        return thread
+
+    def encerrar(self, *_):
+        logger.info("Encerrando agendador...")
+        self.parar.set()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Agendador das tarefas diárias')
+    parser.add_argument('--horario', default=os.getenv('AGENDADOR_HORARIO', HORARIO_PADRAO), help='Horário diário (HH:MM)')
+    parser.add_argument('--uma-vez', action='store_true', help='Roda as tarefas uma vez e sai')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+    try:
+        interpretar_horario(args.horario)
+    except ValueError as e:
+        parser.error(str(e))
+
+    from src.main import app
+
+    agendador = Agendador(app, args.horario)
+    signal.signal(signal.SIGTERM, agendador.encerrar)
+    signal.signal(signal.SIGINT, agendador.encerrar)
+    agendador.executar(uma_vez=args.uma_vez)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,418 @@
+"""Ingestão por pastas monitoradas (hot folders) de NF-e, extratos OFX e comprovantes.
+
+Uso:
+    python -m src.ingestao --nfe /dados/erp/nfe --ofx /dados/erp/ofx --comprovantes /dados/comprovantes
+
+Cada pasta monitorada tem o ciclo de vida:
+
+    <pasta>/                  arquivos novos (depositados pelo ERP)
+    <pasta>/.reivindicados/   reivindicados por este processo (rename atômico)
+    <pasta>/.processando/     em processamento
+    <pasta>/processados/      gravados no banco (ou duplicados)
+    <pasta>/erros/            falharam; o motivo fica em <arquivo>.erro.txt
+
+Ao entrar em .processando/ o arquivo já reserva o seu nome em processados/
+(um arquivo vazio criado com O_EXCL; com sufixo se o nome já existir), então
+o caminho final gravado no banco é exatamente onde ele vai ficar.
+O arquivo só sai de .processando/ depois do commit, e o hash de cada arquivo
+gravado vai para a tabela arquivos_ingeridos na mesma transação dos dados.
+Ao reiniciar, .reivindicados/ volta para a entrada e cada arquivo em
+.processando/ é concluído (se o hash já está no diário) ou reprocessado:
+nenhum arquivo se perde e nenhum é gravado duas vezes.
+
+Usa inotify (pacote watchdog) quando disponível; sem ele, faz polling.
+"""
+import os
+import sys
+
+# DON'T CHANGE THIS !!!
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import argparse
+import hashlib
+import logging
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import closing
+
+logger = logging.getLogger('ingestao')
+
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:  # pragma: no cover - dependência opcional
+    Observer = None
+    FileSystemEventHandler = object
+
+EXTENSOES = {
+    'NFE': ('.xml',),
+    'OFX': ('.ofx', '.qfx'),
+    'COMPROVANTE': ('.png', '.jpg', '.jpeg', '.pdf'),
+}
+
+# Sufixos usados por quem ainda está escrevendo o arquivo
+SUFIXOS_TEMPORARIOS = ('.tmp', '.part', '.partial', '.crdownload')
+
+def hash_arquivo(caminho):
+    sha256 = hashlib.sha256()
+    with open(caminho, 'rb') as arquivo:
+        for bloco in iter(lambda: arquivo.read(1024 * 1024), b''):
+            sha256.update(bloco)
+    return sha256.hexdigest()
+
+def _mover(origem, pasta_destino):
+    """Move para a pasta sem sobrescrever: acrescenta um sufixo se o nome já existir"""
+    nome = os.path.basename(origem)
+    destino = os.path.join(pasta_destino, nome)
+    if os.path.exists(destino):
+        base, extensao = os.path.splitext(nome)
+        destino = os.path.join(pasta_destino, f"{base}_{int(time.time() * 1000)}{extensao}")
+    os.replace(origem, destino)
+    return destino
+
+def _reservar(pasta_destino, nome):
+    """Cria vazio, com O_EXCL, um nome livre em `pasta_destino` e devolve o nome reservado"""
+    base, extensao = os.path.splitext(nome)
+    candidato = nome
+    while True:
+        try:
+            os.close(os.open(os.path.join(pasta_destino, candidato), os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            return candidato
+        except FileExistsError:
+            candidato = f"{base}_{time.time_ns() // 1000}{extensao}"
+
+class PastaMonitorada:
+    def __init__(self, tipo, caminho):
+        self.tipo = tipo
+        self.entrada = os.path.abspath(caminho)
+        self.reivindicados = os.path.join(self.entrada, '.reivindicados')
+        self.processando = os.path.join(self.entrada, '.processando')
+        self.processados = os.path.join(self.entrada, 'processados')
+        self.erros = os.path.join(self.entrada, 'erros')
+
+    def preparar(self):
+        for pasta in (self.entrada, self.reivindicados, self.processando, self.processados, self.erros):
+            os.makedirs(pasta, exist_ok=True)
+
+    def recuperar(self, ja_ingerido):
+        """Retoma o estado após uma parada no meio do ciclo"""
+        for nome in os.listdir(self.reivindicados):
+            os.replace(os.path.join(self.reivindicados, nome), os.path.join(self.entrada, nome))
+            logger.info("[%s] %s devolvido à entrada", self.tipo, nome)
+
+        for nome in os.listdir(self.processando):
+            caminho = os.path.join(self.processando, nome)
+            if ja_ingerido(hash_arquivo(caminho)):
+                self.concluir(caminho)
+                logger.info("[%s] %s já estava gravado; concluído", self.tipo, nome)
+            else:
+                self._liberar(caminho)
+                os.replace(caminho, os.path.join(self.entrada, nome))
+                logger.info("[%s] %s será reprocessado", self.tipo, nome)
+
+    def arquivos_prontos(self, estabilizacao):
+        """Arquivos da entrada sem alteração há `estabilizacao` segundos"""
+        agora = time.time()
+        prontos = []
+        with os.scandir(self.entrada) as entradas:
+            for entrada in entradas:
+                if not entrada.is_file() or entrada.name.startswith('.'):
+                    continue
+                if entrada.name.lower().endswith(SUFIXOS_TEMPORARIOS):
+                    continue
+                if agora - entrada.stat().st_mtime < estabilizacao:
+                    continue
+                prontos.append(entrada.name)
+        return sorted(prontos)
+
+    def reivindicar(self, nome):
+        """Rename atômico para .reivindicados/; None se outro processo chegou antes"""
+        destino = os.path.join(self.reivindicados, nome)
+        try:
+            os.rename(os.path.join(self.entrada, nome), destino)
+        except FileNotFoundError:
+            return None
+        return destino
+
+    def iniciar(self, caminho):
+        """Move para .processando/ com o nome já reservado em processados/"""
+        nome = _reservar(self.processados, os.path.basename(caminho))
+        destino = os.path.join(self.processando, nome)
+        os.replace(caminho, destino)
+        return destino
+
+    def destino_final(self, caminho):
+        """Onde o arquivo em .processando/ ficará depois de concluído (a reserva feita em iniciar)"""
+        return os.path.join(self.processados, os.path.basename(caminho))
+
+    def _liberar(self, caminho):
+        """Desfaz a reserva em processados/ de um arquivo de .processando/ que não vai para lá"""
+        if os.path.dirname(caminho) != self.processando:
+            return
+        reserva = self.destino_final(caminho)
+        if os.path.isfile(reserva) and os.path.getsize(reserva) == 0:
+            os.remove(reserva)
+
+    def concluir(self, caminho):
+        destino = self.destino_final(caminho)
+        if os.path.isfile(destino) and os.path.getsize(destino):
+            # Sem reserva (arquivo deixado em .processando/ por uma versão anterior)
+            return _mover(caminho, self.processados)
+        os.replace(caminho, destino)
+        return destino
+
+    def falhar(self, caminho, motivo):
+        self._liberar(caminho)
+        destino = _mover(caminho, self.erros)
+        with open(destino + '.erro.txt', 'w', encoding='utf-8') as arquivo:
+            arquivo.write(motivo)
+        return destino
+
+class _Despertador(FileSystemEventHandler):
+    def __init__(self, evento):
+        self.evento = evento
+
+    def on_any_event(self, event):
+        self.evento.set()
+
+# Etapas por tipo: `ler` roda nas threads (sem banco), `gravar` na thread principal.
+# O extrato OFX não cabe inteiro em memória: `ler` valida o começo e `gravar`
+# consome o gerador de lotes, um lote por vez.
+
+def _ler_nfe(caminho):
+    from src.services.nfe_parser import processar_xml_nfe_stream
+    with open(caminho, 'rb') as arquivo:
+        return processar_xml_nfe_stream(arquivo)
+
+def _gravar_nfe(caminho, dados_nfe, hash_sha256):
+    from src.services.nfe_persistencia import salvar_nota_fiscal
+    from src.services.nfe_duplicidade import indice_duplicidade
+
+    nota_existente_id = indice_duplicidade.buscar(dados_nfe['chave_acesso'], hash_sha256)
+    if nota_existente_id:
+        return 'DUPLICADO', f'Nota fiscal já cadastrada (ID {nota_existente_id})'
+    nota_fiscal_id, contas_ids = salvar_nota_fiscal(dados_nfe, os.path.basename(caminho), hash_sha256)
+    indice_duplicidade.registrar(dados_nfe['chave_acesso'], hash_sha256)
+    return 'PROCESSADO', f'Nota fiscal {nota_fiscal_id} importada ({len(contas_ids)} contas a pagar)'
+
+def _ler_ofx(caminho):
+    """Lê só o primeiro lote; o resto do arquivo é lido lote a lote durante a gravação"""
+    from src.services.ofx_parser import ler_ofx
+    lotes = ler_ofx(caminho)
+    primeiro = next(lotes, None)
+    if primeiro is None:
+        raise ValueError('Nenhuma transação encontrada no arquivo OFX')
+    return _continuar(primeiro, lotes)
+
+def _continuar(primeiro, lotes):
+    with closing(lotes):
+        yield primeiro
+        yield from lotes
+
+def _gravar_ofx(caminho, lotes, hash_sha256):
+    from src.routes.conciliacao import importar_transacoes_extrato
+    with closing(lotes):
+        resumo = importar_transacoes_extrato(lotes, os.path.basename(caminho))
+    return 'PROCESSADO', (f"{resumo['transacoes_importadas']} transações importadas de {len(resumo['contas'])} conta(s), "
+                          f"{resumo['conciliacoes_automaticas']} conciliações automáticas")
+
+def _ler_comprovante(caminho):
+    from src.routes.comprovantes import extract_text_from_image
+    return extract_text_from_image(caminho)
+
+def _gravar_comprovante(caminho, texto_ocr, hash_sha256, caminho_final=None):
+    from src.routes.comprovantes import registrar_comprovante
+    comprovante, _ = registrar_comprovante(os.path.basename(caminho), caminho_final or caminho, texto_ocr)
+    return 'PROCESSADO', f'Comprovante {comprovante.status_ocr}'
+
+ETAPAS = {
+    'NFE': (_ler_nfe, _gravar_nfe),
+    'OFX': (_ler_ofx, _gravar_ofx),
+    'COMPROVANTE': (_ler_comprovante, _gravar_comprovante),
+}
+
+class Ingestor:
+    def __init__(self, app, pastas, workers=4, lote=20, intervalo=5.0, estabilizacao=2.0):
+        self.app = app
+        self.pastas = pastas
+        self.workers = workers
+        self.lote = lote
+        self.intervalo = intervalo
+        self.estabilizacao = estabilizacao
+        self.despertar = threading.Event()
+        self.parar = threading.Event()
+
+    def _ja_ingerido(self, hash_sha256):
+        from src.models.financeiro import db, ArquivoIngerido
+        return db.session.query(ArquivoIngerido.id).filter_by(hash_sha256=hash_sha256).first() is not None
+
+    def _registrar(self, pasta, caminho, hash_sha256, status, mensagem):
+        from src.models.financeiro import db, ArquivoIngerido
+        db.session.add(ArquivoIngerido(
+            hash_sha256=hash_sha256,
+            tipo=pasta.tipo,
+            nome_arquivo=os.path.basename(caminho),
+            status=status,
+            mensagem=mensagem
+        ))
+
+    def _gravar(self, pasta, caminho, dados, hash_sha256):
+        """Grava um arquivo lido em um savepoint; devolve (status, mensagem) ou lança a falha"""
+        from src.models.financeiro import db
+
+        _, gravar = ETAPAS[pasta.tipo]
+        if self._ja_ingerido(hash_sha256):
+            # Cópia idêntica gravada por outro arquivo deste mesmo ciclo
+            return 'DUPLICADO', 'Arquivo idêntico já ingerido'
+        with db.session.begin_nested():
+            if pasta.tipo == 'COMPROVANTE':
+                # O comprovante aponta para onde o arquivo ficará depois de concluído
+                caminho_final = pasta.destino_final(caminho)
+                status, mensagem = gravar(caminho, dados, hash_sha256, caminho_final)
+            else:
+                status, mensagem = gravar(caminho, dados, hash_sha256)
+            self._registrar(pasta, caminho, hash_sha256, status, mensagem)
+        return status, mensagem
+
+    def _commit(self, pendentes):
+        """Commit do lote e só então move os arquivos para processados/"""
+        from src.models.financeiro import db
+        try:
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error("Falha no commit do lote: %s", e)
+            for pasta, caminho, _ in pendentes:
+                pasta.falhar(caminho, f'Erro ao gravar: {e}')
+        else:
+            for pasta, caminho, mensagem in pendentes:
+                pasta.concluir(caminho)
+                logger.info("[%s] %s: %s", pasta.tipo, os.path.basename(caminho), mensagem)
+        pendentes.clear()
+
+    def ciclo(self, executor):
+        """Processa o que estiver pronto nas pastas; retorna quantos arquivos foram tratados"""
+        from src.models.financeiro import db
+
+        limite = self.workers * 4
+        futuros = {}
+        for pasta in self.pastas:
+            for nome in pasta.arquivos_prontos(self.estabilizacao):
+                if len(futuros) >= limite:
+                    break
+                caminho = pasta.reivindicar(nome)
+                if caminho is None:
+                    continue
+
+                if not nome.lower().endswith(EXTENSOES[pasta.tipo]):
+                    pasta.falhar(caminho, f'Extensão não suportada para {pasta.tipo}')
+                    continue
+
+                caminho = pasta.iniciar(caminho)
+                hash_sha256 = hash_arquivo(caminho)
+                if self._ja_ingerido(hash_sha256):
+                    pasta.concluir(caminho)
+                    logger.info("[%s] %s já ingerido anteriormente", pasta.tipo, nome)
+                    continue
+
+                ler, _ = ETAPAS[pasta.tipo]
+                futuros[executor.submit(ler, caminho)] = (pasta, caminho, hash_sha256)
+
+        pendentes = []
+        for futuro in as_completed(futuros):
+            pasta, caminho, hash_sha256 = futuros[futuro]
+            try:
+                status, mensagem = self._gravar(pasta, caminho, futuro.result(), hash_sha256)
+            except Exception as e:
+                logger.warning("[%s] %s: %s", pasta.tipo, os.path.basename(caminho), e)
+                pasta.falhar(caminho, str(e))
+                continue
+
+            pendentes.append((pasta, caminho, f'{status}: {mensagem}'))
+            if len(pendentes) >= self.lote:
+                self._commit(pendentes)
+
+        if pendentes:
+            self._commit(pendentes)
+        db.session.remove()
+        return len(futuros)
+
+    def _iniciar_observador(self):
+        if Observer is None:
+            logger.info("watchdog não instalado: usando polling a cada %.0fs", self.intervalo)
+            return None
+        observador = Observer()
+        for pasta in self.pastas:
+            observador.schedule(_Despertador(self.despertar), pasta.entrada, recursive=False)
+        observador.start()
+        logger.info("Monitorando pastas com inotify (polling de segurança a cada %.0fs)", self.intervalo)
+        return observador
+
+    def executar(self, uma_vez=False):
+        with self.app.app_context():
+            for pasta in self.pastas:
+                pasta.preparar()
+                pasta.recuperar(self._ja_ingerido)
+
+            observador = None if uma_vez else self._iniciar_observador()
+            try:
+                with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                    while not self.parar.is_set():
+                        tratados = self.ciclo(executor)
+                        if uma_vez:
+                            if not tratados:
+                                break
+                            continue
+                        if not tratados:
+                            # Arquivos ainda estabilizando são pegos na varredura seguinte
+                            self.despertar.wait(self.intervalo)
+                            self.despertar.clear()
+            finally:
+                if observador is not None:
+                    observador.stop()
+                    observador.join()
+
+    def encerrar(self, *_):
+        logger.info("Encerrando após o ciclo atual...")
+        self.parar.set()
+        self.despertar.set()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Ingestão de NF-e, OFX e comprovantes por pastas monitoradas')
+    parser.add_argument('--nfe', default=os.getenv('INGESTAO_PASTA_NFE'), help='Pasta de XMLs de NF-e')
+    parser.add_argument('--ofx', default=os.getenv('INGESTAO_PASTA_OFX'), help='Pasta de extratos OFX')
+    parser.add_argument('--comprovantes', default=os.getenv('INGESTAO_PASTA_COMPROVANTES'), help='Pasta de comprovantes')
+    parser.add_argument('--workers', type=int, default=int(os.getenv('INGESTAO_WORKERS', 4)), help='Arquivos lidos em paralelo')
+    parser.add_argument('--lote', type=int, default=int(os.getenv('INGESTAO_LOTE', 20)), help='Arquivos por commit')
+    parser.add_argument('--intervalo', type=float, default=float(os.getenv('INGESTAO_INTERVALO', 5)), help='Segundos entre varreduras')
+    parser.add_argument('--estabilizacao', type=float, default=2.0, help='Segundos sem alteração antes de pegar o arquivo')
+    parser.add_argument('--uma-vez', action='store_true', help='Processa o que houver e sai')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+    pastas = [
+        PastaMonitorada(tipo, caminho)
+        for tipo, caminho in (('NFE', args.nfe), ('OFX', args.ofx), ('COMPROVANTE', args.comprovantes))
+        if caminho
+    ]
+    if not pastas:
+        parser.error('informe ao menos uma pasta (--nfe, --ofx ou --comprovantes)')
+
+    from src.main import app
+
+    ingestor = Ingestor(
+        app, pastas,
+        workers=max(1, args.workers),
+        lote=max(1, args.lote),
+        intervalo=args.intervalo,
+        estabilizacao=args.estabilizacao
+    )
+    signal.signal(signal.SIGTERM, ingestor.encerrar)
+    signal.signal(signal.SIGINT, ingestor.encerrar)
+    ingestor.executar(uma_vez=args.uma_vez)
+
+if __name__ == '__main__':
+    main()
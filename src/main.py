@@ -14,6 +14,7 @@ from src.routes.notas_fiscais import notas_fiscais_bp
 from src.routes.contas_pagar import contas_pagar_bp
 from src.routes.comprovantes import comprovantes_bp
 from src.routes.conciliacao import conciliacao_bp
+from src.respostas import configurar_respostas
 
 app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
 app.config['SECRET_KEY'] = 'sistema_financeiro_2025_key_secure'
@@ -21,6 +22,9 @@ app.config['SECRET_KEY'] = 'sistema_financeiro_2025_key_secure'
 # Enable CORS for all routes
 CORS(app)
 
+# JSON rápido (orjson, se instalado) e compressão gzip/brotli das respostas
+configurar_respostas(app)
+
 # Register blueprints
 app.register_blueprint(user_bp, url_prefix='/api')
 app.register_blueprint(fornecedores_bp, url_prefix='/api')
@@ -44,6 +48,14 @@ db.init_app(app)
 with app.app_context():
     db.create_all()
     
+    # Migrações versionadas (índices e ajustes em bancos existentes)
+    from src.migracoes import aplicar_migracoes
+    aplicar_migracoes(db.engine)
+    
+    # Tabelas de busca textual (FTS5 no SQLite, tsvector no PostgreSQL)
+    from src.services.busca import inicializar_busca
+    inicializar_busca()
+    
     # Create default expense types if they don't exist
     from src.models.financeiro import TipoDespesa
     tipos_default = [
@@ -82,6 +94,12 @@ def static_files(filename):
 def health_check():
     return {'status': 'healthy', 'message': 'Sistema Financeiro está funcionando!'}
 
+# Tarefas diárias (contas vencidas) na inicialização e uma vez por dia: com AGENDADOR_TAREFAS=1
+# ou no servidor de desenvolvimento (com o reloader do debug, só no processo que serve a aplicação)
+if os.getenv('AGENDADOR_TAREFAS') == '1' or (__name__ == '__main__' and os.getenv('WERKZEUG_RUN_MAIN') == 'true'):
+    from src.agendador import Agendador, HORARIO_PADRAO
+    Agendador(app, os.getenv('AGENDADOR_HORARIO', HORARIO_PADRAO)).iniciar_em_segundo_plano()
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5001, debug=True)
 
@@ -0,0 +1,208 @@
+"""Migrações versionadas do schema.
+
+As tabelas continuam sendo criadas pelo db.create_all(); aqui ficam os
+ajustes que ele não faz em bancos existentes (índices, colunas, backfills).
+Cada migração roda uma única vez, em ordem, e fica registrada na tabela
+schema_versao.
+
+Uso:
+    python -m src.migracoes            # aplica as pendentes no banco da aplicação
+    python -m src.migracoes --status   # lista as migrações e se já foram aplicadas, sem alterar o banco
+"""
+import os
+import sys
+
+# DON'T CHANGE THIS !!!
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import argparse
+from collections import namedtuple
+from datetime import datetime
+from sqlalchemy import Column, DateTime, Index, Integer, MetaData, String, Table, create_engine, insert, inspect, select, text
+from sqlalchemy.engine import make_url
+
+Migracao = namedtuple('Migracao', 'versao descricao aplicar')
+
+# O mesmo banco configurado em src/main.py
+URL_BANCO_APLICACAO = f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
+
+_metadata = MetaData()
+schema_versao = Table(
+    'schema_versao', _metadata,
+    Column('versao', Integer, primary_key=True),
+    Column('descricao', String(200), nullable=False),
+    Column('aplicada_em', DateTime, nullable=False)
+)
+
+MIGRACOES = []
+
+def migracao(versao, descricao):
+    def registrar(funcao):
+        MIGRACOES.append(Migracao(versao, descricao, funcao))
+        return funcao
+    return registrar
+
+def _indice(nome, tabela, *colunas, onde=None):
+    """Índice portável; `onde` (SQL) o torna parcial no SQLite e no PostgreSQL.
+
+    Montado sobre uma Table avulsa para não anexar o índice ao metadata dos
+    modelos (o create_all continua criando só as tabelas).
+    """
+    tabela = Table(tabela, MetaData(), *[Column(coluna) for coluna in colunas])
+    opcoes = {}
+    if onde is not None:
+        opcoes = {'sqlite_where': text(onde), 'postgresql_where': text(onde)}
+    return Index(nome, *[tabela.c[coluna] for coluna in colunas], **opcoes)
+
+@migracao(1, 'Índices dos filtros quentes e das chaves estrangeiras')
+def _indices_filtros_quentes(conexao):
+    indices = [
+        # Contas a pagar: vencimento (candidatas da conciliação, listagem por cursor) e FKs; os filtros
+        # por status + vencimento usam o prefixo do ix_contas_pagar_aging (migração 4)
+        _indice('ix_contas_pagar_vencimento_id', 'contas_pagar', 'data_vencimento', 'id'),
+        _indice('ix_contas_pagar_fornecedor', 'contas_pagar', 'fornecedor_id'),
+        _indice('ix_contas_pagar_tipo_despesa', 'contas_pagar', 'tipo_despesa_id'),
+        _indice('ix_contas_pagar_nota_fiscal', 'contas_pagar', 'nota_fiscal_id'),
+
+        # Extratos: status, deduplicação da importação OFX e listagem por data
+        _indice('ix_extratos_bancarios_status_data', 'extratos_bancarios', 'status', 'data_transacao'),
+        _indice('ix_extratos_bancarios_id_transacao', 'extratos_bancarios', 'id_transacao', 'data_transacao'),
+        _indice('ix_extratos_bancarios_data_id', 'extratos_bancarios', 'data_transacao', 'id'),
+
+        # Notas fiscais e itens
+        _indice('ix_notas_fiscais_fornecedor', 'notas_fiscais', 'fornecedor_id'),
+        _indice('ix_notas_fiscais_emissao_id', 'notas_fiscais', 'data_emissao', 'id'),
+        _indice('ix_itens_nota_fiscal_nota', 'itens_nota_fiscal', 'nota_fiscal_id'),
+        _indice('ix_arquivos_nota_fiscal_nota', 'arquivos_nota_fiscal', 'nota_fiscal_id'),
+
+        # Conciliações e comprovantes
+        _indice('ix_conciliacoes_bancarias_extrato', 'conciliacoes_bancarias', 'extrato_bancario_id'),
+        _indice('ix_conciliacoes_bancarias_conta', 'conciliacoes_bancarias', 'conta_pagar_id'),
+        _indice('ix_conciliacoes_bancarias_data', 'conciliacoes_bancarias', 'data_conciliacao'),
+        _indice('ix_comprovantes_conta', 'comprovantes', 'conta_pagar_id'),
+        _indice('ix_comprovantes_data_upload', 'comprovantes', 'data_upload'),
+    ]
+    for indice in indices:
+        indice.create(conexao, checkfirst=True)
+
+@migracao(2, 'Popula o resumo_financeiro a partir das contas, extratos e conciliações')
+def _popular_resumo_financeiro(conexao):
+    from src.services.resumo_financeiro import reconstruir_resumo
+    reconstruir_resumo(conexao)
+
+@migracao(3, 'Índices do fluxo de caixa (pagamentos por data e última alteração das contas)')
+def _indices_fluxo_caixa(conexao):
+    indices = [
+        _indice('ix_contas_pagar_status_pagamento', 'contas_pagar', 'status', 'data_pagamento'),
+        _indice('ix_contas_pagar_updated_at', 'contas_pagar', 'updated_at'),
+    ]
+    for indice in indices:
+        indice.create(conexao, checkfirst=True)
+
+@migracao(4, 'Índice de cobertura do aging das contas a pagar')
+def _indice_aging(conexao):
+    # Cobre todas as colunas lidas pelo aging: a consulta não precisa visitar a tabela
+    _indice(
+        'ix_contas_pagar_aging', 'contas_pagar',
+        'status', 'data_vencimento', 'fornecedor_id', 'tipo_despesa_id', 'valor_original'
+    ).create(conexao, checkfirst=True)
+
+@migracao(5, 'Índice de trigramas dos nomes dos fornecedores (pg_trgm, só no PostgreSQL)')
+def _indice_trigramas_fornecedores(conexao):
+    # Nos outros bancos os trigramas ficam em memória (src/services/indice_fornecedores.py)
+    if conexao.dialect.name != 'postgresql':
+        return
+    from src.services.indice_fornecedores import PALAVRAS_IGNORADAS, TAMANHO_MINIMO_TOKEN
+
+    # Mesma normalização de indice_fornecedores.tokens(); IMMUTABLE para poder ser indexada
+    ignoradas = '|'.join(sorted(PALAVRAS_IGNORADAS))
+    conexao.execute(text('CREATE EXTENSION IF NOT EXISTS unaccent'))
+    conexao.execute(text('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
+    conexao.execute(text(rf"""
+        CREATE OR REPLACE FUNCTION nome_fornecedor_normalizado(texto TEXT) RETURNS TEXT
+        LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+            SELECT btrim(regexp_replace(regexp_replace(regexp_replace(
+                lower(public.unaccent('public.unaccent'::regdictionary, COALESCE(texto, ''))),
+                '\ms\s*[./]\s*a\M\.?', ' sa ', 'g'),
+                '[^a-z0-9]+', ' ', 'g'),
+                '\m({ignoradas}|[a-z0-9]{{1,{TAMANHO_MINIMO_TOKEN - 1}}})\M', ' ', 'g'))
+        $$
+    """))
+    conexao.execute(text(
+        'CREATE INDEX IF NOT EXISTS ix_fornecedores_nome_trigramas ON fornecedores USING GIN '
+        "(nome_fornecedor_normalizado(razao_social || ' ' || COALESCE(nome_fantasia, '')) gin_trgm_ops)"
+    ))
+
+@migracao(6, 'Status anterior da conta nas conciliações automáticas')
+def _status_conta_anterior(conexao):
+    # Conciliações já existentes ficam sem o registro: reprocessá-las não desfaz o pagamento da conta
+    colunas = {coluna['name'] for coluna in inspect(conexao).get_columns('conciliacoes_bancarias')}
+    if 'status_conta_anterior' not in colunas:
+        conexao.execute(text('ALTER TABLE conciliacoes_bancarias ADD COLUMN status_conta_anterior VARCHAR(20)'))
+
+def versoes_aplicadas(conexao):
+    schema_versao.create(conexao, checkfirst=True)
+    return set(conexao.execute(select(schema_versao.c.versao)).scalars())
+
+def versoes_registradas(url):
+    """Versões já aplicadas no banco de `url`, só lendo: não cria o banco nem a schema_versao.
+
+    Não importa a aplicação, que aplica as pendentes na inicialização.
+    """
+    url = make_url(url)
+    if url.get_backend_name() == 'sqlite' and url.database not in (None, '', ':memory:') \
+            and not os.path.exists(url.database):
+        return set()
+    engine = create_engine(url)
+    try:
+        with engine.connect() as conexao:
+            if not inspect(conexao).has_table('schema_versao'):
+                return set()
+            return set(conexao.execute(select(schema_versao.c.versao)).scalars())
+    finally:
+        engine.dispose()
+
+def aplicar_migracoes(engine):
+    """Aplica as migrações pendentes, cada uma em sua transação; retorna as versões aplicadas agora"""
+    with engine.begin() as conexao:
+        aplicadas = versoes_aplicadas(conexao)
+
+    novas = []
+    for migracao_pendente in sorted(MIGRACOES, key=lambda m: m.versao):
+        if migracao_pendente.versao in aplicadas:
+            continue
+        with engine.begin() as conexao:
+            migracao_pendente.aplicar(conexao)
+            conexao.execute(insert(schema_versao).values(
+                versao=migracao_pendente.versao,
+                descricao=migracao_pendente.descricao,
+                aplicada_em=datetime.utcnow()
+            ))
+        novas.append(migracao_pendente.versao)
+    return novas
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Migrações do schema do banco')
+    parser.add_argument('--status', action='store_true', help='Lista as migrações sem aplicar')
+    parser.add_argument('--banco', default=URL_BANCO_APLICACAO,
+                        help='URL do banco consultado por --status (padrão: o da aplicação)')
+    args = parser.parse_args(argv)
+
+    if args.status:
+        aplicadas = versoes_registradas(args.banco)
+    else:
+        # Importar a aplicação cria as tabelas e aplica as pendentes
+        from src.main import app
+        from src.models.user import db
+
+        with app.app_context():
+            with db.engine.begin() as conexao:
+                aplicadas = versoes_aplicadas(conexao)
+            aplicadas |= set(aplicar_migracoes(db.engine))
+
+    for item in sorted(MIGRACOES, key=lambda m: m.versao):
+        situacao = 'aplicada' if item.versao in aplicadas else 'pendente'
+        print(f'{item.versao:4d}  {situacao:9s} {item.descricao}')
+
+if __name__ == '__main__':
+    main()
@@ -2,6 +2,24 @@ from src.models.user import db
 from datetime import datetime
 from decimal import Decimal
 
+def _projetar(dados, relacoes, fields, expand):
+    """Aplica fields/expand ao dict do modelo.
+
+    Sem expand (None) devolve a saída completa, com todas as relações embutidas.
+    Caso contrário mantém só os campos de `fields` (todos, se None) e embute
+    apenas as relações de `expand`.
+    """
+    if expand is None:
+        for nome, serializar in relacoes.items():
+            dados[nome] = serializar(None, None)
+        return dados
+    
+    if fields is not None:
+        dados = {campo: valor for campo, valor in dados.items() if campo in fields}
+    for nome, sub_expand in expand.items():
+        dados[nome] = relacoes[nome]((fields or {}).get(nome) or None, sub_expand)
+    return dados
+
 class Fornecedor(db.Model):
     __tablename__ = 'fornecedores'
     
@@ -26,8 +44,8 @@ class Fornecedor(db.Model):
     def __repr__(self):
         return f'<Fornecedor {self.razao_social}>'
     
-    def to_dict(self):
-        return {
+    def to_dict(self, fields=None, expand=None):
+        return _projetar({
             'id': self.id,
             'cnpj': self.cnpj,
             'inscricao_estadual': self.inscricao_estadual,
@@ -41,7 +59,7 @@ class Fornecedor(db.Model):
             'email': self.email,
             'ativo': self.ativo,
             'created_at': self.created_at.isoformat() if self.created_at else None
-        }
+        }, {}, fields, expand)
 
 class TipoDespesa(db.Model):
     __tablename__ = 'tipos_despesa'
@@ -58,14 +76,14 @@ class TipoDespesa(db.Model):
     def __repr__(self):
         return f'<TipoDespesa {self.nome}>'
     
-    def to_dict(self):
-        return {
+    def to_dict(self, fields=None, expand=None):
+        return _projetar({
             'id': self.id,
             'nome': self.nome,
             'descricao': self.descricao,
             'ativo': self.ativo,
             'created_at': self.created_at.isoformat() if self.created_at else None
-        }
+        }, {}, fields, expand)
 
 class NotaFiscal(db.Model):
     __tablename__ = 'notas_fiscais'
@@ -107,12 +125,16 @@ class NotaFiscal(db.Model):
     # Relacionamentos
     itens = db.relationship('ItemNotaFiscal', backref='nota_fiscal', lazy=True, cascade='all, delete-orphan')
     contas_pagar = db.relationship('ContaPagar', backref='nota_fiscal', lazy=True)
+    arquivos = db.relationship('ArquivoNotaFiscal', backref='nota_fiscal', lazy=True, cascade='all, delete-orphan')
+    
+    # Relações que o to_dict pode embutir (?expand=)
+    relacoes_expandiveis = ('fornecedor', 'itens')
     
     def __repr__(self):
         return f'<NotaFiscal {self.numero}/{self.serie}>'
     
-    def to_dict(self):
-        return {
+    def to_dict(self, fields=None, expand=None):
+        return _projetar({
             'id': self.id,
             'chave_acesso': self.chave_acesso,
             'numero': self.numero,
@@ -120,7 +142,6 @@ class NotaFiscal(db.Model):
             'data_emissao': self.data_emissao.isoformat() if self.data_emissao else None,
             'data_entrada': self.data_entrada.isoformat() if self.data_entrada else None,
             'fornecedor_id': self.fornecedor_id,
-            'fornecedor': self.fornecedor.to_dict() if self.fornecedor else None,
             'valor_produtos': float(self.valor_produtos) if self.valor_produtos else 0,
             'valor_desconto': float(self.valor_desconto) if self.valor_desconto else 0,
             'valor_frete': float(self.valor_frete) if self.valor_frete else 0,
@@ -135,9 +156,11 @@ class NotaFiscal(db.Model):
             'condicao_pagamento': self.condicao_pagamento,
             'status': self.status,
             'observacoes': self.observacoes,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'itens': [item.to_dict() for item in self.itens] if self.itens else []
-        }
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }, {
+            'fornecedor': lambda f, e: self.fornecedor.to_dict(f, e) if self.fornecedor else None,
+            'itens': lambda f, e: [item.to_dict(f, e) for item in self.itens]
+        }, fields, expand)
 
 class ItemNotaFiscal(db.Model):
     __tablename__ = 'itens_nota_fiscal'
@@ -165,8 +188,8 @@ class ItemNotaFiscal(db.Model):
     def __repr__(self):
         return f'<ItemNotaFiscal {self.descricao}>'
     
-    def to_dict(self):
-        return {
+    def to_dict(self, fields=None, expand=None):
+        return _projetar({
             'id': self.id,
             'nota_fiscal_id': self.nota_fiscal_id,
             'codigo_produto': self.codigo_produto,
@@ -182,6 +205,31 @@ class ItemNotaFiscal(db.Model):
             'valor_ipi': float(self.valor_ipi) if self.valor_ipi else 0,
             'valor_pis': float(self.valor_pis) if self.valor_pis else 0,
             'valor_cofins': float(self.valor_cofins) if self.valor_cofins else 0
+        }, {}, fields, expand)
+
+class ArquivoNotaFiscal(db.Model):
+    __tablename__ = 'arquivos_nota_fiscal'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    nota_fiscal_id = db.Column(db.Integer, db.ForeignKey('notas_fiscais.id'), nullable=False)
+    
+    # Identificação do arquivo importado (detecção de reenvio antes do parse)
+    hash_sha256 = db.Column(db.String(64), unique=True, nullable=False)
+    chave_acesso = db.Column(db.String(44), index=True)
+    nome_arquivo = db.Column(db.String(300))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<ArquivoNotaFiscal {self.hash_sha256[:12]}>'
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'nota_fiscal_id': self.nota_fiscal_id,
+            'hash_sha256': self.hash_sha256,
+            'chave_acesso': self.chave_acesso,
+            'nome_arquivo': self.nome_arquivo,
+            'created_at': self.created_at.isoformat() if self.created_at else None
         }
 
 class ContaPagar(db.Model):
@@ -212,18 +260,21 @@ class ContaPagar(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # Relações que o to_dict pode embutir (?expand=)
+    relacoes_expandiveis = ('fornecedor', 'tipo_despesa', 'nota_fiscal')
+    
+    # Ainda a pagar: VENCIDO é uma PENDENTE que passou do vencimento (marcada pela tarefa diária)
+    status_em_aberto = ('PENDENTE', 'VENCIDO')
+    
     def __repr__(self):
         return f'<ContaPagar {self.descricao}>'
     
-    def to_dict(self):
-        return {
+    def to_dict(self, fields=None, expand=None):
+        return _projetar({
             'id': self.id,
             'fornecedor_id': self.fornecedor_id,
-            'fornecedor': self.fornecedor.to_dict() if self.fornecedor else None,
             'tipo_despesa_id': self.tipo_despesa_id,
-            'tipo_despesa': self.tipo_despesa.to_dict() if self.tipo_despesa else None,
             'nota_fiscal_id': self.nota_fiscal_id,
-            'nota_fiscal': self.nota_fiscal.to_dict() if self.nota_fiscal else None,
             'descricao': self.descricao,
             'numero_documento': self.numero_documento,
             'valor_original': float(self.valor_original) if self.valor_original else 0,
@@ -236,7 +287,11 @@ class ContaPagar(db.Model):
             'observacoes': self.observacoes,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
-        }
+        }, {
+            'fornecedor': lambda f, e: self.fornecedor.to_dict(f, e) if self.fornecedor else None,
+            'tipo_despesa': lambda f, e: self.tipo_despesa.to_dict(f, e) if self.tipo_despesa else None,
+            'nota_fiscal': lambda f, e: self.nota_fiscal.to_dict(f, e) if self.nota_fiscal else None
+        }, fields, expand)
 
 class Comprovante(db.Model):
     __tablename__ = 'comprovantes'
@@ -258,8 +313,11 @@ class Comprovante(db.Model):
     conta_pagar_id = db.Column(db.Integer, db.ForeignKey('contas_pagar.id'))
     conta_pagar = db.relationship('ContaPagar', backref='comprovantes')
     
-    def to_dict(self):
-        return {
+    # Relações que o to_dict pode embutir (?expand=)
+    relacoes_expandiveis = ('conta_pagar',)
+    
+    def to_dict(self, fields=None, expand=None):
+        return _projetar({
             'id': self.id,
             'nome_arquivo': self.nome_arquivo,
             'data_upload': self.data_upload.isoformat() if self.data_upload else None,
@@ -268,9 +326,10 @@ class Comprovante(db.Model):
             'fornecedor_reconhecido': self.fornecedor_reconhecido,
             'banco_reconhecido': self.banco_reconhecido,
             'status_ocr': self.status_ocr,
-            'conta_pagar_id': self.conta_pagar_id,
-            'conta_pagar': self.conta_pagar.to_dict() if self.conta_pagar else None
-        }
+            'conta_pagar_id': self.conta_pagar_id
+        }, {
+            'conta_pagar': lambda f, e: self.conta_pagar.to_dict(f, e) if self.conta_pagar else None
+        }, fields, expand)
 
 class ExtratoBancario(db.Model):
     __tablename__ = 'extratos_bancarios'
@@ -292,8 +351,8 @@ class ExtratoBancario(db.Model):
     data_importacao = db.Column(db.DateTime, default=datetime.utcnow)
     status = db.Column(db.String(20), default='NAO_CONCILIADO')  # NAO_CONCILIADO, CONCILIADO
     
-    def to_dict(self):
-        return {
+    def to_dict(self, fields=None, expand=None):
+        return _projetar({
             'id': self.id,
             'data_transacao': self.data_transacao.isoformat() if self.data_transacao else None,
             'valor': float(self.valor) if self.valor else None,
@@ -306,7 +365,7 @@ class ExtratoBancario(db.Model):
             'nome_arquivo': self.nome_arquivo,
             'data_importacao': self.data_importacao.isoformat() if self.data_importacao else None,
             'status': self.status
-        }
+        }, {}, fields, expand)
 
 class ConciliacaoBancaria(db.Model):
     __tablename__ = 'conciliacoes_bancarias'
@@ -324,16 +383,113 @@ class ConciliacaoBancaria(db.Model):
     tipo_conciliacao = db.Column(db.String(20), nullable=False)  # AUTOMATICA, MANUAL
     data_conciliacao = db.Column(db.DateTime, default=datetime.utcnow)
     observacoes = db.Column(db.Text)
+    # Status da conta antes de a conciliação automática marcá-la como paga (None se ela já estava paga)
+    status_conta_anterior = db.Column(db.String(20))
     
-    def to_dict(self):
-        return {
+    # Relações que o to_dict pode embutir (?expand=)
+    relacoes_expandiveis = ('extrato_bancario', 'conta_pagar')
+    
+    def to_dict(self, fields=None, expand=None):
+        return _projetar({
             'id': self.id,
             'extrato_bancario_id': self.extrato_bancario_id,
-            'extrato_bancario': self.extrato_bancario.to_dict() if self.extrato_bancario else None,
             'conta_pagar_id': self.conta_pagar_id,
-            'conta_pagar': self.conta_pagar.to_dict() if self.conta_pagar else None,
             'tipo_conciliacao': self.tipo_conciliacao,
             'data_conciliacao': self.data_conciliacao.isoformat() if self.data_conciliacao else None,
             'observacoes': self.observacoes
+        }, {
+            'extrato_bancario': lambda f, e: self.extrato_bancario.to_dict(f, e) if self.extrato_bancario else None,
+            'conta_pagar': lambda f, e: self.conta_pagar.to_dict(f, e) if self.conta_pagar else None
+        }, fields, expand)
+
+class ArquivoIngerido(db.Model):
+    __tablename__ = 'arquivos_ingeridos'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    
+    # Diário da ingestão por pasta monitorada: gravado na mesma transação dos dados importados
+    hash_sha256 = db.Column(db.String(64), unique=True, nullable=False)
+    tipo = db.Column(db.String(20), nullable=False)  # NFE, OFX, COMPROVANTE
+    nome_arquivo = db.Column(db.String(300))
+    status = db.Column(db.String(20), nullable=False)  # PROCESSADO, DUPLICADO
+    mensagem = db.Column(db.Text)
+    data_processamento = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'hash_sha256': self.hash_sha256,
+            'tipo': self.tipo,
+            'nome_arquivo': self.nome_arquivo,
+            'status': self.status,
+            'mensagem': self.mensagem,
+            'data_processamento': self.data_processamento.isoformat() if self.data_processamento else None
         }
 
+class ExecucaoTarefa(db.Model):
+    __tablename__ = 'execucoes_tarefas'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    
+    # Histórico das tarefas agendadas (src/agendador.py) e das disparadas pela API
+    tarefa = db.Column(db.String(50), nullable=False, index=True)
+    origem = db.Column(db.String(20), nullable=False)  # AGENDADOR, API
+    status = db.Column(db.String(20), nullable=False)  # SUCESSO, ERRO
+    inicio = db.Column(db.DateTime, nullable=False)
+    duracao_ms = db.Column(db.Integer, nullable=False)
+    linhas_afetadas = db.Column(db.Integer)
+    mensagem = db.Column(db.Text)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'tarefa': self.tarefa,
+            'origem': self.origem,
+            'status': self.status,
+            'inicio': self.inicio.isoformat() if self.inicio else None,
+            'duracao_ms': self.duracao_ms,
+            'linhas_afetadas': self.linhas_afetadas,
+            'mensagem': self.mensagem
+        }
+
+class ResumoFinanceiro(db.Model):
+    __tablename__ = 'resumo_financeiro'
+    
+    # Balde: origem (CONTA, EXTRATO, CONCILIACAO), status, mês e, nas contas, fornecedor e tipo de despesa
+    origem = db.Column(db.String(20), primary_key=True)
+    status = db.Column(db.String(20), primary_key=True)
+    mes = db.Column(db.Date, primary_key=True)
+    fornecedor_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    tipo_despesa_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    
+    # Totais mantidos por src/services/resumo_financeiro.py
+    quantidade = db.Column(db.Integer, nullable=False, default=0)
+    valor = db.Column(db.Numeric(15, 2), nullable=False, default=0)
+    valor_pago = db.Column(db.Numeric(15, 2), nullable=False, default=0)
+    
+    def to_dict(self):
+        return {
+            'origem': self.origem,
+            'status': self.status,
+            'mes': self.mes.isoformat() if self.mes else None,
+            'fornecedor_id': self.fornecedor_id,
+            'tipo_despesa_id': self.tipo_despesa_id,
+            'quantidade': self.quantidade,
+            'valor': float(self.valor) if self.valor else 0,
+            'valor_pago': float(self.valor_pago) if self.valor_pago else 0
+        }
+
+class VersaoTabela(db.Model):
+    __tablename__ = 'versoes_tabelas'
+    
+    # Incrementada a cada transação que grava na tabela (src/services/versoes.py)
+    tabela = db.Column(db.String(100), primary_key=True)
+    versao = db.Column(db.Integer, nullable=False, default=0)
+    atualizado_em = db.Column(db.DateTime, nullable=False)
+    
+    def to_dict(self):
+        return {
+            'tabela': self.tabela,
+            'versao': self.versao,
+            'atualizado_em': self.atualizado_em.isoformat() if self.atualizado_em else None
+        }
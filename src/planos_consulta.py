@@ -0,0 +1,210 @@
+"""Verificação dos planos de execução das consultas quentes.
+
+Cria o schema (create_all + migrações) em um banco vazio, roda EXPLAIN de
+cada consulta e falha se alguma delas fizer varredura completa de tabela,
+ou seja, se algum índice necessário sumiu ou deixou de ser usado. As
+consultas são montadas pelas funções das rotas e serviços, então mudar uma
+consulta na aplicação muda também o que é verificado.
+
+Uso:
+    python -m src.planos_consulta                       # SQLite em memória
+    python -m src.planos_consulta --banco postgresql://...  # banco de verificação vazio
+"""
+import os
+import sys
+
+# DON'T CHANGE THIS !!!
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import argparse
+import re
+from collections import namedtuple
+from datetime import date, timedelta
+from sqlalchemy import create_engine, inspect, select
+from src.services.paginacao import filtrar_keyset
+
+Consulta = namedtuple('Consulta', 'nome montar')
+
+CONSULTAS = []
+
+def consulta(nome):
+    def registrar(funcao):
+        CONSULTAS.append(Consulta(nome, funcao))
+        return funcao
+    return registrar
+
+# As consultas vêm das mesmas funções que montam as consultas da aplicação; só
+# as buscas por chave estrangeira (relações e selectinload) são montadas aqui
+
+@consulta('contas vencidas (UPDATE da tarefa diária)')
+def _contas_vencidas(m):
+    from src.services.vencimentos import atualizacao_contas_vencidas
+    return atualizacao_contas_vencidas(date.today())
+
+@consulta('pendentes vencidas no mês (dashboard)')
+def _pendentes_vencidas_no_mes(m):
+    from src.routes.contas_pagar import consulta_pendentes_vencidas_no_mes
+    hoje = date.today()
+    return consulta_pendentes_vencidas_no_mes(hoje.replace(day=1), hoje)
+
+@consulta('próximos vencimentos (dashboard)')
+def _proximos_vencimentos(m):
+    from src.routes.contas_pagar import consulta_proximos_vencimentos
+    return consulta_proximos_vencimentos(date.today())
+
+@consulta('contas por status ordenadas por vencimento')
+def _contas_por_status(m):
+    from src.routes.contas_pagar import ORDEM_KEYSET
+    return filtrar_keyset(select(m.ContaPagar).where(m.ContaPagar.status == 'PAGO'), ORDEM_KEYSET).limit(20)
+
+@consulta('candidatas da conciliação (janela de datas, sem as já conciliadas)')
+def _candidatas_conciliacao(m):
+    from src.services.conciliacao_automatica import consulta_candidatas
+    hoje = date.today()
+    return consulta_candidatas(hoje - timedelta(days=30), hoje)
+
+@consulta('contas do fornecedor')
+def _contas_fornecedor(m):
+    return select(m.ContaPagar).where(m.ContaPagar.fornecedor_id == 1)
+
+@consulta('contas da nota fiscal')
+def _contas_nota(m):
+    return select(m.ContaPagar).where(m.ContaPagar.nota_fiscal_id == 1)
+
+@consulta('página keyset de contas')
+def _keyset_contas(m):
+    from src.routes.contas_pagar import ORDEM_KEYSET
+    return filtrar_keyset(select(m.ContaPagar), ORDEM_KEYSET, [date.today(), 100]).limit(21)
+
+@consulta('previsto do fluxo de caixa')
+def _previsto_fluxo(m):
+    from src.services.fluxo_caixa import consulta_previsto
+    return consulta_previsto(date.today() + timedelta(days=90))
+
+@consulta('pagamentos realizados no período (fluxo de caixa)')
+def _pagamentos_periodo(m):
+    from src.services.fluxo_caixa import consulta_realizado
+    hoje = date.today()
+    return consulta_realizado(hoje - timedelta(days=90), hoje)
+
+@consulta('calendário de vencimentos do mês')
+def _calendario(m):
+    from src.services.fluxo_caixa import consulta_calendario
+    inicio = date.today().replace(day=1)
+    return consulta_calendario(inicio, inicio + timedelta(days=30))
+
+@consulta('impressão das contas (cache dos relatórios)')
+def _impressao_contas(m):
+    from src.services.cache_contas import consulta_impressao
+    return consulta_impressao()
+
+@consulta('aging das contas em aberto')
+def _aging(m):
+    from src.services.aging import consulta_aging
+    return consulta_aging(date.today(), (30, 60, 90))
+
+@consulta('extratos por status')
+def _extratos_status(m):
+    from src.routes.conciliacao import ORDEM_KEYSET
+    return filtrar_keyset(
+        select(m.ExtratoBancario).where(m.ExtratoBancario.status == 'NAO_CONCILIADO'), ORDEM_KEYSET, descendente=True
+    ).limit(20)
+
+@consulta('extratos já gravados na importação OFX')
+def _extratos_existentes(m):
+    from src.services.conciliacao_automatica import consulta_extratos_existentes
+    hoje = date.today()
+    return consulta_extratos_existentes(hoje - timedelta(days=30), hoje, conta='12345-6')
+
+@consulta('página keyset de extratos')
+def _keyset_extratos(m):
+    from src.routes.conciliacao import ORDEM_KEYSET
+    return filtrar_keyset(select(m.ExtratoBancario), ORDEM_KEYSET, [date.today(), 100], descendente=True).limit(21)
+
+@consulta('página keyset de notas fiscais')
+def _keyset_notas(m):
+    from src.routes.notas_fiscais import ORDEM_KEYSET
+    return filtrar_keyset(select(m.NotaFiscal), ORDEM_KEYSET, [date.today(), 100], descendente=True).limit(21)
+
+@consulta('notas do fornecedor')
+def _notas_fornecedor(m):
+    return select(m.NotaFiscal).where(m.NotaFiscal.fornecedor_id == 1)
+
+@consulta('itens das notas (selectinload)')
+def _itens_notas(m):
+    return select(m.ItemNotaFiscal).where(m.ItemNotaFiscal.nota_fiscal_id.in_([1, 2, 3]))
+
+@consulta('conciliações da conta')
+def _conciliacoes_conta(m):
+    return select(m.ConciliacaoBancaria).where(m.ConciliacaoBancaria.conta_pagar_id == 1)
+
+@consulta('conciliações do extrato')
+def _conciliacoes_extrato(m):
+    return select(m.ConciliacaoBancaria).where(m.ConciliacaoBancaria.extrato_bancario_id == 1)
+
+@consulta('comprovantes da conta')
+def _comprovantes_conta(m):
+    return select(m.Comprovante).where(m.Comprovante.conta_pagar_id == 1)
+
+def _explicar(conexao, instrucao):
+    """Linhas do plano de execução da instrução (valores embutidos no SQL)"""
+    sql = str(instrucao.compile(conexao, compile_kwargs={'literal_binds': True}))
+    if conexao.dialect.name == 'sqlite':
+        return [linha[-1] for linha in conexao.exec_driver_sql('EXPLAIN QUERY PLAN ' + sql)]
+
+    # PostgreSQL: com seqscan desligado, só sobra varredura sequencial se não houver índice utilizável
+    conexao.exec_driver_sql('SET LOCAL enable_seqscan = off')
+    return [linha[0] for linha in conexao.exec_driver_sql('EXPLAIN ' + sql)]
+
+_RE_SCAN_SQLITE = re.compile(r'^SCAN (\w+)(?! USING)')
+_RE_SCAN_POSTGRES = re.compile(r'Seq Scan on (\w+)')
+
+def varreduras_completas(plano, dialeto):
+    """Tabelas lidas por varredura completa no plano"""
+    padrao = _RE_SCAN_SQLITE if dialeto == 'sqlite' else _RE_SCAN_POSTGRES
+    return [match.group(1) for linha in plano for match in [padrao.search(linha.strip())] if match]
+
+def verificar_planos(engine, saida=print):
+    """Roda EXPLAIN de cada consulta; retorna a lista de (consulta, tabelas varridas) com regressão"""
+    from src.models import financeiro as modelos
+
+    regressoes = []
+    with engine.begin() as conexao:
+        # Varrer uma subconsulta já agrupada (anon_1...) não é regressão: só tabelas contam
+        tabelas = set(inspect(conexao).get_table_names())
+        for item in CONSULTAS:
+            plano = _explicar(conexao, item.montar(modelos))
+            varridas = [tabela for tabela in varreduras_completas(plano, conexao.dialect.name) if tabela in tabelas]
+            saida(f"{'FALHA' if varridas else 'ok':5s} {item.nome}")
+            for linha in plano:
+                saida(f'        {linha}')
+            if varridas:
+                regressoes.append((item.nome, varridas))
+    return regressoes
+
+def preparar_banco(url):
+    """Engine com o schema completo (tabelas + migrações)"""
+    from src.models.user import db
+    from src.models import financeiro  # noqa: F401 - registra os modelos no metadata
+    from src.migracoes import aplicar_migracoes
+
+    engine = create_engine(url)
+    db.metadata.create_all(engine)
+    aplicar_migracoes(engine)
+    return engine
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Verifica se as consultas quentes usam índices')
+    parser.add_argument('--banco', default='sqlite://', help='URL de um banco vazio para a verificação')
+    args = parser.parse_args(argv)
+
+    regressoes = verificar_planos(preparar_banco(args.banco))
+    if regressoes:
+        print(f'\n{len(regressoes)} consulta(s) com varredura completa de tabela:')
+        for nome, tabelas in regressoes:
+            print(f"  - {nome}: {', '.join(tabelas)}")
+        sys.exit(1)
+    print(f'\nTodas as {len(CONSULTAS)} consultas usam índice.')
+
+if __name__ == '__main__':
+    main()
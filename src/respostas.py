@@ -0,0 +1,123 @@
+"""Camada de resposta da API: codificador JSON e compressão.
+
+configurar_respostas(app) troca o provedor JSON do Flask (usado pelo
+jsonify) e registra a compressão das respostas:
+
+- JSON: orjson quando instalado, json da biblioteca padrão caso contrário
+  (ou com RESPOSTA_JSON=json). Nos dois, Decimal sai como número e
+  date/datetime/time em ISO 8601, então as rotas podem devolver esses tipos
+  direto.
+- Compressão: respostas de texto/JSON acima de RESPOSTA_COMPRESSAO_MINIMO
+  bytes (padrão 1024) saem com brotli, se o pacote estiver instalado e o
+  cliente aceitar, ou gzip. Downloads em streaming e arquivos estáticos
+  passam direto.
+"""
+import gzip
+import os
+from datetime import date, datetime, time
+from decimal import Decimal
+from flask import request
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - dependência opcional
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - dependência opcional
+    brotli = None
+
+COMPRESSAO_MINIMO_PADRAO = 1024
+NIVEL_GZIP = 6
+QUALIDADE_BROTLI = 5
+TIPOS_COMPRIMIVEIS = ('application/json', 'application/javascript', 'text/')
+
+def _padrao(obj):
+    """Tipos que nenhum dos codificadores serializa sozinho do jeito da API"""
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, (date, datetime, time)):
+        return obj.isoformat()
+    return DefaultJSONProvider.default(obj)
+
+class ProvedorJSON(DefaultJSONProvider):
+    """json da biblioteca padrão, com Decimal e datas no formato da API"""
+    default = staticmethod(_padrao)
+
+class ProvedorOrjson(ProvedorJSON):
+    """orjson: serializa date/datetime nativamente e Decimal via _padrao.
+
+    Chamadas com opções do json padrão (indent, cls...) continuam no json.
+    """
+    opcoes = orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS if orjson else 0
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=_padrao, option=self.opcoes).decode()
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(
+            orjson.dumps(obj, default=_padrao, option=self.opcoes) + b'\n',
+            mimetype=self.mimetype
+        )
+
+PROVEDORES = {
+    'json': ProvedorJSON,
+    'orjson': ProvedorOrjson,
+}
+
+def provedor_padrao():
+    nome = os.getenv('RESPOSTA_JSON', 'orjson' if orjson else 'json')
+    if nome == 'orjson' and orjson is None:
+        nome = 'json'
+    return PROVEDORES[nome]
+
+def codificacoes_disponiveis():
+    return ('br', 'gzip') if brotli else ('gzip',)
+
+def comprimir(corpo, codificacao):
+    if codificacao == 'br':
+        return brotli.compress(corpo, quality=QUALIDADE_BROTLI)
+    return gzip.compress(corpo, compresslevel=NIVEL_GZIP)
+
+def _comprimivel(resposta):
+    return (
+        resposta.status_code == 200
+        and not resposta.direct_passthrough
+        and not resposta.is_streamed
+        and 'Content-Encoding' not in resposta.headers
+        and (resposta.mimetype or '').startswith(TIPOS_COMPRIMIVEIS)
+    )
+
+def configurar_respostas(app, provedor=None, compressao_minimo=None):
+    """Liga o codificador JSON (`provedor`, ou o padrão do ambiente) e a compressão em `app`"""
+    app.json = (provedor or provedor_padrao())(app)
+    if compressao_minimo is None:
+        compressao_minimo = int(os.getenv('RESPOSTA_COMPRESSAO_MINIMO', COMPRESSAO_MINIMO_PADRAO))
+
+    @app.after_request
+    def _comprimir_resposta(resposta):
+        if not _comprimivel(resposta):
+            return resposta
+        corpo = resposta.get_data()
+        if len(corpo) < compressao_minimo:
+            return resposta
+
+        resposta.vary.add('Accept-Encoding')
+        codificacao = request.accept_encodings.best_match(codificacoes_disponiveis())
+        if not codificacao:
+            return resposta
+        resposta.set_data(comprimir(corpo, codificacao))
+        resposta.headers['Content-Encoding'] = codificacao
+        return resposta
+
+    return app
@@ -1,6 +1,8 @@
 from flask import Blueprint, request, jsonify
 from werkzeug.utils import secure_filename
-from src.models.financeiro import db, Comprovante, ContaPagar, Fornecedor
+from src.models.financeiro import db, Comprovante, ContaPagar
+from src.services.projecao import aplicar_projecao
+from src.services.indice_fornecedores import indice_fornecedores
 from datetime import datetime, date
 from decimal import Decimal
 import os
@@ -8,6 +10,7 @@ import pytesseract
 from PIL import Image
 import re
 import tempfile
+from src.routes.condicional import condicional, TABELAS_CONTAS
 
 comprovantes_bp = Blueprint('comprovantes', __name__)
 
@@ -151,7 +154,7 @@ def find_matching_conta_pagar(valor, data_pagamento, fornecedor_nome=None):
     valor_max = valor + tolerance
     
     query = ContaPagar.query.filter(
-        ContaPagar.status == 'PENDENTE',
+        ContaPagar.status.in_(ContaPagar.status_em_aberto),
         ContaPagar.valor_original.between(valor_min, valor_max)
     )
     
@@ -162,23 +165,61 @@ def find_matching_conta_pagar(valor, data_pagamento, fornecedor_nome=None):
         data_fim = data_pagamento + timedelta(days=10)
         query = query.filter(ContaPagar.data_vencimento.between(data_inicio, data_fim))
     
-    # Se temos fornecedor, tentar filtrar
+    # Se temos fornecedor, filtrar pelos que têm todas as palavras do nome (índice em memória)
     if fornecedor_nome:
-        query = query.join(Fornecedor).filter(
-            Fornecedor.razao_social.ilike(f'%{fornecedor_nome}%')
-        )
+        fornecedores = indice_fornecedores().com_nome(fornecedor_nome)
+        if fornecedores is not None:
+            query = query.filter(ContaPagar.fornecedor_id.in_(fornecedores))
     
     # Retornar a primeira correspondência
     return query.first()
 
+def registrar_comprovante(filename, filepath, texto_ocr):
+    """Cria o comprovante a partir do texto OCR e tenta associá-lo a uma conta a pagar.
+    
+    Não faz commit. Retorna (comprovante, informações extraídas).
+    """
+    info_pagamento = parse_payment_info(texto_ocr)
+    
+    # Criar registro do comprovante
+    comprovante = Comprovante(
+        nome_arquivo=filename,
+        caminho_arquivo=filepath,
+        texto_ocr=texto_ocr,
+        valor_reconhecido=Decimal(str(info_pagamento['valor'])) if info_pagamento['valor'] else None,
+        data_reconhecida=info_pagamento['data'],
+        fornecedor_reconhecido=info_pagamento['fornecedor'],
+        banco_reconhecido=info_pagamento['banco'],
+        status_ocr='PROCESSADO' if info_pagamento['valor'] else 'ERRO'
+    )
+    
+    # Tentar encontrar conta a pagar correspondente
+    if info_pagamento['valor'] and info_pagamento['data']:
+        conta_correspondente = find_matching_conta_pagar(
+            info_pagamento['valor'],
+            info_pagamento['data'],
+            info_pagamento['fornecedor']
+        )
+    
+        if conta_correspondente:
+            comprovante.conta_pagar_id = conta_correspondente.id
+            comprovante.status_ocr = 'ASSOCIADO'
+    
+    db.session.add(comprovante)
+    return comprovante, info_pagamento
+
 @comprovantes_bp.route('/comprovantes', methods=['GET'])
+@condicional('comprovantes', *TABELAS_CONTAS)
 def listar_comprovantes():
     """Lista comprovantes de pagamento"""
     try:
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 20, type=int)
         
-        comprovantes = Comprovante.query.order_by(
+        # fields/expand: só as relações pedidas, carregadas em lote
+        query, fields, expand = aplicar_projecao(Comprovante.query, Comprovante, request.args)
+        
+        comprovantes = query.order_by(
             Comprovante.data_upload.desc()
         ).paginate(
             page=page, per_page=per_page, error_out=False
@@ -186,7 +227,7 @@ def listar_comprovantes():
         
         return jsonify({
             'success': True,
-            'data': [comprovante.to_dict() for comprovante in comprovantes.items],
+            'data': [comprovante.to_dict(fields, expand) for comprovante in comprovantes.items],
             'pagination': {
                 'page': page,
                 'per_page': per_page,
@@ -196,6 +237,8 @@ def listar_comprovantes():
                 'has_prev': comprovantes.has_prev
             }
         })
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -229,33 +272,7 @@ def upload_comprovante():
         
         # Processar OCR
         texto_ocr = extract_text_from_image(filepath)
-        info_pagamento = parse_payment_info(texto_ocr)
-        
-        # Criar registro do comprovante
-        comprovante = Comprovante(
-            nome_arquivo=filename,
-            caminho_arquivo=filepath,
-            texto_ocr=texto_ocr,
-            valor_reconhecido=Decimal(str(info_pagamento['valor'])) if info_pagamento['valor'] else None,
-            data_reconhecida=info_pagamento['data'],
-            fornecedor_reconhecido=info_pagamento['fornecedor'],
-            banco_reconhecido=info_pagamento['banco'],
-            status_ocr='PROCESSADO' if info_pagamento['valor'] else 'ERRO'
-        )
-        
-        # Tentar encontrar conta a pagar correspondente
-        if info_pagamento['valor'] and info_pagamento['data']:
-            conta_correspondente = find_matching_conta_pagar(
-                info_pagamento['valor'],
-                info_pagamento['data'],
-                info_pagamento['fornecedor']
-            )
-            
-            if conta_correspondente:
-                comprovante.conta_pagar_id = conta_correspondente.id
-                comprovante.status_ocr = 'ASSOCIADO'
-        
-        db.session.add(comprovante)
+        comprovante, info_pagamento = registrar_comprovante(filename, filepath, texto_ocr)
         db.session.commit()
         
         return jsonify({
@@ -369,6 +386,7 @@ def deletar_comprovante(comprovante_id):
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @comprovantes_bp.route('/comprovantes/sugestoes/<int:comprovante_id>', methods=['GET'])
+@condicional('comprovantes', *TABELAS_CONTAS)
 def sugerir_contas_pagar(comprovante_id):
     """Sugere contas a pagar para associar ao comprovante"""
     try:
@@ -388,7 +406,7 @@ def sugerir_contas_pagar(comprovante_id):
         valor_max = valor + tolerance
         
         query = ContaPagar.query.filter(
-            ContaPagar.status == 'PENDENTE',
+            ContaPagar.status.in_(ContaPagar.status_em_aberto),
             ContaPagar.valor_original.between(valor_min, valor_max)
         )
         
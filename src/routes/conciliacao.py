@@ -1,11 +1,18 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, stream_with_context
 from werkzeug.utils import secure_filename
-from src.models.financeiro import db, ExtratoBancario, ConciliacaoBancaria, ContaPagar, Fornecedor
+from src.models.financeiro import db, ExtratoBancario, ConciliacaoBancaria, ContaPagar, ResumoFinanceiro
 from datetime import datetime, date, timedelta
-from decimal import Decimal
 import os
 import tempfile
-from ofxparse import OfxParser
+from src.services.projecao import aplicar_projecao
+from src.services.paginacao import paginar_keyset
+from src.services.ofx_parser import ler_ofx
+from src.services.exportacao import exportar, filtros_exportacao
+from src.services.conciliacao_automatica import (
+    chave_extrato, conciliar_extratos, extratos_existentes, reprocessar_conciliacoes
+)
+import src.services.resumo_financeiro  # mantém o resumo_financeiro no after_flush
+from src.routes.condicional import condicional, TABELAS_CONTAS
 
 conciliacao_bp = Blueprint('conciliacao', __name__)
 
@@ -13,86 +20,66 @@ conciliacao_bp = Blueprint('conciliacao', __name__)
 UPLOAD_FOLDER = 'uploads/extratos'
 ALLOWED_EXTENSIONS = {'ofx', 'qfx'}
 
+# Ordem da paginação keyset dos extratos
+ORDEM_KEYSET = [ExtratoBancario.data_transacao, ExtratoBancario.id]
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def parse_ofx_file(filepath):
-    """Processa arquivo OFX e extrai transações"""
-    try:
-        with open(filepath, 'rb') as ofx_file:
-            ofx = OfxParser.parse(ofx_file)
-        
-        transacoes = []
-        
-        # Processar conta bancária
-        if hasattr(ofx, 'account') and ofx.account:
-            account = ofx.account
-            
-            # Informações da conta
-            conta_info = {
-                'banco': getattr(account.institution, 'organization', ''),
-                'agencia': getattr(account, 'branch_id', ''),
-                'conta': getattr(account, 'account_id', ''),
-                'tipo': getattr(account, 'account_type', '')
-            }
-            
-            # Processar transações
-            if hasattr(account, 'statement') and account.statement:
-                for transaction in account.statement.transactions:
-                    transacao = {
-                        'data': transaction.date.date() if hasattr(transaction.date, 'date') else transaction.date,
-                        'valor': float(transaction.amount),
-                        'tipo': transaction.type,
-                        'descricao': transaction.memo or transaction.payee or '',
-                        'id_transacao': getattr(transaction, 'id', ''),
-                        'conta_info': conta_info
-                    }
-                    transacoes.append(transacao)
-        
-        return transacoes, conta_info
-        
-    except Exception as e:
-        print(f"Erro ao processar OFX: {str(e)}")
-        return [], {}
-
-def find_matching_conta_pagar_for_transaction(valor, data_transacao, descricao=''):
-    """Encontra conta a pagar que corresponde à transação bancária"""
-    if valor >= 0:  # Só processar débitos (valores negativos)
-        return None
-    
-    valor_absoluto = abs(valor)
-    tolerance = valor_absoluto * 0.05  # 5% de tolerância
-    valor_min = valor_absoluto - tolerance
-    valor_max = valor_absoluto + tolerance
+def importar_transacoes_extrato(lotes, nome_arquivo):
+    """Grava as transações dos lotes de ler_ofx, tentando a conciliação automática dos débitos.
     
-    # Buscar contas pendentes ou pagas em janela de ±10 dias
-    data_inicio = data_transacao - timedelta(days=10)
-    data_fim = data_transacao + timedelta(days=10)
+    Cada lote é deduplicado, conciliado e descarregado (flush) antes de ler
+    o próximo, então um arquivo com anos de extrato não fica inteiro em
+    memória. Não faz commit. Retorna {transacoes_lidas,
+    transacoes_importadas, conciliacoes_automaticas, contas}.
+    """
+    resumo = {'transacoes_lidas': 0, 'transacoes_importadas': 0, 'conciliacoes_automaticas': 0, 'contas': []}
+    contas_vistas = set()
     
-    query = ContaPagar.query.filter(
-        ContaPagar.valor_original.between(valor_min, valor_max),
-        ContaPagar.data_vencimento.between(data_inicio, data_fim)
-    ).filter(
-        ContaPagar.status.in_(['PENDENTE', 'PAGO'])
-    )
-    
-    # Se temos descrição, tentar filtrar por fornecedor
-    if descricao:
-        # Extrair palavras-chave da descrição
-        palavras_chave = descricao.upper().split()
-        for palavra in palavras_chave:
-            if len(palavra) > 3:  # Só palavras com mais de 3 caracteres
-                query_com_fornecedor = query.join(Fornecedor).filter(
-                    Fornecedor.razao_social.ilike(f'%{palavra}%')
-                )
-                resultado = query_com_fornecedor.first()
-                if resultado:
-                    return resultado
+    for lote in lotes:
+        conta_info = lote.conta.to_dict()
+        if id(lote.conta) not in contas_vistas:
+            contas_vistas.add(id(lote.conta))
+            resumo['contas'].append(conta_info)
+        resumo['transacoes_lidas'] += len(lote)
+        
+        # Extratos da conta já gravados no período do lote, inclusive os dos lotes anteriores
+        existentes = extratos_existentes(*lote.periodo(), conta=conta_info['conta'])
+        
+        extratos_criados = []
+        for data_transacao, valor, tipo, descricao, id_transacao in lote:
+            # Verificar se transação já existe (no banco ou antes no mesmo arquivo)
+            chave = chave_extrato(id_transacao, data_transacao, valor)
+            if chave in existentes:
+                continue  # Pular transações duplicadas
+            existentes.add(chave)
+        
+            # Criar registro do extrato
+            extratos_criados.append(ExtratoBancario(
+                data_transacao=data_transacao,
+                valor=valor,
+                tipo_transacao=tipo,
+                descricao=descricao,
+                id_transacao=id_transacao,
+                banco=conta_info['banco'],
+                agencia=conta_info['agencia'],
+                conta=conta_info['conta'],
+                nome_arquivo=nome_arquivo,
+                status='NAO_CONCILIADO'
+            ))
+        
+        # Conciliação automática dos débitos do lote (um para um: as contas
+        # conciliadas nos lotes anteriores já saíram dos candidatos no flush)
+        resumo['conciliacoes_automaticas'] += conciliar_extratos(extratos_criados)
+        db.session.add_all(extratos_criados)
+        db.session.flush()
+        resumo['transacoes_importadas'] += len(extratos_criados)
     
-    # Retornar primeira correspondência por valor e data
-    return query.order_by(ContaPagar.data_vencimento.asc()).first()
+    return resumo
 
 @conciliacao_bp.route('/extratos', methods=['GET'])
+@condicional('extratos_bancarios')
 def listar_extratos():
     """Lista extratos bancários importados"""
     try:
@@ -105,24 +92,53 @@ def listar_extratos():
         if status:
             query = query.filter(ExtratoBancario.status == status)
         
-        extratos = query.order_by(
-            ExtratoBancario.data_transacao.desc()
-        ).paginate(
-            page=page, per_page=per_page, error_out=False
-        )
-        
-        return jsonify({
-            'success': True,
-            'data': [extrato.to_dict() for extrato in extratos.items],
-            'pagination': {
+        # ?cursor= usa paginação keyset (sem OFFSET); ?page= continua funcionando
+        if 'cursor' in request.args:
+            extratos, paginacao = paginar_keyset(
+                query, ORDEM_KEYSET,
+                request.args.get('cursor'), per_page,
+                contar=request.args.get('count', '').lower() == 'true',
+                descendente=True
+            )
+        else:
+            pagina = query.order_by(
+                ExtratoBancario.data_transacao.desc()
+            ).paginate(
+                page=page, per_page=per_page, error_out=False
+            )
+            extratos = pagina.items
+            paginacao = {
                 'page': page,
                 'per_page': per_page,
-                'total': extratos.total,
-                'pages': extratos.pages,
-                'has_next': extratos.has_next,
-                'has_prev': extratos.has_prev
+                'total': pagina.total,
+                'pages': pagina.pages,
+                'has_next': pagina.has_next,
+                'has_prev': pagina.has_prev
             }
+        
+        return jsonify({
+            'success': True,
+            'data': [extrato.to_dict() for extrato in extratos],
+            'pagination': paginacao
         })
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@conciliacao_bp.route('/extratos/exportar', methods=['GET'])
+def exportar_extratos():
+    """Exporta os extratos bancários em CSV ou XLSX (?formato=, ano, data_inicio, data_fim, status)"""
+    try:
+        conteudo, tipo_conteudo, nome_arquivo = exportar('extratos', filtros_exportacao(request.args))
+        return Response(
+            stream_with_context(conteudo),
+            content_type=tipo_conteudo,
+            headers={'Content-Disposition': f'attachment; filename={nome_arquivo}'}
+        )
+        
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -154,93 +170,38 @@ def upload_extrato_ofx():
         filepath = os.path.join(upload_dir, filename)
         file.save(filepath)
         
-        # Processar arquivo OFX
-        transacoes, conta_info = parse_ofx_file(filepath)
+        # Processar arquivo OFX em streaming, conta a conta, e salvar as transações no banco
+        resumo = importar_transacoes_extrato(ler_ofx(filepath), filename)
         
-        if not transacoes:
+        if not resumo['transacoes_lidas']:
+            db.session.rollback()
             return jsonify({
                 'success': False, 
                 'error': 'Nenhuma transação encontrada no arquivo OFX'
             }), 400
         
-        # Salvar transações no banco
-        extratos_criados = []
-        conciliacoes_automaticas = 0
-        
-        for transacao in transacoes:
-            # Verificar se transação já existe
-            extrato_existente = ExtratoBancario.query.filter_by(
-                id_transacao=transacao['id_transacao'],
-                data_transacao=transacao['data'],
-                valor=Decimal(str(transacao['valor']))
-            ).first()
-            
-            if extrato_existente:
-                continue  # Pular transações duplicadas
-            
-            # Criar registro do extrato
-            extrato = ExtratoBancario(
-                data_transacao=transacao['data'],
-                valor=Decimal(str(transacao['valor'])),
-                tipo_transacao=transacao['tipo'],
-                descricao=transacao['descricao'],
-                id_transacao=transacao['id_transacao'],
-                banco=conta_info.get('banco', ''),
-                agencia=conta_info.get('agencia', ''),
-                conta=conta_info.get('conta', ''),
-                nome_arquivo=filename,
-                status='NAO_CONCILIADO'
-            )
-            
-            # Tentar conciliação automática para débitos
-            if transacao['valor'] < 0:
-                conta_correspondente = find_matching_conta_pagar_for_transaction(
-                    transacao['valor'],
-                    transacao['data'],
-                    transacao['descricao']
-                )
-                
-                if conta_correspondente:
-                    # Criar conciliação automática
-                    conciliacao = ConciliacaoBancaria(
-                        extrato_bancario=extrato,
-                        conta_pagar=conta_correspondente,
-                        tipo_conciliacao='AUTOMATICA',
-                        data_conciliacao=datetime.now(),
-                        observacoes='Conciliação automática baseada em valor e data'
-                    )
-                    
-                    extrato.status = 'CONCILIADO'
-                    
-                    # Marcar conta como paga se ainda não estiver
-                    if conta_correspondente.status == 'PENDENTE':
-                        conta_correspondente.status = 'PAGO'
-                        conta_correspondente.data_pagamento = transacao['data']
-                        conta_correspondente.valor_pago = Decimal(str(abs(transacao['valor'])))
-                    
-                    db.session.add(conciliacao)
-                    conciliacoes_automaticas += 1
-            
-            db.session.add(extrato)
-            extratos_criados.append(extrato)
-        
         db.session.commit()
         
         return jsonify({
             'success': True,
-            'message': f'Extrato processado com sucesso. {len(extratos_criados)} transações importadas, {conciliacoes_automaticas} conciliações automáticas',
+            'message': f"Extrato processado com sucesso. {resumo['transacoes_importadas']} transações importadas, {resumo['conciliacoes_automaticas']} conciliações automáticas",
             'data': {
-                'transacoes_importadas': len(extratos_criados),
-                'conciliacoes_automaticas': conciliacoes_automaticas,
-                'conta_info': conta_info
+                'transacoes_importadas': resumo['transacoes_importadas'],
+                'conciliacoes_automaticas': resumo['conciliacoes_automaticas'],
+                'conta_info': resumo['contas'][0],
+                'contas': resumo['contas']
             }
         }), 201
         
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': f'Arquivo OFX inválido: {e}'}), 400
     except Exception as e:
         db.session.rollback()
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @conciliacao_bp.route('/conciliacoes', methods=['GET'])
+@condicional('conciliacoes_bancarias', 'extratos_bancarios', *TABELAS_CONTAS)
 def listar_conciliacoes():
     """Lista conciliações bancárias"""
     try:
@@ -253,6 +214,9 @@ def listar_conciliacoes():
         if tipo:
             query = query.filter(ConciliacaoBancaria.tipo_conciliacao == tipo)
         
+        # fields/expand: só as relações pedidas, carregadas em lote
+        query, fields, expand = aplicar_projecao(query, ConciliacaoBancaria, request.args)
+        
         conciliacoes = query.order_by(
             ConciliacaoBancaria.data_conciliacao.desc()
         ).paginate(
@@ -261,7 +225,7 @@ def listar_conciliacoes():
         
         return jsonify({
             'success': True,
-            'data': [conciliacao.to_dict() for conciliacao in conciliacoes.items],
+            'data': [conciliacao.to_dict(fields, expand) for conciliacao in conciliacoes.items],
             'pagination': {
                 'page': page,
                 'per_page': per_page,
@@ -271,6 +235,8 @@ def listar_conciliacoes():
                 'has_prev': conciliacoes.has_prev
             }
         })
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -315,7 +281,7 @@ def conciliar_manual():
         extrato.status = 'CONCILIADO'
         
         # Marcar conta como paga se ainda não estiver
-        if conta_pagar.status == 'PENDENTE':
+        if conta_pagar.status in ContaPagar.status_em_aberto:
             conta_pagar.status = 'PAGO'
             conta_pagar.data_pagamento = extrato.data_transacao
             conta_pagar.valor_pago = abs(extrato.valor)
@@ -333,6 +299,40 @@ def conciliar_manual():
         db.session.rollback()
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@conciliacao_bp.route('/conciliacoes/reprocessar', methods=['POST'])
+def reprocessar_conciliacao_automatica():
+    """Roda de novo a conciliação automática dos débitos não conciliados.
+    
+    JSON opcional: data_inicio, data_fim (AAAA-MM-DD) e refazer_automaticas,
+    que desfaz as conciliações automáticas do período antes de recalcular.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        
+        datas = {}
+        for campo in ('data_inicio', 'data_fim'):
+            if data.get(campo):
+                try:
+                    datas[campo] = datetime.strptime(data[campo], '%Y-%m-%d').date()
+                except (TypeError, ValueError):
+                    return jsonify({'success': False, 'error': f'{campo} inválida, use AAAA-MM-DD'}), 400
+        
+        resultado = reprocessar_conciliacoes(
+            refazer_automaticas=bool(data.get('refazer_automaticas')),
+            **datas
+        )
+        db.session.commit()
+        
+        return jsonify({
+            'success': True,
+            'data': resultado,
+            'message': f"{resultado['conciliacoes_automaticas']} conciliações automáticas"
+        })
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @conciliacao_bp.route('/conciliacoes/<int:conciliacao_id>/desfazer', methods=['POST'])
 def desfazer_conciliacao(conciliacao_id):
     """Desfaz uma conciliação bancária"""
@@ -363,6 +363,7 @@ def desfazer_conciliacao(conciliacao_id):
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @conciliacao_bp.route('/extratos/sugestoes/<int:extrato_id>', methods=['GET'])
+@condicional('extratos_bancarios', *TABELAS_CONTAS)
 def sugerir_contas_para_extrato(extrato_id):
     """Sugere contas a pagar para conciliar com extrato"""
     try:
@@ -387,7 +388,7 @@ def sugerir_contas_para_extrato(extrato_id):
         query = ContaPagar.query.filter(
             ContaPagar.valor_original.between(valor_min, valor_max),
             ContaPagar.data_vencimento.between(data_inicio, data_fim),
-            ContaPagar.status.in_(['PENDENTE', 'PAGO'])
+            ContaPagar.status.in_(ContaPagar.status_em_aberto + ('PAGO',))
         )
         
         # Priorizar por proximidade de data
@@ -407,30 +408,30 @@ def sugerir_contas_para_extrato(extrato_id):
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @conciliacao_bp.route('/dashboard/conciliacao', methods=['GET'])
+@condicional('resumo_financeiro', 'extratos_bancarios', 'conciliacoes_bancarias', 'contas_pagar')
 def dashboard_conciliacao():
     """Dashboard de conciliação bancária"""
     try:
-        # Estatísticas de extratos
-        total_extratos = ExtratoBancario.query.count()
-        extratos_conciliados = ExtratoBancario.query.filter_by(status='CONCILIADO').count()
-        extratos_nao_conciliados = ExtratoBancario.query.filter_by(status='NAO_CONCILIADO').count()
-        
-        # Estatísticas de conciliações
-        total_conciliacoes = ConciliacaoBancaria.query.count()
-        conciliacoes_automaticas = ConciliacaoBancaria.query.filter_by(tipo_conciliacao='AUTOMATICA').count()
-        conciliacoes_manuais = ConciliacaoBancaria.query.filter_by(tipo_conciliacao='MANUAL').count()
-        
-        # Valores
-        valor_total_extratos = db.session.query(
-            db.func.sum(ExtratoBancario.valor)
-        ).filter(ExtratoBancario.valor < 0).scalar() or 0
-        
-        valor_conciliado = db.session.query(
-            db.func.sum(ExtratoBancario.valor)
-        ).filter(
-            ExtratoBancario.valor < 0,
-            ExtratoBancario.status == 'CONCILIADO'
-        ).scalar() or 0
+        # Contadores e valores lidos dos baldes do resumo (O(baldes))
+        extrato = ResumoFinanceiro.origem == 'EXTRATO'
+        conciliacao = ResumoFinanceiro.origem == 'CONCILIACAO'
+        (total_extratos, extratos_conciliados, extratos_nao_conciliados,
+         total_conciliacoes, conciliacoes_automaticas, conciliacoes_manuais,
+         valor_total_extratos, valor_conciliado) = db.session.query(
+            db.func.sum(ResumoFinanceiro.quantidade).filter(extrato),
+            db.func.sum(ResumoFinanceiro.quantidade).filter(extrato, ResumoFinanceiro.status == 'CONCILIADO'),
+            db.func.sum(ResumoFinanceiro.quantidade).filter(extrato, ResumoFinanceiro.status == 'NAO_CONCILIADO'),
+            db.func.sum(ResumoFinanceiro.quantidade).filter(conciliacao),
+            db.func.sum(ResumoFinanceiro.quantidade).filter(conciliacao, ResumoFinanceiro.status == 'AUTOMATICA'),
+            db.func.sum(ResumoFinanceiro.quantidade).filter(conciliacao, ResumoFinanceiro.status == 'MANUAL'),
+            db.func.sum(ResumoFinanceiro.valor).filter(extrato),
+            db.func.sum(ResumoFinanceiro.valor).filter(extrato, ResumoFinanceiro.status == 'CONCILIADO')
+        ).filter(ResumoFinanceiro.origem.in_(['EXTRATO', 'CONCILIACAO'])).one()
+        
+        total_extratos = total_extratos or 0
+        extratos_conciliados = extratos_conciliados or 0
+        valor_total_extratos = valor_total_extratos or 0
+        valor_conciliado = valor_conciliado or 0
         
         return jsonify({
             'success': True,
@@ -438,13 +439,13 @@ def dashboard_conciliacao():
                 'extratos': {
                     'total': total_extratos,
                     'conciliados': extratos_conciliados,
-                    'nao_conciliados': extratos_nao_conciliados,
+                    'nao_conciliados': extratos_nao_conciliados or 0,
                     'percentual_conciliado': round((extratos_conciliados / total_extratos * 100) if total_extratos > 0 else 0, 2)
                 },
                 'conciliacoes': {
-                    'total': total_conciliacoes,
-                    'automaticas': conciliacoes_automaticas,
-                    'manuais': conciliacoes_manuais
+                    'total': total_conciliacoes or 0,
+                    'automaticas': conciliacoes_automaticas or 0,
+                    'manuais': conciliacoes_manuais or 0
                 },
                 'valores': {
                     'total_debitos': float(abs(valor_total_extratos)),
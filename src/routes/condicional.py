@@ -0,0 +1,64 @@
+"""GET condicional para as rotas de leitura: ETag fraco e Last-Modified.
+
+@condicional(tabelas...) calcula o ETag a partir das versões das tabelas de
+que a resposta depende (src/services/versoes.py), com uma consulta pequena
+à versoes_tabelas. Se o If-None-Match (ou, sem ele, o If-Modified-Since)
+bater, responde 304 sem chamar a rota: nem a consulta principal nem a
+serialização rodam. As respostas vão com Cache-Control: no-cache, então o
+navegador sempre revalida em vez de reaproveitar dados antigos.
+
+Rotas que dependem da data de hoje (vencidas, dashboard, fluxo de caixa)
+usam diario=True: a data entra no ETag e não há Last-Modified.
+"""
+import hashlib
+from datetime import date, timezone
+from functools import wraps
+from flask import Response, make_response, request
+from src.services.versoes import versoes
+
+# Tabelas lidas pela saída completa das contas (fornecedor, tipo de despesa e nota com itens)
+TABELAS_CONTAS = ('contas_pagar', 'fornecedores', 'tipos_despesa', 'notas_fiscais', 'itens_nota_fiscal')
+
+def _validadores(tabelas, diario):
+    estado = versoes(tabelas)
+    partes = [f'{tabela}:{estado[tabela][0] if tabela in estado else 0}' for tabela in tabelas]
+    if diario:
+        partes.append(date.today().isoformat())
+    etag = hashlib.sha1('|'.join(partes).encode()).hexdigest()[:20]
+
+    ultima_alteracao = None
+    if not diario:
+        datas = [atualizado_em for _, atualizado_em in estado.values() if atualizado_em]
+        if datas:
+            ultima_alteracao = max(datas).replace(microsecond=0, tzinfo=timezone.utc)
+    return etag, ultima_alteracao
+
+def _nao_modificado(etag, ultima_alteracao):
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    if request.if_modified_since and ultima_alteracao:
+        return ultima_alteracao <= request.if_modified_since
+    return False
+
+def _validar(resposta, etag, ultima_alteracao):
+    resposta.set_etag(etag, weak=True)
+    if ultima_alteracao:
+        resposta.last_modified = ultima_alteracao
+    resposta.cache_control.no_cache = True
+    return resposta
+
+def condicional(*tabelas, diario=False):
+    """Responde 304 quando nenhuma das `tabelas` mudou desde a versão que o cliente tem"""
+    def decorador(rota):
+        @wraps(rota)
+        def rota_condicional(*args, **kwargs):
+            etag, ultima_alteracao = _validadores(tabelas, diario)
+            if _nao_modificado(etag, ultima_alteracao):
+                return _validar(Response(status=304), etag, ultima_alteracao)
+
+            resposta = make_response(rota(*args, **kwargs))
+            if resposta.status_code == 200:
+                _validar(resposta, etag, ultima_alteracao)
+            return resposta
+        return rota_condicional
+    return decorador
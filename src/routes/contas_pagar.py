@@ -1,12 +1,74 @@
-from flask import Blueprint, request, jsonify
-from src.models.financeiro import db, ContaPagar, Fornecedor, TipoDespesa, NotaFiscal
-from datetime import datetime, date
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from src.models.financeiro import db, ContaPagar, Fornecedor, TipoDespesa, NotaFiscal, ResumoFinanceiro, ExecucaoTarefa
+from datetime import datetime, date, timedelta
 from decimal import Decimal
-from sqlalchemy import and_, or_
+from sqlalchemy import and_, or_, select
+from src.services.projecao import aplicar_projecao
+from src.services.paginacao import paginar_keyset
+from src.services.busca import busca_disponivel, filtrar_busca
+import src.services.resumo_financeiro  # mantém o resumo_financeiro no after_flush
+from src.agendador import executar_tarefa
+from src.services.contas_lote import criar_contas, pagar_contas, cancelar_contas, reagendar_contas
+from src.services.fluxo_caixa import fluxo_caixa, calendario_vencimentos
+from src.services.aging import aging_contas, interpretar_limites, LIMITES_PADRAO
+from src.services.exportacao import exportar, filtros_exportacao
+from src.routes.condicional import condicional, TABELAS_CONTAS
 
 contas_pagar_bp = Blueprint('contas_pagar', __name__)
 
+PERIODOS_DASHBOARD = ('mes', 'trimestre', 'ano')
+
+# /contas-pagar/lote/<operacao>: função do lote e status dos itens aplicados
+OPERACOES_LOTE = {
+    'criar': (criar_contas, 'criada'),
+    'pagar': (pagar_contas, 'paga'),
+    'cancelar': (cancelar_contas, 'cancelada'),
+    'reagendar': (reagendar_contas, 'reagendada')
+}
+
+# Ordem da paginação keyset das contas
+ORDEM_KEYSET = [ContaPagar.data_vencimento, ContaPagar.id]
+
+def consulta_pendentes_vencidas_no_mes(inicio_mes, hoje):
+    """Soma e quantidade das pendentes do mês atual que venceram e ainda não foram marcadas"""
+    return select(db.func.sum(ContaPagar.valor_original), db.func.count()).where(
+        ContaPagar.status == 'PENDENTE',
+        ContaPagar.data_vencimento >= inicio_mes,
+        ContaPagar.data_vencimento < hoje
+    )
+
+def consulta_proximos_vencimentos(hoje, dias=30, limite=10):
+    """Pendentes que vencem nos próximos `dias`, só com as colunas exibidas no dashboard"""
+    return select(
+        ContaPagar.id,
+        ContaPagar.descricao,
+        ContaPagar.data_vencimento,
+        ContaPagar.valor_original,
+        ContaPagar.status,
+        Fornecedor.razao_social
+    ).outerjoin(Fornecedor, Fornecedor.id == ContaPagar.fornecedor_id).where(
+        ContaPagar.status == 'PENDENTE',
+        ContaPagar.data_vencimento.between(hoje, hoje + timedelta(days=dias))
+    ).order_by(ContaPagar.data_vencimento.asc()).limit(limite)
+
+def intervalo_periodo(periodo, referencia):
+    """Primeiro e último dia do mês, trimestre ou ano que contém `referencia`"""
+    if periodo == 'mes':
+        inicio = referencia.replace(day=1)
+        meses = 1
+    elif periodo == 'trimestre':
+        inicio = date(referencia.year, (referencia.month - 1) // 3 * 3 + 1, 1)
+        meses = 3
+    else:
+        inicio = date(referencia.year, 1, 1)
+        meses = 12
+    
+    ano_seguinte, mes_seguinte = divmod(inicio.month - 1 + meses, 12)
+    fim = date(inicio.year + ano_seguinte, mes_seguinte + 1, 1) - timedelta(days=1)
+    return inicio, fim
+
 @contas_pagar_bp.route('/contas-pagar', methods=['GET'])
+@condicional(*TABELAS_CONTAS, diario=True)
 def listar_contas_pagar():
     """Lista contas a pagar com filtros"""
     try:
@@ -22,8 +84,11 @@ def listar_contas_pagar():
         
         query = ContaPagar.query
         
-        # Filtro por texto
-        if search:
+        # Filtro por texto: índice de busca (FTS5/tsvector) ou ILIKE se indisponível
+        relevancia = None
+        if search and busca_disponivel():
+            query, relevancia = filtrar_busca(query, ContaPagar, search)
+        elif search:
             query = query.join(Fornecedor).filter(
                 or_(
                     ContaPagar.descricao.ilike(f'%{search}%'),
@@ -59,36 +124,56 @@ def listar_contas_pagar():
             except ValueError:
                 pass
         
-        # Filtro por contas vencidas
+        # Filtro por contas vencidas (marcadas ou não pela tarefa diária)
         if vencidas:
             hoje = date.today()
             query = query.filter(
                 and_(
                     ContaPagar.data_vencimento < hoje,
-                    ContaPagar.status == 'PENDENTE'
+                    ContaPagar.status.in_(ContaPagar.status_em_aberto)
                 )
             )
         
-        contas = query.order_by(ContaPagar.data_vencimento.asc()).paginate(
-            page=page, per_page=per_page, error_out=False
-        )
+        # fields/expand: só as relações pedidas, carregadas em lote
+        query, fields, expand = aplicar_projecao(query, ContaPagar, request.args)
         
-        return jsonify({
-            'success': True,
-            'data': [conta.to_dict() for conta in contas.items],
-            'pagination': {
+        # ?cursor= usa paginação keyset (sem OFFSET); ?page= continua funcionando
+        if 'cursor' in request.args:
+            contas, paginacao = paginar_keyset(
+                query, ORDEM_KEYSET,
+                request.args.get('cursor'), per_page,
+                contar=request.args.get('count', '').lower() == 'true'
+            )
+        else:
+            # Com busca, os resultados mais relevantes vêm primeiro
+            ordem = [ContaPagar.data_vencimento.asc()]
+            if relevancia is not None:
+                ordem.insert(0, relevancia)
+            pagina = query.order_by(*ordem).paginate(
+                page=page, per_page=per_page, error_out=False
+            )
+            contas = pagina.items
+            paginacao = {
                 'page': page,
                 'per_page': per_page,
-                'total': contas.total,
-                'pages': contas.pages,
-                'has_next': contas.has_next,
-                'has_prev': contas.has_prev
+                'total': pagina.total,
+                'pages': pagina.pages,
+                'has_next': pagina.has_next,
+                'has_prev': pagina.has_prev
             }
+        
+        return jsonify({
+            'success': True,
+            'data': [conta.to_dict(fields, expand) for conta in contas],
+            'pagination': paginacao
         })
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @contas_pagar_bp.route('/contas-pagar/<int:conta_id>', methods=['GET'])
+@condicional(*TABELAS_CONTAS)
 def obter_conta_pagar(conta_id):
     """Obtém uma conta a pagar específica"""
     try:
@@ -301,6 +386,43 @@ def pagar_conta(conta_id):
         db.session.rollback()
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@contas_pagar_bp.route('/contas-pagar/lote/<operacao>', methods=['POST'])
+def operacao_lote_contas_pagar(operacao):
+    """Cria, paga, cancela ou reagenda várias contas em uma transação"""
+    try:
+        if operacao not in OPERACOES_LOTE:
+            return jsonify({
+                'success': False,
+                'error': f'Operação inválida. Use: {", ".join(OPERACOES_LOTE)}'
+            }), 404
+        
+        data = request.get_json(silent=True) or {}
+        executar, status_aplicado = OPERACOES_LOTE[operacao]
+        relatorio = executar(data.get('itens'))
+        
+        db.session.commit()
+        
+        aplicados = sum(1 for resultado in relatorio if resultado['status'] == status_aplicado)
+        erros = len(relatorio) - aplicados
+        
+        return jsonify({
+            'success': True,
+            'data': relatorio,
+            'resumo': {
+                'total': len(relatorio),
+                'aplicados': aplicados,
+                'erros': erros
+            },
+            'message': f'{aplicados} contas processadas, {erros} com erro'
+        })
+        
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @contas_pagar_bp.route('/contas-pagar/<int:conta_id>', methods=['DELETE'])
 def deletar_conta_pagar(conta_id):
     """Deleta uma conta a pagar"""
@@ -331,95 +453,209 @@ def deletar_conta_pagar(conta_id):
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @contas_pagar_bp.route('/contas-pagar/dashboard', methods=['GET'])
+@condicional(*TABELAS_CONTAS, 'resumo_financeiro', diario=True)
 def dashboard_contas_pagar():
     """Retorna dados para dashboard de contas a pagar"""
     try:
         hoje = date.today()
+        periodo = request.args.get('periodo', '')
         
-        # Totais por status
-        total_pendente = db.session.query(db.func.sum(ContaPagar.valor_original)).filter(
-            ContaPagar.status == 'PENDENTE'
-        ).scalar() or 0
-        
-        total_pago = db.session.query(db.func.sum(ContaPagar.valor_pago)).filter(
-            ContaPagar.status == 'PAGO'
-        ).scalar() or 0
-        
-        total_vencido = db.session.query(db.func.sum(ContaPagar.valor_original)).filter(
-            and_(
-                ContaPagar.status == 'PENDENTE',
-                ContaPagar.data_vencimento < hoje
-            )
-        ).scalar() or 0
-        
-        # Contadores
-        count_pendente = ContaPagar.query.filter(ContaPagar.status == 'PENDENTE').count()
-        count_pago = ContaPagar.query.filter(ContaPagar.status == 'PAGO').count()
-        count_vencido = ContaPagar.query.filter(
-            and_(
-                ContaPagar.status == 'PENDENTE',
-                ContaPagar.data_vencimento < hoje
-            )
-        ).count()
+        if periodo and periodo not in PERIODOS_DASHBOARD:
+            return jsonify({
+                'success': False,
+                'error': f'Período inválido. Use: {", ".join(PERIODOS_DASHBOARD)}'
+            }), 400
         
-        # Próximos vencimentos (próximos 30 dias)
-        from datetime import timedelta
-        data_limite = hoje + timedelta(days=30)
+        inicio_mes = hoje.replace(day=1)
+        conta = ResumoFinanceiro.origem == 'CONTA'
+        pendente = ResumoFinanceiro.status.in_(ContaPagar.status_em_aberto)
+        pago = ResumoFinanceiro.status == 'PAGO'
         
-        proximos_vencimentos = ContaPagar.query.filter(
-            and_(
-                ContaPagar.status == 'PENDENTE',
-                ContaPagar.data_vencimento.between(hoje, data_limite)
-            )
-        ).order_by(ContaPagar.data_vencimento.asc()).limit(10).all()
+        # Totais lidos dos baldes do resumo (O(baldes)). Vencidas: as já marcadas como
+        # VENCIDO e as pendentes de meses anteriores ao atual, que venceram inteiras
+        vencido = or_(
+            ResumoFinanceiro.status == 'VENCIDO',
+            and_(ResumoFinanceiro.status == 'PENDENTE', ResumoFinanceiro.mes < inicio_mes)
+        )
+        query = db.session.query(
+            db.func.sum(ResumoFinanceiro.valor).filter(pendente),
+            db.func.sum(ResumoFinanceiro.valor_pago).filter(pago),
+            db.func.sum(ResumoFinanceiro.valor).filter(vencido),
+            db.func.sum(ResumoFinanceiro.quantidade).filter(pendente),
+            db.func.sum(ResumoFinanceiro.quantidade).filter(pago),
+            db.func.sum(ResumoFinanceiro.quantidade).filter(vencido)
+        ).filter(conta, ResumoFinanceiro.status.in_(ContaPagar.status_em_aberto + ('PAGO',)))
+        
+        inicio_periodo = fim_periodo = None
+        if periodo:
+            inicio_periodo, fim_periodo = intervalo_periodo(periodo, hoje)
+            query = query.filter(ResumoFinanceiro.mes.between(inicio_periodo, fim_periodo))
+        
+        total_pendente, total_pago, total_vencido, count_pendente, count_pago, count_vencido = query.one()
+        
+        # Pendentes do mês atual ainda não marcadas: só as linhas deste mês (índice por status e vencimento)
+        vencido_mes, count_vencido_mes = db.session.execute(consulta_pendentes_vencidas_no_mes(inicio_mes, hoje)).one()
+        total_vencido = (total_vencido or 0) + (vencido_mes or 0)
+        count_vencido = (count_vencido or 0) + count_vencido_mes
+        
+        # Próximos vencimentos (próximos 30 dias): só as colunas exibidas
+        proximos_vencimentos = db.session.execute(consulta_proximos_vencimentos(hoje)).all()
         
         return jsonify({
             'success': True,
             'data': {
+                'periodo': {
+                    'tipo': periodo or None,
+                    'inicio': inicio_periodo.isoformat() if inicio_periodo else None,
+                    'fim': fim_periodo.isoformat() if fim_periodo else None
+                },
                 'totais': {
-                    'pendente': float(total_pendente),
-                    'pago': float(total_pago),
-                    'vencido': float(total_vencido)
+                    'pendente': float(total_pendente or 0),
+                    'pago': float(total_pago or 0),
+                    'vencido': float(total_vencido or 0)
                 },
                 'contadores': {
-                    'pendente': count_pendente,
-                    'pago': count_pago,
+                    'pendente': count_pendente or 0,
+                    'pago': count_pago or 0,
                     'vencido': count_vencido
                 },
-                'proximos_vencimentos': [conta.to_dict() for conta in proximos_vencimentos]
+                'proximos_vencimentos': [
+                    {
+                        'id': conta.id,
+                        'descricao': conta.descricao,
+                        'data_vencimento': conta.data_vencimento.isoformat(),
+                        'valor_original': float(conta.valor_original) if conta.valor_original else 0,
+                        'status': conta.status,
+                        'fornecedor': {'razao_social': conta.razao_social} if conta.razao_social else None
+                    }
+                    for conta in proximos_vencimentos
+                ]
             }
         })
         
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@contas_pagar_bp.route('/contas-pagar/fluxo-caixa', methods=['GET'])
+@condicional('contas_pagar', diario=True)
+def fluxo_caixa_contas_pagar():
+    """Saídas previstas e pagamentos realizados por dia, semana ou mês"""
+    try:
+        meses = request.args.get('meses', 3, type=int)
+        granularidade = request.args.get('granularidade', 'mes')
+        
+        return jsonify({
+            'success': True,
+            'data': fluxo_caixa(meses, granularidade)
+        })
+        
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@contas_pagar_bp.route('/contas-pagar/calendario', methods=['GET'])
+@condicional('contas_pagar', diario=True)
+def calendario_contas_pagar():
+    """Quantidade e valor das contas que vencem em cada dia do mês (?mes=AAAA-MM)"""
+    try:
+        mes = request.args.get('mes', '')
+        if mes:
+            try:
+                referencia = datetime.strptime(mes, '%Y-%m').date()
+            except ValueError:
+                return jsonify({'success': False, 'error': 'Mês inválido. Use AAAA-MM'}), 400
+        else:
+            referencia = date.today()
+        
+        return jsonify({
+            'success': True,
+            'data': calendario_vencimentos(referencia.year, referencia.month)
+        })
+        
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@contas_pagar_bp.route('/contas-pagar/aging', methods=['GET'])
+@condicional('contas_pagar', 'fornecedores', 'tipos_despesa', diario=True)
+def aging_contas_pagar():
+    """Contas em aberto por faixa de atraso, por fornecedor e tipo de despesa"""
+    try:
+        data_referencia = request.args.get('data_referencia', '')
+        if data_referencia:
+            try:
+                referencia = datetime.strptime(data_referencia, '%Y-%m-%d').date()
+            except ValueError:
+                return jsonify({'success': False, 'error': 'Data de referência inválida'}), 400
+        else:
+            referencia = date.today()
+        
+        faixas = request.args.get('faixas', '')
+        limites = interpretar_limites(faixas) if faixas else LIMITES_PADRAO
+        usar_cache = request.args.get('cache', 'true').lower() != 'false'
+        
+        return jsonify({
+            'success': True,
+            'data': aging_contas(referencia, limites, usar_cache)
+        })
+        
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@contas_pagar_bp.route('/contas-pagar/exportar', methods=['GET'])
+def exportar_contas_pagar():
+    """Exporta as contas a pagar em CSV ou XLSX (?formato=, ano, data_inicio, data_fim, status)"""
+    try:
+        conteudo, tipo_conteudo, nome_arquivo = exportar('contas_pagar', filtros_exportacao(request.args))
+        return Response(
+            stream_with_context(conteudo),
+            content_type=tipo_conteudo,
+            headers={'Content-Disposition': f'attachment; filename={nome_arquivo}'}
+        )
+        
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @contas_pagar_bp.route('/contas-pagar/atualizar-status', methods=['POST'])
 def atualizar_status_automatico():
     """Atualiza status das contas automaticamente (vencidas)"""
     try:
-        hoje = date.today()
-        
-        # Marca contas vencidas
-        contas_vencidas = ContaPagar.query.filter(
-            and_(
-                ContaPagar.status == 'PENDENTE',
-                ContaPagar.data_vencimento < hoje
-            )
-        ).all()
-        
-        count_atualizadas = 0
-        for conta in contas_vencidas:
-            conta.status = 'VENCIDO'
-            count_atualizadas += 1
+        execucao = executar_tarefa('contas_vencidas', origem='API')
         
-        db.session.commit()
+        if execucao.status != 'SUCESSO':
+            return jsonify({'success': False, 'error': execucao.mensagem, 'data': execucao.to_dict()}), 500
         
         return jsonify({
             'success': True,
-            'message': f'{count_atualizadas} contas marcadas como vencidas'
+            'data': execucao.to_dict(),
+            'message': f'{execucao.linhas_afetadas} contas marcadas como vencidas'
         })
         
     except Exception as e:
         db.session.rollback()
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@contas_pagar_bp.route('/contas-pagar/atualizar-status', methods=['GET'])
+@condicional('execucoes_tarefas')
+def listar_execucoes_atualizar_status():
+    """Últimas execuções da marcação de contas vencidas (agendador e API)"""
+    try:
+        limite = min(request.args.get('limite', 20, type=int), 100)
+        
+        execucoes = ExecucaoTarefa.query.filter_by(tarefa='contas_vencidas').order_by(
+            ExecucaoTarefa.inicio.desc()
+        ).limit(limite).all()
+        
+        return jsonify({
+            'success': True,
+            'data': [execucao.to_dict() for execucao in execucoes]
+        })
+        
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
@@ -1,7 +1,10 @@
 from flask import Blueprint, request, jsonify
 from src.models.financeiro import db, Fornecedor
 from sqlalchemy.exc import IntegrityError
+from src.services.busca import busca_disponivel, filtrar_busca
+from src.services.indice_fornecedores import indice_fornecedores
 import re
+from src.routes.condicional import condicional
 
 fornecedores_bp = Blueprint('fornecedores', __name__)
 
@@ -18,6 +21,7 @@ def formatar_cnpj(cnpj):
     return cnpj
 
 @fornecedores_bp.route('/fornecedores', methods=['GET'])
+@condicional('fornecedores')
 def listar_fornecedores():
     """Lista todos os fornecedores"""
     try:
@@ -27,7 +31,11 @@ def listar_fornecedores():
         
         query = Fornecedor.query
         
-        if search:
+        # Filtro por texto: índice de busca (FTS5/tsvector) ou ILIKE se indisponível
+        relevancia = None
+        if search and busca_disponivel():
+            query, relevancia = filtrar_busca(query, Fornecedor, search)
+        elif search:
             query = query.filter(
                 db.or_(
                     Fornecedor.razao_social.ilike(f'%{search}%'),
@@ -36,7 +44,12 @@ def listar_fornecedores():
                 )
             )
         
-        fornecedores = query.order_by(Fornecedor.razao_social).paginate(
+        # Com busca, os resultados mais relevantes vêm primeiro
+        ordem = [Fornecedor.razao_social]
+        if relevancia is not None:
+            ordem.insert(0, relevancia)
+        
+        fornecedores = query.order_by(*ordem).paginate(
             page=page, per_page=per_page, error_out=False
         )
         
@@ -56,6 +69,7 @@ def listar_fornecedores():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @fornecedores_bp.route('/fornecedores/<int:fornecedor_id>', methods=['GET'])
+@condicional('fornecedores')
 def obter_fornecedor(fornecedor_id):
     """Obtém um fornecedor específico"""
     try:
@@ -104,6 +118,7 @@ def criar_fornecedor():
         
         db.session.add(fornecedor)
         db.session.commit()
+        indice_fornecedores().atualizar(fornecedor)
         
         return jsonify({
             'success': True,
@@ -151,6 +166,7 @@ def atualizar_fornecedor(fornecedor_id):
                 setattr(fornecedor, campo, data[campo])
         
         db.session.commit()
+        indice_fornecedores().atualizar(fornecedor)
         
         return jsonify({
             'success': True,
@@ -180,6 +196,7 @@ def deletar_fornecedor(fornecedor_id):
         
         db.session.delete(fornecedor)
         db.session.commit()
+        indice_fornecedores().remover(fornecedor_id)
         
         return jsonify({
             'success': True,
@@ -191,6 +208,7 @@ def deletar_fornecedor(fornecedor_id):
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @fornecedores_bp.route('/fornecedores/buscar-cnpj/<cnpj>', methods=['GET'])
+@condicional('fornecedores')
 def buscar_por_cnpj(cnpj):
     """Busca fornecedor por CNPJ"""
     try:
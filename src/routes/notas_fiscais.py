@@ -1,186 +1,114 @@
-from flask import Blueprint, request, jsonify
-from src.models.financeiro import db, NotaFiscal, ItemNotaFiscal, Fornecedor, ContaPagar, TipoDespesa
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from src.models.financeiro import db, NotaFiscal, Fornecedor
+from src.services.nfe_parser import processar_xml_nfe_stream
+from src.services.nfe_persistencia import salvar_nota_fiscal
+from src.services.nfe_duplicidade import verificar_duplicidade, indice_duplicidade
+from src.services.nfe_xsd import validar_nfe
+from src.services.projecao import aplicar_projecao
+from src.services.paginacao import paginar_keyset
+from src.services.busca import busca_disponivel, filtrar_busca
+from src.services.exportacao import exportar, filtros_exportacao
 from werkzeug.utils import secure_filename
-import xml.etree.ElementTree as ET
-from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+import io
 import os
-import re
-from decimal import Decimal
+import time
+import zipfile
+from src.routes.condicional import condicional
 
 notas_fiscais_bp = Blueprint('notas_fiscais', __name__)
 
-def processar_xml_nfe(xml_content):
-    """Processa XML da NFe e extrai dados relevantes"""
+# Configurações da importação em lote
+LOTE_MAX_WORKERS = min(4, os.cpu_count() or 1)
+LOTE_MIN_PARALELO = 8  # Abaixo disso o custo de subir o pool não compensa
+LOTE_TAMANHO_TRANSACAO = 50  # Notas por commit
+LOTE_MAX_TAMANHO_XML = 10 * 1024 * 1024  # Limite por XML descompactado
+LOTE_MAX_ARQUIVOS = 2000  # XMLs por lote, somando os de dentro dos ZIPs
+LOTE_MAX_TAMANHO_TOTAL = 256 * 1024 * 1024  # Soma dos XMLs descompactados do lote
+
+# Ordem da paginação keyset das notas
+ORDEM_KEYSET = [NotaFiscal.data_emissao, NotaFiscal.id]
+
+def _validacao_xsd_solicitada():
+    """Validação XSD ligada por padrão; `validar_xsd=false` a desliga (importações confiáveis)"""
+    return request.values.get('validar_xsd', 'true').lower() != 'false'
+
+def _processar_arquivo_lote(arquivo):
+    """Worker do pool de processos: valida e processa um XML do lote sem tocar no banco.
+
+    Retorna (nome, dados, erro, ms gastos na validação XSD).
+    """
+    nome, conteudo, validar_xsd = arquivo
+    tempo_validacao_ms = 0.0
     try:
-        # Parse do XML
-        root = ET.fromstring(xml_content)
-        
-        # Namespace da NFe
-        ns = {'nfe': 'http://www.portalfiscal.inf.br/nfe'}
-        
-        # Busca o elemento infNFe
-        inf_nfe = root.find('.//nfe:infNFe', ns)
-        if inf_nfe is None:
-            raise ValueError("XML inválido: elemento infNFe não encontrado")
-        
-        # Dados da identificação
-        ide = inf_nfe.find('nfe:ide', ns)
-        numero = ide.find('nfe:nNF', ns).text if ide.find('nfe:nNF', ns) is not None else ''
-        serie = ide.find('nfe:serie', ns).text if ide.find('nfe:serie', ns) is not None else ''
-        data_emissao_str = ide.find('nfe:dhEmi', ns).text if ide.find('nfe:dhEmi', ns) is not None else ''
-        natureza_operacao = ide.find('nfe:natOp', ns).text if ide.find('nfe:natOp', ns) is not None else ''
-        
-        # Converte data de emissão
-        data_emissao = None
-        if data_emissao_str:
+        if validar_xsd:
+            tempo_validacao_ms = validar_nfe(conteudo)['tempo_ms']
+        return nome, processar_xml_nfe_stream(conteudo), None, tempo_validacao_ms
+    except ValueError as e:
+        return nome, None, str(e), tempo_validacao_ms
+
+def _ler_arquivos_lote(files):
+    """Expande os arquivos enviados (XMLs soltos ou ZIPs) em pares (nome, conteúdo).
+
+    O lote inteiro fica em memória até o processamento, então antes de ler o
+    conteúdo de um ZIP o diretório dele é conferido contra LOTE_MAX_ARQUIVOS e
+    LOTE_MAX_TAMANHO_TOTAL (pelos tamanhos declarados, que o zipfile não deixa
+    ultrapassar na leitura). Lança ValueError se o lote passar dos limites.
+    """
+    arquivos = []
+    erros = []
+    total = 0
+
+    def reservar(quantidade, tamanho):
+        nonlocal total
+        total += tamanho
+        if len(arquivos) + quantidade > LOTE_MAX_ARQUIVOS:
+            raise ValueError(f'Lote excede o máximo de {LOTE_MAX_ARQUIVOS} arquivos XML')
+        if total > LOTE_MAX_TAMANHO_TOTAL:
+            raise ValueError(f'Lote excede {LOTE_MAX_TAMANHO_TOTAL // (1024 * 1024)} MB de XML descompactado')
+
+    for file in files:
+        nome = file.filename or ''
+        nome_lower = nome.lower()
+        
+        if nome_lower.endswith('.xml'):
+            conteudo = file.read()
+            reservar(1, len(conteudo))
+            arquivos.append((nome, conteudo))
+        elif nome_lower.endswith('.zip'):
             try:
-                # Remove timezone se presente
-                data_emissao_str = data_emissao_str.split('-03:00')[0].split('+')[0]
-                data_emissao = datetime.fromisoformat(data_emissao_str.replace('T', ' '))
-            except:
-                pass
-        
-        # Chave de acesso
-        chave_acesso = inf_nfe.get('Id', '').replace('NFe', '')
-        
-        # Dados do emitente (fornecedor)
-        emit = inf_nfe.find('nfe:emit', ns)
-        cnpj_emit = emit.find('nfe:CNPJ', ns).text if emit.find('nfe:CNPJ', ns) is not None else ''
-        razao_social_emit = emit.find('nfe:xNome', ns).text if emit.find('nfe:xNome', ns) is not None else ''
-        nome_fantasia_emit = emit.find('nfe:xFant', ns).text if emit.find('nfe:xFant', ns) is not None else ''
-        ie_emit = emit.find('nfe:IE', ns).text if emit.find('nfe:IE', ns) is not None else ''
-        
-        # Endereço do emitente
-        endereco_emit = emit.find('nfe:enderEmit', ns)
-        endereco_completo = ''
-        cidade = ''
-        uf = ''
-        cep = ''
-        telefone = ''
-        
-        if endereco_emit is not None:
-            logradouro = endereco_emit.find('nfe:xLgr', ns).text if endereco_emit.find('nfe:xLgr', ns) is not None else ''
-            numero_end = endereco_emit.find('nfe:nro', ns).text if endereco_emit.find('nfe:nro', ns) is not None else ''
-            complemento = endereco_emit.find('nfe:xCpl', ns).text if endereco_emit.find('nfe:xCpl', ns) is not None else ''
-            bairro = endereco_emit.find('nfe:xBairro', ns).text if endereco_emit.find('nfe:xBairro', ns) is not None else ''
-            cidade = endereco_emit.find('nfe:xMun', ns).text if endereco_emit.find('nfe:xMun', ns) is not None else ''
-            uf = endereco_emit.find('nfe:UF', ns).text if endereco_emit.find('nfe:UF', ns) is not None else ''
-            cep = endereco_emit.find('nfe:CEP', ns).text if endereco_emit.find('nfe:CEP', ns) is not None else ''
-            telefone = endereco_emit.find('nfe:fone', ns).text if endereco_emit.find('nfe:fone', ns) is not None else ''
-            
-            endereco_completo = f"{logradouro}, {numero_end}"
-            if complemento:
-                endereco_completo += f", {complemento}"
-            if bairro:
-                endereco_completo += f", {bairro}"
-        
-        # Formatar CNPJ
-        cnpj_formatado = ''
-        if cnpj_emit:
-            cnpj_limpo = re.sub(r'[^0-9]', '', cnpj_emit)
-            if len(cnpj_limpo) == 14:
-                cnpj_formatado = f"{cnpj_limpo[:2]}.{cnpj_limpo[2:5]}.{cnpj_limpo[5:8]}/{cnpj_limpo[8:12]}-{cnpj_limpo[12:14]}"
-        
-        # Totais da nota
-        total = inf_nfe.find('nfe:total/nfe:ICMSTot', ns)
-        valor_total = Decimal('0')
-        valor_desconto = Decimal('0')
-        valor_liquido = Decimal('0')
-        
-        if total is not None:
-            valor_total_elem = total.find('nfe:vNF', ns)
-            valor_desconto_elem = total.find('nfe:vDesc', ns)
-            
-            if valor_total_elem is not None:
-                valor_total = Decimal(valor_total_elem.text)
-                valor_liquido = valor_total
-            
-            if valor_desconto_elem is not None:
-                valor_desconto = Decimal(valor_desconto_elem.text)
-        
-        # Itens da nota
-        itens = []
-        detalhes = inf_nfe.findall('nfe:det', ns)
-        
-        for det in detalhes:
-            numero_item = int(det.get('nItem', 0))
-            prod = det.find('nfe:prod', ns)
-            
-            if prod is not None:
-                codigo_produto = prod.find('nfe:cProd', ns).text if prod.find('nfe:cProd', ns) is not None else ''
-                descricao = prod.find('nfe:xProd', ns).text if prod.find('nfe:xProd', ns) is not None else ''
-                ncm = prod.find('nfe:NCM', ns).text if prod.find('nfe:NCM', ns) is not None else ''
-                cfop = prod.find('nfe:CFOP', ns).text if prod.find('nfe:CFOP', ns) is not None else ''
-                unidade = prod.find('nfe:uCom', ns).text if prod.find('nfe:uCom', ns) is not None else ''
-                quantidade = Decimal(prod.find('nfe:qCom', ns).text) if prod.find('nfe:qCom', ns) is not None else Decimal('0')
-                valor_unitario = Decimal(prod.find('nfe:vUnCom', ns).text) if prod.find('nfe:vUnCom', ns) is not None else Decimal('0')
-                valor_total_item = Decimal(prod.find('nfe:vProd', ns).text) if prod.find('nfe:vProd', ns) is not None else Decimal('0')
-                valor_desconto_item = Decimal(prod.find('nfe:vDesc', ns).text) if prod.find('nfe:vDesc', ns) is not None else Decimal('0')
-                
-                itens.append({
-                    'numero_item': numero_item,
-                    'codigo_produto': codigo_produto,
-                    'descricao': descricao,
-                    'ncm': ncm,
-                    'cfop': cfop,
-                    'unidade': unidade,
-                    'quantidade': quantidade,
-                    'valor_unitario': valor_unitario,
-                    'valor_total': valor_total_item,
-                    'valor_desconto': valor_desconto_item
-                })
-        
-        # Dados de cobrança (duplicatas)
-        duplicatas = []
-        cobr = inf_nfe.find('nfe:cobr', ns)
-        if cobr is not None:
-            dups = cobr.findall('nfe:dup', ns)
-            for dup in dups:
-                numero_dup = dup.find('nfe:nDup', ns).text if dup.find('nfe:nDup', ns) is not None else ''
-                data_venc_str = dup.find('nfe:dVenc', ns).text if dup.find('nfe:dVenc', ns) is not None else ''
-                valor_dup = Decimal(dup.find('nfe:vDup', ns).text) if dup.find('nfe:vDup', ns) is not None else Decimal('0')
-                
-                data_vencimento = None
-                if data_venc_str:
-                    try:
-                        data_vencimento = datetime.strptime(data_venc_str, '%Y-%m-%d').date()
-                    except:
-                        pass
-                
-                duplicatas.append({
-                    'numero': numero_dup,
-                    'data_vencimento': data_vencimento,
-                    'valor': valor_dup
-                })
-        
-        return {
-            'numero': numero,
-            'serie': serie,
-            'chave_acesso': chave_acesso,
-            'data_emissao': data_emissao,
-            'natureza_operacao': natureza_operacao,
-            'valor_total': valor_total,
-            'valor_desconto': valor_desconto,
-            'valor_liquido': valor_liquido,
-            'fornecedor': {
-                'cnpj': cnpj_formatado,
-                'razao_social': razao_social_emit,
-                'nome_fantasia': nome_fantasia_emit,
-                'endereco': endereco_completo,
-                'cidade': cidade,
-                'uf': uf,
-                'cep': cep,
-                'telefone': telefone,
-                'inscricao_estadual': ie_emit
-            },
-            'itens': itens,
-            'duplicatas': duplicatas
-        }
-        
-    except Exception as e:
-        raise ValueError(f"Erro ao processar XML: {str(e)}")
+                with zipfile.ZipFile(io.BytesIO(file.read())) as zf:
+                    entradas = []
+                    for info in zf.infolist():
+                        if info.is_dir() or not info.filename.lower().endswith('.xml'):
+                            continue
+                        if info.file_size > LOTE_MAX_TAMANHO_XML:
+                            erros.append((info.filename, 'Arquivo excede o tamanho máximo permitido'))
+                            continue
+                        entradas.append(info)
+                    reservar(len(entradas), sum(info.file_size for info in entradas))
+                    for info in entradas:
+                        arquivos.append((info.filename, zf.read(info)))
+            except zipfile.BadZipFile:
+                erros.append((nome, 'Arquivo ZIP inválido'))
+        elif nome:
+            erros.append((nome, 'Apenas arquivos XML ou ZIP são aceitos'))
+    
+    return arquivos, erros
+
+def _iterar_processamento_lote(arquivos):
+    """Processa os XMLs em paralelo, devolvendo os resultados na ordem de envio"""
+    if LOTE_MAX_WORKERS <= 1 or len(arquivos) < LOTE_MIN_PARALELO:
+        for arquivo in arquivos:
+            yield _processar_arquivo_lote(arquivo)
+        return
+    
+    chunksize = max(1, len(arquivos) // (LOTE_MAX_WORKERS * 4))
+    with ProcessPoolExecutor(max_workers=LOTE_MAX_WORKERS) as executor:
+        yield from executor.map(_processar_arquivo_lote, arquivos, chunksize=chunksize)
 
 @notas_fiscais_bp.route('/notas-fiscais', methods=['GET'])
+@condicional('notas_fiscais', 'fornecedores', 'itens_nota_fiscal')
 def listar_notas_fiscais():
     """Lista todas as notas fiscais"""
     try:
@@ -190,7 +118,11 @@ def listar_notas_fiscais():
         
         query = NotaFiscal.query
         
-        if search:
+        # Filtro por texto: índice de busca (FTS5/tsvector) ou ILIKE se indisponível
+        relevancia = None
+        if search and busca_disponivel():
+            query, relevancia = filtrar_busca(query, NotaFiscal, search)
+        elif search:
             query = query.join(Fornecedor).filter(
                 db.or_(
                     NotaFiscal.numero.ilike(f'%{search}%'),
@@ -199,26 +131,63 @@ def listar_notas_fiscais():
                 )
             )
         
-        notas = query.order_by(NotaFiscal.data_emissao.desc()).paginate(
-            page=page, per_page=per_page, error_out=False
-        )
+        # fields/expand: só as relações pedidas, carregadas em lote
+        query, fields, expand = aplicar_projecao(query, NotaFiscal, request.args)
         
-        return jsonify({
-            'success': True,
-            'data': [nota.to_dict() for nota in notas.items],
-            'pagination': {
+        # ?cursor= usa paginação keyset (sem OFFSET); ?page= continua funcionando
+        if 'cursor' in request.args:
+            notas, paginacao = paginar_keyset(
+                query, ORDEM_KEYSET,
+                request.args.get('cursor'), per_page,
+                contar=request.args.get('count', '').lower() == 'true',
+                descendente=True
+            )
+        else:
+            # Com busca, os resultados mais relevantes vêm primeiro
+            ordem = [NotaFiscal.data_emissao.desc()]
+            if relevancia is not None:
+                ordem.insert(0, relevancia)
+            pagina = query.order_by(*ordem).paginate(
+                page=page, per_page=per_page, error_out=False
+            )
+            notas = pagina.items
+            paginacao = {
                 'page': page,
                 'per_page': per_page,
-                'total': notas.total,
-                'pages': notas.pages,
-                'has_next': notas.has_next,
-                'has_prev': notas.has_prev
+                'total': pagina.total,
+                'pages': pagina.pages,
+                'has_next': pagina.has_next,
+                'has_prev': pagina.has_prev
             }
+        
+        return jsonify({
+            'success': True,
+            'data': [nota.to_dict(fields, expand) for nota in notas],
+            'pagination': paginacao
         })
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@notas_fiscais_bp.route('/notas-fiscais/exportar', methods=['GET'])
+def exportar_notas_fiscais():
+    """Exporta as notas fiscais, uma linha por item, em CSV ou XLSX (?formato=, ano, data_inicio, data_fim, status)"""
+    try:
+        conteudo, tipo_conteudo, nome_arquivo = exportar('notas_fiscais', filtros_exportacao(request.args))
+        return Response(
+            stream_with_context(conteudo),
+            content_type=tipo_conteudo,
+            headers={'Content-Disposition': f'attachment; filename={nome_arquivo}'}
+        )
+        
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @notas_fiscais_bp.route('/notas-fiscais/<int:nota_id>', methods=['GET'])
+@condicional('notas_fiscais', 'fornecedores', 'itens_nota_fiscal')
 def obter_nota_fiscal(nota_id):
     """Obtém uma nota fiscal específica com seus itens"""
     try:
@@ -247,11 +216,25 @@ def upload_nota_fiscal():
         if not file.filename.lower().endswith('.xml'):
             return jsonify({'success': False, 'error': 'Apenas arquivos XML são aceitos'}), 400
         
-        # Lê o conteúdo do arquivo
-        xml_content = file.read().decode('utf-8')
+        conteudo = file.read()
         
-        # Processa o XML
-        dados_nfe = processar_xml_nfe(xml_content)
+        # Reenvio detectado pela chave do cabeçalho ou pelo hash, antes do parse
+        chave_acesso, hash_sha256, nota_existente_id = verificar_duplicidade(conteudo)
+        if nota_existente_id:
+            return jsonify({
+                'success': False, 
+                'error': 'Nota fiscal já cadastrada',
+                'data': NotaFiscal.query.get(nota_existente_id).to_dict()
+            }), 400
+        
+        # Validação contra o XSD da versão (compilado uma vez por processo)
+        if _validacao_xsd_solicitada():
+            validacao_xsd = validar_nfe(conteudo)
+        else:
+            validacao_xsd = {'validado': False, 'tempo_ms': 0.0, 'motivo': 'Validação ignorada a pedido'}
+        
+        # Processa o XML em streaming
+        dados_nfe = processar_xml_nfe_stream(conteudo)
         
         # Verifica se a nota já existe
         nota_existente = NotaFiscal.query.filter_by(chave_acesso=dados_nfe['chave_acesso']).first()
@@ -262,91 +245,17 @@ def upload_nota_fiscal():
                 'data': nota_existente.to_dict()
             }), 400
         
-        # Busca ou cria o fornecedor
-        fornecedor = None
-        if dados_nfe['fornecedor']['cnpj']:
-            fornecedor = Fornecedor.query.filter_by(cnpj=dados_nfe['fornecedor']['cnpj']).first()
-            
-            if not fornecedor:
-                fornecedor = Fornecedor(
-                    cnpj=dados_nfe['fornecedor']['cnpj'],
-                    razao_social=dados_nfe['fornecedor']['razao_social'],
-                    nome_fantasia=dados_nfe['fornecedor']['nome_fantasia'],
-                    endereco=dados_nfe['fornecedor']['endereco'],
-                    cidade=dados_nfe['fornecedor']['cidade'],
-                    uf=dados_nfe['fornecedor']['uf'],
-                    cep=dados_nfe['fornecedor']['cep'],
-                    telefone=dados_nfe['fornecedor']['telefone'],
-                    inscricao_estadual=dados_nfe['fornecedor']['inscricao_estadual']
-                )
-                db.session.add(fornecedor)
-                db.session.flush()  # Para obter o ID
-        
-        if not fornecedor:
-            return jsonify({'success': False, 'error': 'Dados do fornecedor inválidos'}), 400
-        
-        # Cria a nota fiscal
-        nota_fiscal = NotaFiscal(
-            numero=dados_nfe['numero'],
-            serie=dados_nfe['serie'],
-            chave_acesso=dados_nfe['chave_acesso'],
-            fornecedor_id=fornecedor.id,
-            data_emissao=dados_nfe['data_emissao'],
-            valor_total=dados_nfe['valor_total'],
-            valor_desconto=dados_nfe['valor_desconto'],
-            valor_produtos=dados_nfe['valor_total'] - dados_nfe['valor_desconto'],
-            arquivo_xml=secure_filename(file.filename),
-            status='PROCESSADA'
-        )
-        
-        db.session.add(nota_fiscal)
-        db.session.flush()  # Para obter o ID
-        
-        # Cria os itens da nota fiscal
-        for item_data in dados_nfe['itens']:
-            item = ItemNotaFiscal(
-                nota_fiscal_id=nota_fiscal.id,
-                codigo_produto=item_data['codigo_produto'],
-                descricao=item_data['descricao'],
-                ncm=item_data['ncm'],
-                cfop=item_data['cfop'],
-                unidade=item_data['unidade'],
-                quantidade=item_data['quantidade'],
-                valor_unitario=item_data['valor_unitario'],
-                valor_total=item_data['valor_total'],
-                valor_desconto=item_data['valor_desconto']
-            )
-            db.session.add(item)
-        
-        # Cria contas a pagar para as duplicatas
-        if dados_nfe['duplicatas']:
-            # Busca tipo de despesa padrão ou cria um
-            tipo_despesa = TipoDespesa.query.filter_by(nome='Fornecedores').first()
-            if not tipo_despesa:
-                tipo_despesa = TipoDespesa(nome='Fornecedores', descricao='Contas a pagar de fornecedores')
-                db.session.add(tipo_despesa)
-                db.session.flush()
-            
-            for i, dup in enumerate(dados_nfe['duplicatas'], 1):
-                conta_pagar = ContaPagar(
-                    fornecedor_id=fornecedor.id,
-                    tipo_despesa_id=tipo_despesa.id,
-                    nota_fiscal_id=nota_fiscal.id,
-                    descricao=f"NF {dados_nfe['numero']}/{dados_nfe['serie']} - Parcela {i}",
-                    valor_original=dup['valor'],
-                    data_vencimento=dup['data_vencimento'],
-                    numero_parcela=i,
-                    total_parcelas=len(dados_nfe['duplicatas']),
-                    numero_documento=dup['numero'],
-                    status='PENDENTE'
-                )
-                db.session.add(conta_pagar)
+        nota_fiscal_id, _ = salvar_nota_fiscal(dados_nfe, secure_filename(file.filename), hash_sha256)
         
         db.session.commit()
+        indice_duplicidade.registrar(dados_nfe['chave_acesso'], hash_sha256)
+        
+        nota_fiscal = NotaFiscal.query.get(nota_fiscal_id)
         
         return jsonify({
             'success': True,
             'data': nota_fiscal.to_dict(),
+            'validacao_xsd': validacao_xsd,
             'message': f'Nota fiscal {dados_nfe["numero"]}/{dados_nfe["serie"]} processada com sucesso'
         }), 201
         
@@ -357,6 +266,135 @@ def upload_nota_fiscal():
         db.session.rollback()
         return jsonify({'success': False, 'error': f'Erro interno: {str(e)}'}), 500
 
+@notas_fiscais_bp.route('/notas-fiscais/upload-lote', methods=['POST'])
+def upload_lote_notas_fiscais():
+    """Importa um lote de XMLs (arquivos soltos e/ou ZIP) com processamento paralelo"""
+    try:
+        files = request.files.getlist('files') or request.files.getlist('file')
+        if not files:
+            return jsonify({'success': False, 'error': 'Nenhum arquivo enviado'}), 400
+        
+        validar_xsd = _validacao_xsd_solicitada()
+        inicio = time.perf_counter()
+        arquivos, erros_leitura = _ler_arquivos_lote(files)
+        
+        relatorio = [
+            {'arquivo': nome, 'status': 'erro', 'motivo': motivo}
+            for nome, motivo in erros_leitura
+        ]
+        
+        if not arquivos and not relatorio:
+            return jsonify({'success': False, 'error': 'Nenhum XML encontrado no envio'}), 400
+        
+        # Pré-verificação de reenvio (chave do cabeçalho + hash): duplicatas não chegam ao pool
+        chaves_vistas = set()
+        hashes_vistos = set()
+        a_processar = []
+        hashes_a_processar = []
+        for nome, conteudo in arquivos:
+            chave_acesso, hash_sha256, nota_existente_id = verificar_duplicidade(conteudo)
+            if nota_existente_id or hash_sha256 in hashes_vistos or (chave_acesso and chave_acesso in chaves_vistas):
+                relatorio.append({
+                    'arquivo': nome,
+                    'chave_acesso': chave_acesso,
+                    'status': 'duplicada',
+                    'motivo': 'Nota fiscal já cadastrada',
+                    'nota_fiscal_id': nota_existente_id
+                })
+                continue
+            hashes_vistos.add(hash_sha256)
+            if chave_acesso:
+                chaves_vistas.add(chave_acesso)
+            a_processar.append((nome, conteudo, validar_xsd))
+            hashes_a_processar.append(hash_sha256)
+        
+        chaves_lote = set()
+        pendentes_commit = []
+        tempo_persistencia = 0.0
+        tempo_validacao_ms = 0.0
+        
+        def commit_pendentes():
+            try:
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                for resultado in pendentes_commit:
+                    chaves_lote.discard(resultado['chave_acesso'])
+                    resultado.update({'status': 'erro', 'motivo': f'Erro ao gravar: {str(e)}'})
+                    resultado.pop('nota_fiscal_id', None)
+            pendentes_commit.clear()
+        
+        processados = zip(hashes_a_processar, _iterar_processamento_lote(a_processar))
+        for hash_sha256, (nome, dados_nfe, erro, validacao_ms) in processados:
+            tempo_validacao_ms += validacao_ms
+            if erro:
+                relatorio.append({'arquivo': nome, 'status': 'erro', 'motivo': erro})
+                continue
+            
+            inicio_persistencia = time.perf_counter()
+            chave = dados_nfe['chave_acesso']
+            resultado = {'arquivo': nome, 'chave_acesso': chave}
+            
+            if chave in chaves_lote or NotaFiscal.query.filter_by(chave_acesso=chave).first():
+                resultado['status'] = 'duplicada'
+                resultado['motivo'] = 'Nota fiscal já cadastrada'
+            else:
+                try:
+                    # Savepoint por nota: um XML ruim não derruba o restante da transação
+                    with db.session.begin_nested():
+                        nota_fiscal_id, _ = salvar_nota_fiscal(dados_nfe, secure_filename(nome), hash_sha256)
+                    chaves_lote.add(chave)
+                    indice_duplicidade.registrar(chave, hash_sha256)
+                    resultado['status'] = 'importada'
+                    resultado['nota_fiscal_id'] = nota_fiscal_id
+                    pendentes_commit.append(resultado)
+                except Exception as e:
+                    resultado['status'] = 'erro'
+                    resultado['motivo'] = str(e)
+            
+            relatorio.append(resultado)
+            
+            if len(pendentes_commit) >= LOTE_TAMANHO_TRANSACAO:
+                commit_pendentes()
+            tempo_persistencia += time.perf_counter() - inicio_persistencia
+        
+        if pendentes_commit:
+            inicio_persistencia = time.perf_counter()
+            commit_pendentes()
+            tempo_persistencia += time.perf_counter() - inicio_persistencia
+        
+        tempo_total = time.perf_counter() - inicio
+        contagem = {'importada': 0, 'duplicada': 0, 'erro': 0}
+        for resultado in relatorio:
+            contagem[resultado['status']] += 1
+        
+        return jsonify({
+            'success': True,
+            'data': relatorio,
+            'resumo': {
+                'total': len(relatorio),
+                'importadas': contagem['importada'],
+                'duplicadas': contagem['duplicada'],
+                'erros': contagem['erro']
+            },
+            'desempenho': {
+                'tempo_total_s': round(tempo_total, 3),
+                'tempo_persistencia_s': round(tempo_persistencia, 3),
+                'tempo_validacao_xsd_s': round(tempo_validacao_ms / 1000, 3),
+                'validacao_xsd': validar_xsd,
+                'arquivos_por_segundo': round(len(relatorio) / tempo_total, 1) if tempo_total > 0 else None,
+                'workers': LOTE_MAX_WORKERS if len(a_processar) >= LOTE_MIN_PARALELO else 1
+            },
+            'message': f'{contagem["importada"]} notas importadas, {contagem["duplicada"]} duplicadas, {contagem["erro"]} com erro'
+        })
+        
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': f'Erro interno: {str(e)}'}), 500
+
 @notas_fiscais_bp.route('/notas-fiscais/<int:nota_id>', methods=['DELETE'])
 def deletar_nota_fiscal(nota_id):
     """Deleta uma nota fiscal"""
@@ -371,8 +409,12 @@ def deletar_nota_fiscal(nota_id):
                 'error': 'Não é possível excluir nota fiscal com contas a pagar já quitadas'
             }), 400
         
+        chave_acesso = nota.chave_acesso
+        hashes = [arquivo.hash_sha256 for arquivo in nota.arquivos]
+        
         db.session.delete(nota)
         db.session.commit()
+        indice_duplicidade.remover(chave_acesso, hashes)
         
         return jsonify({
             'success': True,
@@ -1,10 +1,12 @@
 from flask import Blueprint, request, jsonify
 from src.models.financeiro import db, TipoDespesa
 from sqlalchemy.exc import IntegrityError
+from src.routes.condicional import condicional
 
 tipos_despesa_bp = Blueprint("tipos_despesa", __name__)
 
 @tipos_despesa_bp.route("/tipos-despesa", methods=["GET"])
+@condicional('tipos_despesa')
 def listar_tipos_despesa():
     """Lista todos os tipos de despesa"""
     try:
@@ -17,6 +19,7 @@ def listar_tipos_despesa():
         return jsonify({"success": False, "error": str(e)}), 500
 
 @tipos_despesa_bp.route("/tipos-despesa/<int:tipo_despesa_id>", methods=["GET"])
+@condicional('tipos_despesa')
 def obter_tipo_despesa(tipo_despesa_id):
     """Obtém um tipo de despesa específico"""
     try:
@@ -1,9 +1,11 @@
 from flask import Blueprint, jsonify, request
 from src.models.user import User, db
+from src.routes.condicional import condicional
 
 user_bp = Blueprint('user', __name__)
 
 @user_bp.route('/users', methods=['GET'])
+@condicional('user')
 def get_users():
     users = User.query.all()
     return jsonify([user.to_dict() for user in users])
@@ -18,6 +20,7 @@ def create_user():
     return jsonify(user.to_dict()), 201
 
 @user_bp.route('/users/<int:user_id>', methods=['GET'])
+@condicional('user')
 def get_user(user_id):
     user = User.query.get_or_404(user_id)
     return jsonify(user.to_dict())
@@ -0,0 +1,146 @@
+"""Aging das contas a pagar: contas em aberto por faixa de atraso.
+
+Uma única consulta agrupada calcula tudo no banco. A faixa de cada conta
+sai de um CASE que compara data_vencimento com datas de corte calculadas
+em Python (referência menos o limite de cada faixa), então não há
+aritmética de datas específica de dialeto e o filtro por status usa o
+índice ix_contas_pagar_aging, que cobre as colunas lidas.
+
+Com os limites padrão (30, 60, 90) as faixas são: a vencer, 1–30, 31–60,
+61–90 e mais de 90 dias de atraso.
+"""
+from datetime import date, timedelta
+from sqlalchemy import Float, case, cast, func, literal_column, select
+from src.models.financeiro import db, ContaPagar, Fornecedor, TipoDespesa
+from src.services.cache_contas import em_cache
+
+LIMITES_PADRAO = (30, 60, 90)
+LIMITES_MAXIMO = 12
+
+def interpretar_limites(texto):
+    """'30,60,90' -> (30, 60, 90); os limites são dias de atraso, crescentes"""
+    try:
+        limites = tuple(int(parte) for parte in texto.split(',') if parte.strip())
+    except ValueError:
+        raise ValueError('Faixas inválidas. Use dias crescentes separados por vírgula, ex.: 30,60,90')
+    if not limites or len(limites) > LIMITES_MAXIMO:
+        raise ValueError(f'Informe de 1 a {LIMITES_MAXIMO} faixas')
+    if limites[0] < 1 or any(anterior >= limite for anterior, limite in zip(limites, limites[1:])):
+        raise ValueError('Faixas inválidas. Use dias crescentes separados por vírgula, ex.: 30,60,90')
+    return limites
+
+def faixas(limites=LIMITES_PADRAO):
+    """Definição das faixas, na ordem do índice devolvido pelo CASE"""
+    definicoes = [{'chave': 'a_vencer', 'rotulo': 'A vencer', 'de': None, 'ate': 0}]
+    inicio = 1
+    for limite in limites:
+        definicoes.append({'chave': f'{inicio}_{limite}', 'rotulo': f'{inicio}–{limite} dias', 'de': inicio, 'ate': limite})
+        inicio = limite + 1
+    definicoes.append({'chave': f'mais_{limites[-1]}', 'rotulo': f'Mais de {limites[-1]} dias', 'de': inicio, 'ate': None})
+    return definicoes
+
+def consulta_aging(referencia, limites):
+    """Contas em aberto agrupadas por fornecedor, tipo de despesa e faixa (índice da faixa)"""
+    # Atraso de d dias <=> vencimento = referência - d; cada faixa é um intervalo de vencimentos
+    faixa = case(
+        (ContaPagar.data_vencimento >= referencia, 0),
+        *[
+            (ContaPagar.data_vencimento >= referencia - timedelta(days=limite), indice)
+            for indice, limite in enumerate(limites, 1)
+        ],
+        else_=len(limites) + 1
+    )
+    # Agrupa pelo apelido da faixa: repetir o CASE parametrizado no GROUP BY não é aceito
+    # pelo PostgreSQL quando os parâmetros são enviados ao servidor
+    grupos = select(
+        ContaPagar.fornecedor_id,
+        ContaPagar.tipo_despesa_id,
+        faixa.label('faixa'),
+        func.count().label('quantidade'),
+        func.coalesce(func.sum(cast(ContaPagar.valor_original, Float)), 0).label('valor')
+    ).where(
+        ContaPagar.status.in_(ContaPagar.status_em_aberto),
+        ContaPagar.data_vencimento.is_not(None)
+    ).group_by(
+        ContaPagar.fornecedor_id, ContaPagar.tipo_despesa_id, literal_column('faixa')
+    ).subquery()
+
+    # Os nomes entram depois do agrupamento, uma vez por grupo em vez de uma vez por conta
+    return select(
+        grupos.c.fornecedor_id,
+        Fornecedor.razao_social,
+        grupos.c.tipo_despesa_id,
+        TipoDespesa.nome,
+        grupos.c.faixa,
+        grupos.c.quantidade,
+        grupos.c.valor
+    ).select_from(grupos).outerjoin(
+        Fornecedor, Fornecedor.id == grupos.c.fornecedor_id
+    ).outerjoin(
+        TipoDespesa, TipoDespesa.id == grupos.c.tipo_despesa_id
+    )
+
+def _novo_total(chaves):
+    return {'quantidade': 0, 'valor': 0.0, 'faixas': dict.fromkeys(chaves, 0.0)}
+
+def _somar(total, chave, quantidade, valor):
+    total['quantidade'] += quantidade
+    total['valor'] += valor
+    total['faixas'][chave] += valor
+
+def _arredondar(total):
+    total['valor'] = round(total['valor'], 2)
+    total['faixas'] = {chave: round(valor, 2) for chave, valor in total['faixas'].items()}
+    return total
+
+def _calcular(referencia, limites):
+    definicoes = faixas(limites)
+    chaves = [definicao['chave'] for definicao in definicoes]
+
+    total = _novo_total(chaves)
+    fornecedores = {}
+    tipos = {}
+    for fornecedor_id, razao_social, tipo_id, tipo_nome, faixa, quantidade, valor in db.session.execute(
+        consulta_aging(referencia, limites)
+    ):
+        chave = chaves[faixa]
+        _somar(total, chave, quantidade, valor)
+
+        fornecedor = fornecedores.get(fornecedor_id)
+        if fornecedor is None:
+            fornecedor = fornecedores[fornecedor_id] = dict(
+                _novo_total(chaves), fornecedor_id=fornecedor_id, razao_social=razao_social, tipos_despesa={}
+            )
+        _somar(fornecedor, chave, quantidade, valor)
+
+        detalhe = fornecedor['tipos_despesa'].get(tipo_id)
+        if detalhe is None:
+            detalhe = fornecedor['tipos_despesa'][tipo_id] = dict(_novo_total(chaves), tipo_despesa_id=tipo_id, nome=tipo_nome)
+        _somar(detalhe, chave, quantidade, valor)
+
+        tipo = tipos.get(tipo_id)
+        if tipo is None:
+            tipo = tipos[tipo_id] = dict(_novo_total(chaves), tipo_despesa_id=tipo_id, nome=tipo_nome)
+        _somar(tipo, chave, quantidade, valor)
+
+    def ordenar(linhas):
+        return sorted((_arredondar(linha) for linha in linhas), key=lambda linha: -linha['valor'])
+
+    for fornecedor in fornecedores.values():
+        fornecedor['tipos_despesa'] = ordenar(fornecedor['tipos_despesa'].values())
+
+    return {
+        'referencia': referencia.isoformat(),
+        'faixas': definicoes,
+        'total': _arredondar(total),
+        'fornecedores': ordenar(fornecedores.values()),
+        'tipos_despesa': ordenar(tipos.values())
+    }
+
+def aging_contas(referencia=None, limites=LIMITES_PADRAO, usar_cache=True):
+    """Contas em aberto (PENDENTE/VENCIDO) por faixa de atraso em `referencia`, por fornecedor e tipo de despesa"""
+    referencia = referencia or date.today()
+    limites = tuple(limites)
+    if not usar_cache:
+        return _calcular(referencia, limites)
+    return em_cache(('aging', referencia, limites), lambda: _calcular(referencia, limites))
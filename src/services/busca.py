@@ -0,0 +1,244 @@
+"""Busca textual indexada de contas a pagar, notas fiscais e fornecedores.
+
+SQLite: tabelas virtuais FTS5 com o tokenizador unicode61 sem acentos
+(remove_diacritics 2), então "manutencao" encontra "Manutenção".
+PostgreSQL: tabelas com tsvector em português sobre unaccent() e índice GIN.
+
+Cada entidade tem uma tabela busca_<tabela> com um documento por linha
+(texto da própria linha + nome do fornecedor). Os documentos são atualizados
+no after_flush da sessão para as alterações via ORM; os caminhos que gravam
+com INSERT em massa chamam sincronizar_busca explicitamente.
+"""
+from src.models.financeiro import db, ContaPagar, NotaFiscal, Fornecedor
+from sqlalchemy import bindparam, column, event, func, inspect, literal_column, select, table, text
+from sqlalchemy.orm import Session
+import re
+
+# Documento de cada entidade, montado no próprio banco (a mesma SQL serve para sincronizar e reconstruir)
+_DOCUMENTOS = {
+    'contas_pagar': """
+        SELECT c.id AS id,
+               COALESCE(c.descricao, '') || ' ' || COALESCE(c.numero_documento, '') || ' ' ||
+               COALESCE(f.razao_social, '') || ' ' || COALESCE(f.nome_fantasia, '') AS documento
+        FROM contas_pagar c LEFT JOIN fornecedores f ON f.id = c.fornecedor_id
+    """,
+    'notas_fiscais': """
+        SELECT n.id AS id,
+               COALESCE(n.numero, '') || ' ' || COALESCE(n.chave_acesso, '') || ' ' ||
+               COALESCE(f.razao_social, '') || ' ' || COALESCE(f.nome_fantasia, '') AS documento
+        FROM notas_fiscais n LEFT JOIN fornecedores f ON f.id = n.fornecedor_id
+    """,
+    'fornecedores': """
+        SELECT f.id AS id,
+               COALESCE(f.razao_social, '') || ' ' || COALESCE(f.nome_fantasia, '') || ' ' ||
+               COALESCE(f.cnpj, '') || ' ' ||
+               REPLACE(REPLACE(REPLACE(COALESCE(f.cnpj, ''), '.', ''), '/', ''), '-', '') AS documento
+        FROM fornecedores f
+    """
+}
+_ALIAS = {'contas_pagar': 'c', 'notas_fiscais': 'n', 'fornecedores': 'f'}
+
+# Colunas que entram no documento: alterar outras (status, valores) não reindexa
+_CAMPOS_INDEXADOS = {
+    ContaPagar: ('descricao', 'numero_documento', 'fornecedor_id'),
+    NotaFiscal: ('numero', 'chave_acesso', 'fornecedor_id'),
+    Fornecedor: ('razao_social', 'nome_fantasia', 'cnpj'),
+}
+
+TAMANHO_BLOCO = 500
+
+# Engines com as tabelas de busca criadas -> dialeto ('sqlite' ou 'postgresql')
+_engines_indexadas = {}
+
+def _tabela_busca(tabela):
+    return f'busca_{tabela}'
+
+def _dialeto(conexao):
+    return _engines_indexadas.get(conexao.engine)
+
+def _criar_tabelas(conexao, dialeto):
+    """Cria as tabelas de busca que faltarem; retorna as que foram criadas agora"""
+    criadas = []
+    if dialeto == 'postgresql':
+        conexao.execute(text('CREATE EXTENSION IF NOT EXISTS unaccent'))
+    for tabela in _DOCUMENTOS:
+        nome = _tabela_busca(tabela)
+        existe = inspect(conexao).has_table(nome)
+        if existe:
+            continue
+        if dialeto == 'sqlite':
+            conexao.execute(text(
+                f"CREATE VIRTUAL TABLE {nome} USING fts5(documento, tokenize = 'unicode61 remove_diacritics 2')"
+            ))
+        else:
+            conexao.execute(text(f'CREATE TABLE {nome} (id INTEGER PRIMARY KEY, documento TSVECTOR NOT NULL)'))
+            conexao.execute(text(f'CREATE INDEX ix_{nome}_documento ON {nome} USING GIN (documento)'))
+        criadas.append(tabela)
+    return criadas
+
+def _reindexar(conexao, tabela, ids=None):
+    """Regrava os documentos das linhas `ids` (todas, se None) na tabela de busca"""
+    dialeto = _dialeto(conexao)
+    nome = _tabela_busca(tabela)
+    chave = 'rowid' if dialeto == 'sqlite' else 'id'
+    documento = 'documento' if dialeto == 'sqlite' else "to_tsvector('portuguese', unaccent(documento))"
+
+    if ids is None:
+        conexao.execute(text(f'DELETE FROM {nome}'))
+        conexao.execute(text(
+            f'INSERT INTO {nome} ({chave}, documento) SELECT id, {documento} FROM ({_DOCUMENTOS[tabela]}) docs'
+        ))
+        return
+
+    ids = sorted(set(ids))
+    filtro = f'WHERE {_ALIAS[tabela]}.id IN :ids'
+    for inicio in range(0, len(ids), TAMANHO_BLOCO):
+        bloco = ids[inicio:inicio + TAMANHO_BLOCO]
+        conexao.execute(
+            text(f'DELETE FROM {nome} WHERE {chave} IN :ids').bindparams(bindparam('ids', expanding=True)),
+            {'ids': bloco}
+        )
+        conexao.execute(
+            text(
+                f'INSERT INTO {nome} ({chave}, documento) '
+                f'SELECT id, {documento} FROM ({_DOCUMENTOS[tabela]} {filtro}) docs'
+            ).bindparams(bindparam('ids', expanding=True)),
+            {'ids': bloco}
+        )
+
+def _remover(conexao, tabela, ids):
+    nome = _tabela_busca(tabela)
+    chave = 'rowid' if _dialeto(conexao) == 'sqlite' else 'id'
+    ids = sorted(set(ids))
+    for inicio in range(0, len(ids), TAMANHO_BLOCO):
+        conexao.execute(
+            text(f'DELETE FROM {nome} WHERE {chave} IN :ids').bindparams(bindparam('ids', expanding=True)),
+            {'ids': ids[inicio:inicio + TAMANHO_BLOCO]}
+        )
+
+def _dependentes_do_fornecedor(conexao, fornecedores_ids):
+    """Contas e notas cujo documento inclui o nome dos fornecedores alterados"""
+    dependentes = {}
+    for tabela in ('contas_pagar', 'notas_fiscais'):
+        ids = []
+        for inicio in range(0, len(fornecedores_ids), TAMANHO_BLOCO):
+            ids.extend(conexao.execute(
+                text(f'SELECT id FROM {tabela} WHERE fornecedor_id IN :ids').bindparams(bindparam('ids', expanding=True)),
+                {'ids': fornecedores_ids[inicio:inicio + TAMANHO_BLOCO]}
+            ).scalars())
+        dependentes[tabela] = ids
+    return dependentes
+
+def sincronizar_busca(alterados, removidos=None, conexao=None):
+    """Atualiza o índice de busca para as linhas gravadas fora do ORM.
+
+    `alterados` e `removidos` mapeiam o nome da tabela (contas_pagar,
+    notas_fiscais, fornecedores) para uma lista de IDs. Roda na transação da
+    sessão; não faz nada se as tabelas de busca não existirem neste banco.
+    """
+    conexao = conexao or db.session.connection()
+    if _dialeto(conexao) is None:
+        return
+
+    for tabela, ids in (removidos or {}).items():
+        if ids:
+            _remover(conexao, tabela, ids)
+
+    alterados = {tabela: list(ids) for tabela, ids in alterados.items() if ids}
+    if alterados.get('fornecedores'):
+        for tabela, ids in _dependentes_do_fornecedor(conexao, alterados['fornecedores']).items():
+            alterados[tabela] = alterados.get(tabela, []) + ids
+
+    for tabela, ids in alterados.items():
+        _reindexar(conexao, tabela, ids)
+
+def _foi_alterado(obj):
+    estado = inspect(obj)
+    return any(estado.attrs[campo].history.has_changes() for campo in _CAMPOS_INDEXADOS[type(obj)])
+
+@event.listens_for(Session, 'after_flush')
+def _sincronizar_apos_flush(session, flush_context):
+    alterados = {}
+    removidos = {}
+    for obj in session.new:
+        if type(obj) in _CAMPOS_INDEXADOS:
+            alterados.setdefault(obj.__tablename__, []).append(obj.id)
+    for obj in session.dirty:
+        if type(obj) in _CAMPOS_INDEXADOS and _foi_alterado(obj):
+            alterados.setdefault(obj.__tablename__, []).append(obj.id)
+    for obj in session.deleted:
+        if type(obj) in _CAMPOS_INDEXADOS:
+            removidos.setdefault(obj.__tablename__, []).append(obj.id)
+
+    if alterados or removidos:
+        conexao = session.connection()
+        if _dialeto(conexao) is not None:
+            sincronizar_busca(alterados, removidos, conexao)
+
+def inicializar_busca():
+    """Cria as tabelas de busca (e popula as novas) no banco da aplicação atual.
+
+    Em bancos sem suporte (outro dialeto ou SQLite sem FTS5) a busca segue
+    com ILIKE e retorna False.
+    """
+    engine = db.engine
+    dialeto = engine.dialect.name
+    if dialeto not in ('sqlite', 'postgresql'):
+        return False
+
+    try:
+        with engine.begin() as conexao:
+            _engines_indexadas[engine] = dialeto
+            for tabela in _criar_tabelas(conexao, dialeto):
+                _reindexar(conexao, tabela)
+    except Exception as e:
+        _engines_indexadas.pop(engine, None)
+        print(f"Busca textual indisponível, usando ILIKE: {e}")
+        return False
+    return True
+
+def reconstruir_indices_busca():
+    """Regrava todos os documentos de busca (após cargas feitas fora da aplicação)"""
+    conexao = db.session.connection()
+    if _dialeto(conexao) is None:
+        return
+    for tabela in _DOCUMENTOS:
+        _reindexar(conexao, tabela)
+
+def busca_disponivel():
+    return db.engine in _engines_indexadas
+
+def _termos(busca):
+    return re.findall(r'\w+', busca.lower())
+
+def filtrar_busca(query, modelo, busca):
+    """Restringe a query às linhas que casam com `busca` (prefixo de cada termo, todos obrigatórios).
+
+    Retorna (query, relevancia): ordenar por `relevancia` crescente traz os
+    melhores resultados primeiro. Sem termos válidos, a query volta intacta e
+    relevancia é None.
+    """
+    termos = _termos(busca)
+    if not termos:
+        return query, None
+
+    tabela = modelo.__tablename__
+    nome = _tabela_busca(tabela)
+    if _engines_indexadas[db.engine] == 'sqlite':
+        consulta = ' '.join(f'"{termo}"*' for termo in termos)
+        resultados = select(
+            literal_column('rowid').label('id'),
+            literal_column('rank').label('relevancia')
+        ).select_from(table(nome)).where(
+            text(f'{nome} MATCH :termos_busca').bindparams(termos_busca=consulta)
+        ).subquery()
+    else:
+        consulta = func.to_tsquery('portuguese', func.unaccent(' & '.join(f'{termo}:*' for termo in termos)))
+        documento = column('documento')
+        resultados = select(
+            column('id').label('id'),
+            (-func.ts_rank(documento, consulta)).label('relevancia')
+        ).select_from(table(nome)).where(documento.op('@@')(consulta)).subquery()
+
+    query = query.join(resultados, modelo.id == resultados.c.id)
+    return query, resultados.c.relevancia
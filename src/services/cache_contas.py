@@ -0,0 +1,57 @@
+"""Cache em memória dos relatórios calculados sobre as contas a pagar.
+
+Cada entrada guarda uma impressão barata do estado das contas (maior
+updated_at, pelo índice, e a quantidade de contas no resumo_financeiro) e
+das tabelas cujos nomes aparecem nos relatórios (versões de fornecedores e
+tipos_despesa, src/services/versoes.py), e é recalculada quando ela muda, o
+que vale também entre processos e para as gravações em massa. Entradas
+antigas saem por LRU ou por validade.
+"""
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy import func, select
+from src.models.financeiro import db, ContaPagar, ResumoFinanceiro
+from src.services.versoes import versoes
+
+CACHE_ENTRADAS = 64
+CACHE_VALIDADE_S = 300
+# Renomear um fornecedor ou tipo de despesa muda os relatórios sem tocar nas contas
+TABELAS_RELACIONADAS = ('fornecedores', 'tipos_despesa')
+
+_cache = OrderedDict()
+_cache_trava = threading.Lock()
+
+def consulta_impressao():
+    """Muda sempre que alguma conta é criada, alterada ou excluída"""
+    return select(
+        select(func.max(ContaPagar.updated_at)).scalar_subquery(),
+        select(func.sum(ResumoFinanceiro.quantidade)).where(ResumoFinanceiro.origem == 'CONTA').scalar_subquery()
+    )
+
+def _impressao():
+    relacionadas = versoes(TABELAS_RELACIONADAS)
+    return (*db.session.execute(consulta_impressao()).one(),
+            *(relacionadas.get(tabela) for tabela in TABELAS_RELACIONADAS))
+
+def em_cache(chave, calcular):
+    """Resultado de `calcular()` para `chave`, reaproveitado enquanto as contas não mudarem"""
+    impressao = _impressao()
+    agora = time.monotonic()
+    with _cache_trava:
+        entrada = _cache.get(chave)
+        if entrada and entrada[0] == impressao and agora - entrada[1] < CACHE_VALIDADE_S:
+            _cache.move_to_end(chave)
+            return entrada[2]
+
+    resultado = calcular()
+    with _cache_trava:
+        _cache[chave] = (impressao, agora, resultado)
+        _cache.move_to_end(chave)
+        while len(_cache) > CACHE_ENTRADAS:
+            _cache.popitem(last=False)
+    return resultado
+
+def limpar_cache():
+    with _cache_trava:
+        _cache.clear()
@@ -0,0 +1,429 @@
+"""Conciliação automática dos débitos de extratos bancários.
+
+Os débitos são conciliados todos juntos e um para um: cada conta a pagar
+recebe no máximo um débito, e a escolha minimiza o custo total da
+atribuição em vez de pegar, transação a transação, a primeira conta que
+serve.
+
+1. IndiceCandidatos carrega numa única consulta as contas em aberto ou pagas,
+   ainda não conciliadas, com vencimento no período ± JANELA_DIAS, em arrays
+   NumPy ordenados por (vencimento, valor).
+2. As arestas débito × conta (valor ± TOLERANCIA_VALOR e vencimento
+   ± JANELA_DIAS) saem de um np.searchsorted por dia da janela, e o custo de
+   cada aresta é calculado de forma vetorizada: diferença de valor, distância
+   entre as datas e semelhança do nome do fornecedor com a descrição (tokens
+   do nome citados, pesados pelo IDF, ou nota de trigramas, pelo índice de
+   nomes), cada parcela normalizada em [0, 1] e ponderada por PESO_*.
+3. A atribuição de menor custo é o Hungarian na forma esparsa de
+   Jonker-Volgenant: a redução por linhas (vetorizada) já atribui os débitos
+   sem disputa, e os que sobram entram por caminhos aumentantes mínimos com
+   potenciais, cuja busca não sai do componente conexo do débito. Deixar um
+   débito sem conta custa CUSTO_SEM_CONTA, mais que qualquer aresta. Cada
+   débito entra com as suas MAX_CANDIDATAS arestas mais baratas: a
+   atribuição é ótima nesse grafo.
+"""
+from collections import deque
+from datetime import datetime, timedelta
+from decimal import Decimal
+from heapq import heappop, heappush
+import itertools
+import numpy as np
+from sqlalchemy import exists, select
+from src.models.financeiro import db, ConciliacaoBancaria, ContaPagar, ExtratoBancario
+from src.services.indice_fornecedores import indice_fornecedores
+
+TOLERANCIA_VALOR = 0.05
+JANELA_DIAS = 10
+TAMANHO_BLOCO = 500
+BLOCO_DEBITOS = 5000
+MAX_CANDIDATAS = 10
+PASSOS_REDUCAO = 4  # passos da redução aumentante por linha livre
+
+PESO_VALOR = 1.0
+PESO_DATA = 0.5
+PESO_NOME = 2.0
+CUSTO_SEM_CONTA = PESO_VALOR + PESO_DATA + PESO_NOME + 1.0
+
+# (vencimento, valor em centavos) numa única chave int64 ordenável
+_ESCALA_DIA = 10 ** 13
+
+def _centavos(valores):
+    return np.rint(np.abs(np.asarray(valores, dtype=np.float64)) * 100).astype(np.int64)
+
+def _dias(datas):
+    return np.fromiter((data.toordinal() for data in datas), dtype=np.int64, count=len(datas))
+
+def consulta_candidatas(inicio, fim):
+    """(id, valor_original, data_vencimento, fornecedor_id) das contas candidatas a débitos entre `inicio` e `fim`"""
+    return select(ContaPagar.id, ContaPagar.valor_original, ContaPagar.data_vencimento, ContaPagar.fornecedor_id).where(
+        ContaPagar.data_vencimento.between(inicio - timedelta(days=JANELA_DIAS), fim + timedelta(days=JANELA_DIAS)),
+        ContaPagar.status.in_(ContaPagar.status_em_aberto + ('PAGO',)),
+        ~exists().where(ConciliacaoBancaria.conta_pagar_id == ContaPagar.id)
+    )
+
+class IndiceCandidatos:
+    """Contas a pagar candidatas de um período, em arrays ordenados por (vencimento, valor)"""
+
+    def __init__(self, linhas):
+        """`linhas`: tuplas (id, valor_original, data_vencimento, fornecedor_id)"""
+        linhas = list(linhas)
+        ids = np.fromiter((linha[0] for linha in linhas), dtype=np.int64, count=len(linhas))
+        centavos = _centavos([linha[1] for linha in linhas])
+        dias = _dias([linha[2] for linha in linhas])
+        fornecedores = np.fromiter((linha[3] for linha in linhas), dtype=np.int64, count=len(linhas))
+
+        ordem = np.lexsort((ids, centavos, dias))
+        self.ids = ids[ordem]
+        self.centavos = centavos[ordem]
+        self.dias = dias[ordem]
+        self.fornecedores = fornecedores[ordem]
+        self.chaves = self.dias * _ESCALA_DIA + self.centavos
+
+    @classmethod
+    def do_periodo(cls, inicio, fim):
+        """Contas que podem casar com débitos entre `inicio` e `fim`, sem as já conciliadas"""
+        return cls(db.session.execute(consulta_candidatas(inicio, fim)).all())
+
+    def __len__(self):
+        return len(self.ids)
+
+    def arestas(self, dias, centavos):
+        """(linha, coluna) de cada par débito × conta dentro da janela de valor e de datas"""
+        minimo = np.ceil(np.round(centavos * (1 - TOLERANCIA_VALOR), 6)).astype(np.int64)
+        maximo = np.floor(np.round(centavos * (1 + TOLERANCIA_VALOR), 6)).astype(np.int64)
+        base = (dias[:, None] + np.arange(-JANELA_DIAS, JANELA_DIAS + 1)[None, :]) * _ESCALA_DIA
+        inicio = np.searchsorted(self.chaves, base + minimo[:, None], 'left').ravel()
+        fim = np.searchsorted(self.chaves, base + maximo[:, None], 'right').ravel()
+
+        # Cada faixa [inicio, fim) de cada (débito, dia da janela) vira uma aresta por conta
+        quantidades = fim - inicio
+        linhas = np.repeat(np.arange(len(dias)).repeat(2 * JANELA_DIAS + 1), quantidades)
+        deslocamento = np.arange(quantidades.sum()) - np.repeat(np.cumsum(quantidades) - quantidades, quantidades)
+        colunas = np.repeat(inicio, quantidades) + deslocamento
+        return linhas, colunas
+
+def semelhanca_fornecedores(descricoes, indice):
+    """(posições das descrições, fornecedor_id, semelhança) dos fornecedores de `indice`
+    que a descrição cita: a maior entre a nota dos tokens do nome citados (ponderados
+    pelo IDF) e a nota de trigramas dos K_SEMELHANTES nomes mais parecidos
+    (src/services/indice_fornecedores.py)
+    """
+    nomes = indice_fornecedores()
+    entre = set(indice.fornecedores.tolist())
+    citados = nomes.citados(descricoes, entre=entre)
+    semelhantes = nomes.semelhantes(descricoes, entre=entre)
+    posicoes, fornecedores, notas = [], [], []
+    for posicao, (por_token, pares) in enumerate(zip(citados, semelhantes)):
+        notas_posicao = dict(pares)
+        for fornecedor_id, nota in por_token.items():
+            notas_posicao[fornecedor_id] = max(nota, notas_posicao.get(fornecedor_id, 0.0))
+        posicoes.extend([posicao] * len(notas_posicao))
+        fornecedores.extend(notas_posicao)
+        notas.extend(notas_posicao.values())
+    return np.array(posicoes, dtype=np.int64), np.array(fornecedores, dtype=np.int64), np.array(notas, dtype=np.float64)
+
+def semelhanca_das_arestas(chaves_citadas, notas, chaves):
+    """Semelhança de cada aresta pela sua chave (linha * base + fornecedor); 0 se não citado.
+    `chaves_citadas` vem ordenada e sem repetição.
+    """
+    if not len(chaves_citadas):
+        return np.zeros(len(chaves))
+    posicoes = np.minimum(np.searchsorted(chaves_citadas, chaves), len(chaves_citadas) - 1)
+    return np.where(chaves_citadas[posicoes] == chaves, notas[posicoes], 0.0)
+
+def custos(indice, linhas, colunas, dias, centavos, semelhanca):
+    """Custo de cada aresta, entre 0 e PESO_VALOR + PESO_DATA + PESO_NOME"""
+    diferenca_valor = np.abs(indice.centavos[colunas] - centavos[linhas]) / np.maximum(centavos[linhas] * TOLERANCIA_VALOR, 1)
+    distancia = np.abs(indice.dias[colunas] - dias[linhas]) / JANELA_DIAS
+    return PESO_VALOR * np.minimum(diferenca_valor, 1) + PESO_DATA * distancia + PESO_NOME * (1 - semelhanca)
+
+def _podar(linhas, colunas, custo, limite=MAX_CANDIDATAS):
+    """Só as `limite` arestas mais baratas de cada linha, ordenadas por (linha, custo)"""
+    ordem = np.lexsort((custo, linhas))
+    linhas, colunas, custo = linhas[ordem], colunas[ordem], custo[ordem]
+    inicios = np.flatnonzero(np.r_[True, linhas[1:] != linhas[:-1]]) if len(linhas) else np.zeros(0, dtype=np.int64)
+    posicao = np.arange(len(linhas)) - np.repeat(inicios, np.diff(np.r_[inicios, len(linhas)]))
+    manter = posicao < limite
+    return linhas[manter], colunas[manter], custo[manter]
+
+def _reducao_aumentante(livres, inicio_linha, colunas, custos, total_colunas,
+                        potencial_coluna, linha_da_coluna, coluna_da_linha, limite):
+    """Redução aumentante por linhas do Jonker-Volgenant (um leilão sem ε).
+
+    Cada linha livre toma a coluna de menor custo reduzido e baixa o potencial
+    dela pela diferença para a segunda melhor; a linha que estava na coluna
+    volta para a fila. Para depois de `limite` passos e devolve as linhas
+    ainda livres. Os potenciais das colunas só descem, então as livres
+    continuam com o maior potencial.
+    """
+    fila = deque(livres)
+    for _ in range(limite):
+        if not fila:
+            break
+        linha = fila.popleft()
+        melhor = segunda = float('inf')
+        coluna_melhor = coluna_segunda = -1
+        arestas = zip(colunas[inicio_linha[linha]:inicio_linha[linha + 1]], custos[inicio_linha[linha]:inicio_linha[linha + 1]])
+        for coluna, custo in itertools.chain(arestas, ((total_colunas + linha, CUSTO_SEM_CONTA),)):
+            reduzido = custo - potencial_coluna[coluna]
+            if reduzido < segunda:
+                if reduzido < melhor:
+                    segunda, coluna_segunda = melhor, coluna_melhor
+                    melhor, coluna_melhor = reduzido, coluna
+                else:
+                    segunda, coluna_segunda = reduzido, coluna
+
+        desalojada = linha_da_coluna[coluna_melhor]
+        if melhor < segunda:
+            potencial_coluna[coluna_melhor] -= segunda - melhor
+        elif desalojada >= 0:
+            coluna_melhor = coluna_segunda
+            desalojada = linha_da_coluna[coluna_melhor]
+        linha_da_coluna[coluna_melhor] = linha
+        coluna_da_linha[linha] = coluna_melhor
+        if desalojada >= 0:
+            coluna_da_linha[desalojada] = -1
+            if melhor < segunda:
+                fila.appendleft(desalojada)
+            else:
+                fila.append(desalojada)
+    return list(fila)
+
+def _caminhos_aumentantes(livres, inicio_linha, colunas, custos, total_colunas,
+                          potencial_linha, potencial_coluna, linha_da_coluna, coluna_da_linha):
+    """Atribui cada linha de `livres` por caminho aumentante mínimo (Dijkstra com potenciais).
+
+    Arestas da linha i: colunas/custos[inicio_linha[i]:inicio_linha[i + 1]], mais
+    uma coluna só dela (total_colunas + i) de custo CUSTO_SEM_CONTA. Os
+    potenciais e a atribuição parcial recebidos precisam deixar todos os
+    custos reduzidos não negativos, zero nas arestas atribuídas e as colunas
+    livres com o maior potencial.
+    """
+    for origem in livres:
+        # Dijkstra pelos custos reduzidos até a primeira coluna livre
+        fixadas = {}
+        tentativas = {}
+        anterior = {}
+        distancia_linha = {origem: 0.0}
+        fila = []
+        linha, distancia = origem, 0.0
+        while True:
+            ajuste = distancia + potencial_linha[linha]
+            for posicao in range(inicio_linha[linha], inicio_linha[linha + 1]):
+                coluna = colunas[posicao]
+                if coluna in fixadas:
+                    continue
+                tentativa = ajuste + custos[posicao] - potencial_coluna[coluna]
+                if coluna not in tentativas or tentativa < tentativas[coluna]:
+                    tentativas[coluna] = tentativa
+                    anterior[coluna] = linha
+                    heappush(fila, (tentativa, coluna))
+            # coluna só desta linha, nunca disputada: entra direto na fila
+            coluna = total_colunas + linha
+            tentativa = ajuste + CUSTO_SEM_CONTA - potencial_coluna[coluna]
+            anterior[coluna] = linha
+            heappush(fila, (tentativa, coluna))
+            while True:
+                distancia, coluna = heappop(fila)
+                if coluna not in fixadas:
+                    break
+            fixadas[coluna] = distancia
+            linha = linha_da_coluna[coluna]
+            if linha == -1:
+                break
+            distancia_linha[linha] = distancia
+
+        # Potenciais: custos reduzidos continuam não negativos e zero nas arestas atribuídas
+        for coluna_fixada, distancia_coluna in fixadas.items():
+            potencial_coluna[coluna_fixada] += distancia_coluna - distancia
+        for linha_fixada, distancia_fixada in distancia_linha.items():
+            potencial_linha[linha_fixada] += distancia_fixada - distancia
+
+        # Inverte o caminho aumentante até a origem
+        while True:
+            linha = anterior[coluna]
+            linha_da_coluna[coluna], coluna_da_linha[linha], coluna = linha, coluna, coluna_da_linha[linha]
+            if linha == origem:
+                break
+
+def atribuir_arestas(linhas, colunas, custo, total_linhas, total_colunas):
+    """Coluna escolhida (ou -1) para cada linha, na atribuição um para um de menor custo total.
+
+    Deixar uma linha sem coluna custa CUSTO_SEM_CONTA.
+    """
+    escolhas = np.full(total_linhas, -1, dtype=np.int64)
+    if not len(linhas):
+        return escolhas
+    ordem = np.lexsort((custo, linhas))
+    linhas, colunas, custo = linhas[ordem], colunas[ordem], custo[ordem]
+
+    # Redução por linhas (vetorizada): cada linha fica com a sua aresta mais barata se
+    # nenhuma linha anterior tiver pego a mesma coluna. Sem disputa, a linha termina aqui;
+    # as que sobram passam pela redução aumentante e, se ainda faltar, pelos caminhos
+    # aumentantes. Todos os potenciais de coluna começam em zero.
+    primeiras = np.flatnonzero(np.r_[True, linhas[1:] != linhas[:-1]])
+    _, unicas = np.unique(colunas[primeiras], return_index=True)
+    atribuidas = primeiras[unicas]
+    escolhas[linhas[atribuidas]] = colunas[atribuidas]
+    livres = np.setdiff1d(linhas[primeiras], linhas[atribuidas])
+    if not len(livres):
+        return escolhas
+
+    linha_da_coluna = np.full(total_colunas + total_linhas, -1, dtype=np.int64)
+    linha_da_coluna[colunas[atribuidas]] = linhas[atribuidas]
+    inicio_linha = np.searchsorted(linhas, np.arange(total_linhas + 1)).tolist()
+    colunas_lista, custos_lista = colunas.tolist(), custo.tolist()
+    linha_da_coluna, coluna_da_linha = linha_da_coluna.tolist(), escolhas.tolist()
+    potencial_coluna = [0.0] * (total_colunas + total_linhas)
+
+    livres = _reducao_aumentante(
+        livres.tolist(), inicio_linha, colunas_lista, custos_lista, total_colunas,
+        potencial_coluna, linha_da_coluna, coluna_da_linha, PASSOS_REDUCAO * len(livres)
+    )
+    if livres:
+        # Potencial de cada linha: menos o seu menor custo reduzido (o da coluna atribuída, se houver)
+        reduzidos = custo - np.array(potencial_coluna)[colunas]
+        potencial_linha = np.zeros(total_linhas)
+        potencial_linha[linhas[primeiras]] = -np.minimum(
+            np.minimum.reduceat(reduzidos, primeiras),
+            CUSTO_SEM_CONTA - np.array(potencial_coluna)[total_colunas + linhas[primeiras]]
+        )
+        _caminhos_aumentantes(
+            livres, inicio_linha, colunas_lista, custos_lista, total_colunas,
+            potencial_linha.tolist(), potencial_coluna, linha_da_coluna, coluna_da_linha
+        )
+    return np.array([coluna if 0 <= coluna < total_colunas else -1 for coluna in coluna_da_linha], dtype=np.int64)
+
+def conciliar(indice, datas, valores, descricoes):
+    """ID da conta escolhida (ou None) para cada transação; créditos ficam sempre sem conta"""
+    if not len(datas) or not len(indice):
+        return [None] * len(datas)
+    dias = _dias(datas)
+    centavos = _centavos(valores)
+    debitos = np.flatnonzero(np.asarray(valores, dtype=np.float64) < 0)
+
+    base = int(indice.fornecedores.max()) + 1
+    posicoes, fornecedores, notas = semelhanca_fornecedores([descricoes[i] for i in debitos], indice)
+    citados, unicos = np.unique(debitos[posicoes] * base + fornecedores, return_index=True)
+    notas = notas[unicos]
+
+    # Arestas, custos e poda por bloco de débitos, para a memória não crescer com o extrato
+    partes = []
+    for inicio in range(0, len(debitos), BLOCO_DEBITOS):
+        bloco = debitos[inicio:inicio + BLOCO_DEBITOS]
+        linhas, colunas = indice.arestas(dias[bloco], centavos[bloco])
+        linhas = bloco[linhas]
+        semelhanca = semelhanca_das_arestas(citados, notas, linhas * base + indice.fornecedores[colunas])
+        partes.append(_podar(linhas, colunas, custos(indice, linhas, colunas, dias, centavos, semelhanca)))
+    linhas, colunas, custo = (np.concatenate(parte) for parte in zip(*partes)) if partes else (np.zeros(0, dtype=np.int64),) * 3
+
+    escolhas = atribuir_arestas(linhas, colunas, custo, len(datas), len(indice))
+    return [int(indice.ids[coluna]) if coluna >= 0 else None for coluna in escolhas]
+
+def contas_por_id(ids):
+    """{id: ContaPagar} das contas entre `ids` (uma consulta por bloco)"""
+    ids = sorted(set(ids))
+    contas = {}
+    for inicio in range(0, len(ids), TAMANHO_BLOCO):
+        for conta in ContaPagar.query.filter(ContaPagar.id.in_(ids[inicio:inicio + TAMANHO_BLOCO])):
+            contas[conta.id] = conta
+    return contas
+
+def registrar_conciliacao_automatica(extrato, conta):
+    """Concilia `extrato` com `conta`, marcando a conta como paga se ainda estiver em aberto"""
+    extrato.status = 'CONCILIADO'
+    status_anterior = None
+    if conta.status in ContaPagar.status_em_aberto:
+        status_anterior = conta.status
+        conta.status = 'PAGO'
+        conta.data_pagamento = extrato.data_transacao
+        conta.valor_pago = abs(extrato.valor)
+    conciliacao = ConciliacaoBancaria(
+        extrato_bancario=extrato,
+        conta_pagar=conta,
+        tipo_conciliacao='AUTOMATICA',
+        status_conta_anterior=status_anterior,
+        data_conciliacao=datetime.now(),
+        observacoes='Conciliação automática baseada em valor, data e fornecedor'
+    )
+    db.session.add(conciliacao)
+    return conciliacao
+
+def conciliar_extratos(extratos):
+    """Concilia automaticamente os débitos entre `extratos` (ainda não conciliados). Não faz commit.
+
+    Retorna o número de conciliações criadas.
+    """
+    extratos = [extrato for extrato in extratos if extrato.valor < 0]
+    if not extratos:
+        return 0
+    datas = [extrato.data_transacao for extrato in extratos]
+    indice = IndiceCandidatos.do_periodo(min(datas), max(datas))
+    escolhas = conciliar(
+        indice, datas, [extrato.valor for extrato in extratos], [extrato.descricao for extrato in extratos]
+    )
+    contas = contas_por_id(conta_id for conta_id in escolhas if conta_id)
+    conciliacoes = 0
+    for extrato, conta_id in zip(extratos, escolhas):
+        if conta_id in contas:
+            registrar_conciliacao_automatica(extrato, contas[conta_id])
+            conciliacoes += 1
+    return conciliacoes
+
+def reprocessar_conciliacoes(data_inicio=None, data_fim=None, refazer_automaticas=False):
+    """Roda de novo a conciliação automática sobre os débitos não conciliados do período.
+
+    Com `refazer_automaticas`, as conciliações automáticas do período são
+    desfeitas antes e os seus débitos entram na nova atribuição; só voltam
+    ao status anterior (PENDENTE ou VENCIDO) as contas que a própria
+    conciliação automática marcou como pagas. As manuais não são tocadas.
+    Não faz commit.
+    """
+    filtros = [ExtratoBancario.valor < 0]
+    if data_inicio:
+        filtros.append(ExtratoBancario.data_transacao >= data_inicio)
+    if data_fim:
+        filtros.append(ExtratoBancario.data_transacao <= data_fim)
+
+    desfeitas = 0
+    if refazer_automaticas:
+        for conciliacao in ConciliacaoBancaria.query.join(ExtratoBancario).filter(
+            ConciliacaoBancaria.tipo_conciliacao == 'AUTOMATICA', *filtros
+        ):
+            conciliacao.extrato_bancario.status = 'NAO_CONCILIADO'
+            conta = conciliacao.conta_pagar
+            # Conta já paga antes da conciliação (ou conciliação sem o registro) mantém o pagamento
+            if conta and conta.status == 'PAGO' and conciliacao.status_conta_anterior:
+                conta.status = conciliacao.status_conta_anterior
+                conta.data_pagamento = None
+                conta.valor_pago = None
+            db.session.delete(conciliacao)
+            desfeitas += 1
+        db.session.flush()
+
+    extratos = ExtratoBancario.query.filter(ExtratoBancario.status == 'NAO_CONCILIADO', *filtros).order_by(
+        ExtratoBancario.data_transacao, ExtratoBancario.id
+    ).all()
+    return {
+        'extratos_analisados': len(extratos),
+        'conciliacoes_desfeitas': desfeitas,
+        'conciliacoes_automaticas': conciliar_extratos(extratos)
+    }
+
+def chave_extrato(id_transacao, data_transacao, valor):
+    return (id_transacao, data_transacao, Decimal(str(valor)))
+
+def consulta_extratos_existentes(inicio, fim, conta=None):
+    consulta = select(
+        ExtratoBancario.id_transacao, ExtratoBancario.data_transacao, ExtratoBancario.valor
+    ).where(ExtratoBancario.data_transacao.between(inicio, fim))
+    if conta is not None:
+        consulta = consulta.where(ExtratoBancario.conta == conta)
+    return consulta
+
+def extratos_existentes(inicio, fim, conta=None):
+    """Chaves (id_transacao, data, valor) dos extratos já gravados entre `inicio` e `fim`, da `conta` se informada"""
+    return {
+        chave_extrato(id_transacao, data_transacao, valor)
+        for id_transacao, data_transacao, valor in db.session.execute(consulta_extratos_existentes(inicio, fim, conta))
+    }
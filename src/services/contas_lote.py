@@ -0,0 +1,257 @@
+"""Operações em lote sobre contas a pagar: criar, pagar, cancelar e reagendar.
+
+Cada operação valida todos os itens com poucas consultas (uma por bloco de
+IDs referenciados) e grava os válidos com um único INSERT/UPDATE em massa.
+Itens inválidos ficam de fora e aparecem no relatório com o motivo; os
+demais são gravados mesmo assim. Nada aqui faz commit.
+
+O relatório tem um resultado compacto por item, na ordem recebida:
+    {'indice': 0, 'id': 12, 'status': 'paga'}
+    {'indice': 1, 'id': 99, 'status': 'erro', 'motivo': 'Conta a pagar não encontrada'}
+"""
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from sqlalchemy import insert, select, update
+from src.models.financeiro import db, ContaPagar, Fornecedor, TipoDespesa
+from src.services.busca import sincronizar_busca
+from src.services.resumo_financeiro import contabilizar_contas
+
+LOTE_MAX_ITENS = 1000
+TAMANHO_BLOCO = 500
+
+class ItemInvalido(Exception):
+    pass
+
+def _data(valor, campo):
+    try:
+        return datetime.strptime(valor, '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        raise ItemInvalido(f'{campo} inválida')
+
+def _inteiro(valor, campo):
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        raise ItemInvalido(f'{campo} inválido')
+
+def _valor(valor, campo):
+    try:
+        valor = Decimal(str(valor))
+    except InvalidOperation:
+        raise ItemInvalido(f'{campo} inválido')
+    if not valor.is_finite() or valor <= 0:
+        raise ItemInvalido(f'{campo} inválido')
+    return valor.quantize(Decimal('0.01'))
+
+def _ids_existentes(modelo, ids):
+    """IDs de `ids` que existem na tabela do modelo (uma consulta por bloco)"""
+    ids = sorted(set(ids))
+    existentes = set()
+    for inicio in range(0, len(ids), TAMANHO_BLOCO):
+        existentes.update(db.session.execute(
+            select(modelo.id).where(modelo.id.in_(ids[inicio:inicio + TAMANHO_BLOCO]))
+        ).scalars())
+    return existentes
+
+def _contas_por_id(ids, *colunas):
+    """{id: linha com as `colunas`} das contas existentes entre `ids`"""
+    ids = sorted(set(ids))
+    contas = {}
+    for inicio in range(0, len(ids), TAMANHO_BLOCO):
+        for linha in db.session.execute(
+            select(ContaPagar.id, *colunas).where(ContaPagar.id.in_(ids[inicio:inicio + TAMANHO_BLOCO]))
+        ):
+            contas[linha.id] = linha
+    return contas
+
+def _erro(indice, motivo, conta_id=None):
+    resultado = {'indice': indice, 'status': 'erro', 'motivo': motivo}
+    if conta_id is not None:
+        resultado['id'] = conta_id
+    return resultado
+
+def _validar_itens(itens):
+    if not isinstance(itens, list) or not itens:
+        raise ValueError('Informe a lista de itens')
+    if len(itens) > LOTE_MAX_ITENS:
+        raise ValueError(f'Máximo de {LOTE_MAX_ITENS} itens por lote')
+
+def _ids_dos_itens(itens, relatorio):
+    """Valida o `id` de cada item; retorna [(indice, item, id)] sem repetidos (erros vão ao relatório)"""
+    vistos = set()
+    validos = []
+    for indice, item in enumerate(itens):
+        conta_id = item.get('id') if isinstance(item, dict) else None
+        if not isinstance(conta_id, int) or isinstance(conta_id, bool):
+            relatorio[indice] = _erro(indice, 'ID da conta a pagar é obrigatório')
+        elif conta_id in vistos:
+            relatorio[indice] = _erro(indice, 'Conta repetida no lote', conta_id)
+        else:
+            vistos.add(conta_id)
+            validos.append((indice, item, conta_id))
+    return validos
+
+def _atualizar(linhas):
+    """UPDATE em massa por chave primária (um executemany), mantendo resumo e updated_at"""
+    if not linhas:
+        return
+    ids = [linha['id'] for linha in linhas]
+    agora = datetime.utcnow()
+    contabilizar_contas(ids, sinal=-1)
+    db.session.execute(
+        update(ContaPagar).execution_options(synchronize_session=False),
+        [dict(linha, updated_at=agora) for linha in linhas]
+    )
+    contabilizar_contas(ids)
+
+def criar_contas(itens):
+    """Cria as contas dos itens válidos com um INSERT em massa"""
+    _validar_itens(itens)
+    relatorio = [None] * len(itens)
+
+    validos = []
+    for indice, item in enumerate(itens):
+        try:
+            if not isinstance(item, dict):
+                raise ItemInvalido('Item inválido')
+            for campo, mensagem in (
+                ('fornecedor_id', 'Fornecedor é obrigatório'),
+                ('tipo_despesa_id', 'Tipo de despesa é obrigatório'),
+                ('descricao', 'Descrição é obrigatória'),
+                ('valor_original', 'Valor é obrigatório'),
+                ('data_vencimento', 'Data de vencimento é obrigatória')
+            ):
+                if not item.get(campo):
+                    raise ItemInvalido(mensagem)
+            validos.append((indice, {
+                'fornecedor_id': _inteiro(item['fornecedor_id'], 'Fornecedor'),
+                'tipo_despesa_id': _inteiro(item['tipo_despesa_id'], 'Tipo de despesa'),
+                'descricao': item['descricao'],
+                'valor_original': _valor(item['valor_original'], 'Valor'),
+                'data_vencimento': _data(item['data_vencimento'], 'Data de vencimento'),
+                'numero_documento': item.get('numero_documento', ''),
+                'observacoes': item.get('observacoes', ''),
+                'status': 'PENDENTE'
+            }))
+        except ItemInvalido as e:
+            relatorio[indice] = _erro(indice, str(e))
+
+    # Uma consulta por tabela referenciada para todo o lote
+    fornecedores = _ids_existentes(Fornecedor, [conta['fornecedor_id'] for _, conta in validos])
+    tipos = _ids_existentes(TipoDespesa, [conta['tipo_despesa_id'] for _, conta in validos])
+
+    a_inserir = []
+    for indice, conta in validos:
+        if conta['fornecedor_id'] not in fornecedores:
+            relatorio[indice] = _erro(indice, 'Fornecedor não encontrado')
+        elif conta['tipo_despesa_id'] not in tipos:
+            relatorio[indice] = _erro(indice, 'Tipo de despesa não encontrado')
+        else:
+            a_inserir.append((indice, conta))
+
+    if a_inserir:
+        contas = [conta for _, conta in a_inserir]
+        if db.session.get_bind().dialect.insert_returning:
+            # Os IDs voltam na ordem dos itens: no PostgreSQL o SQLAlchemy ordena o RETURNING do
+            # INSERT em massa pela chave autoincremento; no SQLite grava uma linha por INSERT
+            ids = db.session.execute(
+                insert(ContaPagar).returning(ContaPagar.id, sort_by_parameter_order=True), contas
+            ).scalars().all()
+        else:
+            ids = [
+                db.session.execute(insert(ContaPagar).values(**conta)).inserted_primary_key[0]
+                for conta in contas
+            ]
+        for (indice, _), conta_id in zip(a_inserir, ids):
+            relatorio[indice] = {'indice': indice, 'id': conta_id, 'status': 'criada'}
+
+        # INSERT em massa não passa pelo after_flush
+        contabilizar_contas(ids)
+        sincronizar_busca({'contas_pagar': ids})
+
+    return relatorio
+
+def pagar_contas(itens):
+    """Marca como pagas as contas dos itens (id, data_pagamento, valor_pago, observacoes)"""
+    _validar_itens(itens)
+    relatorio = [None] * len(itens)
+    validos = _ids_dos_itens(itens, relatorio)
+    contas = _contas_por_id([conta_id for _, _, conta_id in validos], ContaPagar.status, ContaPagar.valor_original)
+
+    linhas = []
+    for indice, item, conta_id in validos:
+        conta = contas.get(conta_id)
+        try:
+            if conta is None:
+                raise ItemInvalido('Conta a pagar não encontrada')
+            if conta.status == 'PAGO':
+                raise ItemInvalido('Conta já está paga')
+            linha = {
+                'id': conta_id,
+                'status': 'PAGO',
+                'data_pagamento': _data(item['data_pagamento'], 'Data de pagamento') if item.get('data_pagamento') else date.today(),
+                'valor_pago': _valor(item['valor_pago'], 'Valor pago') if item.get('valor_pago') is not None else conta.valor_original
+            }
+            if 'observacoes' in item:
+                linha['observacoes'] = item['observacoes']
+        except ItemInvalido as e:
+            relatorio[indice] = _erro(indice, str(e), conta_id)
+            continue
+        linhas.append(linha)
+        relatorio[indice] = {'indice': indice, 'id': conta_id, 'status': 'paga'}
+
+    _atualizar(linhas)
+    return relatorio
+
+def cancelar_contas(itens):
+    """Cancela as contas dos itens (id); contas pagas não podem ser canceladas"""
+    _validar_itens(itens)
+    relatorio = [None] * len(itens)
+    validos = _ids_dos_itens(itens, relatorio)
+    contas = _contas_por_id([conta_id for _, _, conta_id in validos], ContaPagar.status)
+
+    linhas = []
+    for indice, item, conta_id in validos:
+        conta = contas.get(conta_id)
+        if conta is None:
+            relatorio[indice] = _erro(indice, 'Conta a pagar não encontrada', conta_id)
+        elif conta.status == 'PAGO':
+            relatorio[indice] = _erro(indice, 'Não é possível cancelar conta já paga', conta_id)
+        else:
+            if conta.status != 'CANCELADO':
+                linhas.append({'id': conta_id, 'status': 'CANCELADO'})
+            relatorio[indice] = {'indice': indice, 'id': conta_id, 'status': 'cancelada'}
+
+    _atualizar(linhas)
+    return relatorio
+
+def reagendar_contas(itens):
+    """Altera o vencimento das contas dos itens (id, data_vencimento).
+
+    Uma conta VENCIDO reagendada para hoje ou depois volta a PENDENTE.
+    """
+    _validar_itens(itens)
+    relatorio = [None] * len(itens)
+    validos = _ids_dos_itens(itens, relatorio)
+    contas = _contas_por_id([conta_id for _, _, conta_id in validos], ContaPagar.status)
+    hoje = date.today()
+
+    linhas = []
+    for indice, item, conta_id in validos:
+        conta = contas.get(conta_id)
+        try:
+            if conta is None:
+                raise ItemInvalido('Conta a pagar não encontrada')
+            if conta.status == 'PAGO':
+                raise ItemInvalido('Não é possível alterar conta já paga')
+            linha = {'id': conta_id, 'data_vencimento': _data(item.get('data_vencimento'), 'Data de vencimento')}
+        except ItemInvalido as e:
+            relatorio[indice] = _erro(indice, str(e), conta_id)
+            continue
+        if conta.status == 'VENCIDO' and linha['data_vencimento'] >= hoje:
+            linha['status'] = 'PENDENTE'
+        linhas.append(linha)
+        relatorio[indice] = {'indice': indice, 'id': conta_id, 'status': 'reagendada'}
+
+    _atualizar(linhas)
+    return relatorio
@@ -0,0 +1,264 @@
+"""Exportação em CSV e XLSX de contas a pagar, notas fiscais (com itens) e extratos.
+
+As linhas vêm do banco como tuplas, por cursor do lado do servidor
+(stream_results + yield_per), e são escritas à medida que chegam. O CSV sai
+em blocos pelo próprio gerador da resposta. O XLSX não é enviado em
+streaming: o XlsxWriter em modo constant_memory escreve uma linha por vez
+num arquivo temporário, e o primeiro byte só sai depois que o arquivo
+inteiro foi escrito (um zip só se fecha no fim); daí ele é enviado em
+pedaços. Em nenhum dos dois o conjunto inteiro fica em memória.
+
+O CSV segue o padrão do Excel em português: separador ';', vírgula
+decimal e BOM UTF-8. Nos dois formatos, textos que começam com =, +, - ou @
+ganham um apóstrofo na frente, para a planilha não os executar como fórmula.
+"""
+import csv
+import io
+import os
+import tempfile
+from collections import namedtuple
+from datetime import date, datetime
+from decimal import Decimal
+from sqlalchemy import select
+from src.models.financeiro import db, ContaPagar, Fornecedor, TipoDespesa, NotaFiscal, ItemNotaFiscal, ExtratoBancario
+
+try:
+    import xlsxwriter
+except ImportError:  # pragma: no cover - dependência opcional
+    xlsxwriter = None
+
+FORMATOS = ('csv', 'xlsx')
+LINHAS_POR_BLOCO = 1000
+LINHAS_POR_PLANILHA = 1048576  # limite do Excel, cabeçalho incluído
+TAMANHO_PEDACO = 64 * 1024
+INICIO_FORMULA = ('=', '+', '-', '@')
+
+TIPOS_CONTEUDO = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+}
+
+Exportacao = namedtuple('Exportacao', 'nome colunas montar')
+
+def _colunas_contas():
+    return [
+        ('ID', ContaPagar.id),
+        ('Fornecedor', Fornecedor.razao_social),
+        ('CNPJ', Fornecedor.cnpj),
+        ('Tipo de despesa', TipoDespesa.nome),
+        ('Descrição', ContaPagar.descricao),
+        ('Documento', ContaPagar.numero_documento),
+        ('Nota fiscal', NotaFiscal.numero),
+        ('Parcela', ContaPagar.numero_parcela),
+        ('Total de parcelas', ContaPagar.total_parcelas),
+        ('Valor original', ContaPagar.valor_original),
+        ('Valor pago', ContaPagar.valor_pago),
+        ('Vencimento', ContaPagar.data_vencimento),
+        ('Pagamento', ContaPagar.data_pagamento),
+        ('Status', ContaPagar.status),
+        ('Observações', ContaPagar.observacoes)
+    ]
+
+def _montar_contas(colunas, filtros):
+    consulta = select(*colunas).select_from(ContaPagar).outerjoin(
+        Fornecedor, Fornecedor.id == ContaPagar.fornecedor_id
+    ).outerjoin(
+        TipoDespesa, TipoDespesa.id == ContaPagar.tipo_despesa_id
+    ).outerjoin(
+        NotaFiscal, NotaFiscal.id == ContaPagar.nota_fiscal_id
+    )
+    if filtros.get('data_inicio'):
+        consulta = consulta.where(ContaPagar.data_vencimento >= filtros['data_inicio'])
+    if filtros.get('data_fim'):
+        consulta = consulta.where(ContaPagar.data_vencimento <= filtros['data_fim'])
+    if filtros.get('status'):
+        consulta = consulta.where(ContaPagar.status == filtros['status'])
+    return consulta.order_by(ContaPagar.data_vencimento, ContaPagar.id)
+
+def _colunas_notas():
+    return [
+        ('ID da nota', NotaFiscal.id),
+        ('Chave de acesso', NotaFiscal.chave_acesso),
+        ('Número', NotaFiscal.numero),
+        ('Série', NotaFiscal.serie),
+        ('Emissão', NotaFiscal.data_emissao),
+        ('Fornecedor', Fornecedor.razao_social),
+        ('CNPJ', Fornecedor.cnpj),
+        ('Valor total da nota', NotaFiscal.valor_total),
+        ('Status da nota', NotaFiscal.status),
+        ('Código do produto', ItemNotaFiscal.codigo_produto),
+        ('Descrição do item', ItemNotaFiscal.descricao),
+        ('NCM', ItemNotaFiscal.ncm),
+        ('CFOP', ItemNotaFiscal.cfop),
+        ('Unidade', ItemNotaFiscal.unidade),
+        ('Quantidade', ItemNotaFiscal.quantidade),
+        ('Valor unitário', ItemNotaFiscal.valor_unitario),
+        ('Valor total do item', ItemNotaFiscal.valor_total),
+        ('Desconto do item', ItemNotaFiscal.valor_desconto),
+        ('ICMS do item', ItemNotaFiscal.valor_icms),
+        ('IPI do item', ItemNotaFiscal.valor_ipi),
+        ('PIS do item', ItemNotaFiscal.valor_pis),
+        ('COFINS do item', ItemNotaFiscal.valor_cofins)
+    ]
+
+def _montar_notas(colunas, filtros):
+    # Uma linha por item; notas sem itens saem em uma linha com as colunas do item vazias
+    consulta = select(*colunas).select_from(NotaFiscal).outerjoin(
+        Fornecedor, Fornecedor.id == NotaFiscal.fornecedor_id
+    ).outerjoin(
+        ItemNotaFiscal, ItemNotaFiscal.nota_fiscal_id == NotaFiscal.id
+    )
+    if filtros.get('data_inicio'):
+        consulta = consulta.where(NotaFiscal.data_emissao >= filtros['data_inicio'])
+    if filtros.get('data_fim'):
+        consulta = consulta.where(NotaFiscal.data_emissao <= filtros['data_fim'])
+    if filtros.get('status'):
+        consulta = consulta.where(NotaFiscal.status == filtros['status'])
+    return consulta.order_by(NotaFiscal.data_emissao, NotaFiscal.id, ItemNotaFiscal.id)
+
+def _colunas_extratos():
+    return [
+        ('ID', ExtratoBancario.id),
+        ('Data', ExtratoBancario.data_transacao),
+        ('Valor', ExtratoBancario.valor),
+        ('Tipo', ExtratoBancario.tipo_transacao),
+        ('Descrição', ExtratoBancario.descricao),
+        ('ID da transação', ExtratoBancario.id_transacao),
+        ('Banco', ExtratoBancario.banco),
+        ('Agência', ExtratoBancario.agencia),
+        ('Conta', ExtratoBancario.conta),
+        ('Arquivo', ExtratoBancario.nome_arquivo),
+        ('Importação', ExtratoBancario.data_importacao),
+        ('Status', ExtratoBancario.status)
+    ]
+
+def _montar_extratos(colunas, filtros):
+    consulta = select(*colunas)
+    if filtros.get('data_inicio'):
+        consulta = consulta.where(ExtratoBancario.data_transacao >= filtros['data_inicio'])
+    if filtros.get('data_fim'):
+        consulta = consulta.where(ExtratoBancario.data_transacao <= filtros['data_fim'])
+    if filtros.get('status'):
+        consulta = consulta.where(ExtratoBancario.status == filtros['status'])
+    return consulta.order_by(ExtratoBancario.data_transacao, ExtratoBancario.id)
+
+EXPORTACOES = {
+    'contas_pagar': Exportacao('Contas a pagar', _colunas_contas, _montar_contas),
+    'notas_fiscais': Exportacao('Notas fiscais', _colunas_notas, _montar_notas),
+    'extratos': Exportacao('Extratos', _colunas_extratos, _montar_extratos),
+}
+
+def _data(valor, campo):
+    try:
+        return datetime.strptime(valor, '%Y-%m-%d').date()
+    except ValueError:
+        raise ValueError(f'{campo} inválida')
+
+def filtros_exportacao(args):
+    """Lê formato, ano, data_inicio, data_fim e status da query string"""
+    formato = args.get('formato', 'csv').lower()
+    if formato not in FORMATOS:
+        raise ValueError(f'Formato inválido. Use: {", ".join(FORMATOS)}')
+    if formato == 'xlsx' and xlsxwriter is None:
+        raise ValueError('Exportação XLSX indisponível: instale o pacote XlsxWriter')
+
+    filtros = {'formato': formato, 'status': args.get('status', '')}
+    ano = args.get('ano', type=int)
+    if ano:
+        filtros['data_inicio'] = date(ano, 1, 1)
+        filtros['data_fim'] = date(ano, 12, 31)
+    if args.get('data_inicio'):
+        filtros['data_inicio'] = _data(args['data_inicio'], 'Data inicial')
+    if args.get('data_fim'):
+        filtros['data_fim'] = _data(args['data_fim'], 'Data final')
+    return filtros
+
+def _blocos_de_linhas(consulta):
+    """Blocos de tuplas lidos por cursor do lado do servidor"""
+    resultado = db.session.execute(
+        consulta.execution_options(stream_results=True, yield_per=LINHAS_POR_BLOCO)
+    )
+    try:
+        for bloco in resultado.partitions():
+            yield bloco
+    finally:
+        resultado.close()
+
+def _texto_seguro(valor):
+    """Apóstrofo na frente de textos que a planilha leria como fórmula (=HYPERLINK(...), @SUM...)"""
+    if isinstance(valor, str) and valor.startswith(INICIO_FORMULA):
+        return "'" + valor
+    return valor
+
+def _celula_csv(valor):
+    if valor is None:
+        return ''
+    if isinstance(valor, Decimal):
+        return format(valor, 'f').replace('.', ',')
+    if isinstance(valor, float):
+        return repr(valor).replace('.', ',')
+    if isinstance(valor, datetime):
+        return valor.isoformat(sep=' ', timespec='seconds')
+    if isinstance(valor, date):
+        return valor.isoformat()
+    return _texto_seguro(valor)
+
+def _gerar_csv(cabecalhos, blocos):
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer, delimiter=';', lineterminator='\r\n')
+    escritor.writerow(cabecalhos)
+    yield '\ufeff' + buffer.getvalue()
+    for bloco in blocos:
+        buffer.seek(0)
+        buffer.truncate()
+        escritor.writerows([_celula_csv(valor) for valor in linha] for linha in bloco)
+        yield buffer.getvalue()
+
+def _gerar_xlsx(nome, cabecalhos, blocos):
+    """Escreve a planilha inteira no arquivo temporário e só então a envia em pedaços"""
+    descritor, caminho = tempfile.mkstemp(suffix='.xlsx')
+    os.close(descritor)
+    try:
+        planilha_livro = xlsxwriter.Workbook(caminho, {
+            'constant_memory': True,
+            'default_date_format': 'dd/mm/yyyy',
+            'remove_timezone': True
+        })
+        negrito = planilha_livro.add_format({'bold': True})
+        planilha = None
+        numero_planilha = 0
+        linha_atual = LINHAS_POR_PLANILHA
+        for bloco in blocos:
+            for linha in bloco:
+                if linha_atual >= LINHAS_POR_PLANILHA:
+                    # Passou do limite do Excel: continua em outra planilha
+                    numero_planilha += 1
+                    planilha = planilha_livro.add_worksheet(nome if numero_planilha == 1 else f'{nome} {numero_planilha}')
+                    planilha.write_row(0, 0, cabecalhos, negrito)
+                    linha_atual = 1
+                planilha.write_row(linha_atual, 0, [_texto_seguro(valor) for valor in linha])
+                linha_atual += 1
+        if planilha is None:
+            planilha = planilha_livro.add_worksheet(nome)
+            planilha.write_row(0, 0, cabecalhos, negrito)
+        planilha_livro.close()
+
+        with open(caminho, 'rb') as arquivo:
+            for pedaco in iter(lambda: arquivo.read(TAMANHO_PEDACO), b''):
+                yield pedaco
+    finally:
+        os.remove(caminho)
+
+def exportar(tipo, filtros):
+    """Retorna (gerador do conteúdo, tipo de conteúdo, nome do arquivo) da exportação `tipo`"""
+    exportacao = EXPORTACOES[tipo]
+    colunas = exportacao.colunas()
+    consulta = exportacao.montar([coluna for _, coluna in colunas], filtros)
+    cabecalhos = [cabecalho for cabecalho, _ in colunas]
+    blocos = _blocos_de_linhas(consulta)
+
+    formato = filtros['formato']
+    nome_arquivo = f"{tipo}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{formato}"
+    if formato == 'xlsx':
+        return _gerar_xlsx(exportacao.nome, cabecalhos, blocos), TIPOS_CONTEUDO[formato], nome_arquivo
+    return _gerar_csv(cabecalhos, blocos), TIPOS_CONTEUDO[formato], nome_arquivo
@@ -0,0 +1,184 @@
+"""Fluxo de caixa e calendário de vencimentos das contas a pagar.
+
+As consultas trazem só as colunas necessárias (data, valor, status) e o
+agrupamento é feito com NumPy: np.bincount sobre o deslocamento em dias de
+cada conta produz a série diária, e np.add.reduceat soma os dias em semanas
+ou meses. Nenhum objeto ORM é montado.
+
+Os resultados ficam em cache por período (src/services/cache_contas.py) e
+são recalculados quando alguma conta muda.
+"""
+from datetime import date, timedelta
+import numpy as np
+from sqlalchemy import Float, cast, select
+from src.models.financeiro import db, ContaPagar
+from src.services.cache_contas import em_cache
+
+GRANULARIDADES = ('dia', 'semana', 'mes')
+MESES_MAXIMO = 24
+
+def _somar_meses(data, meses):
+    ano, mes = divmod(data.month - 1 + meses, 12)
+    return date(data.year + ano, mes + 1, 1)
+
+def _arrays(consulta):
+    """Colunas de `consulta` como arrays: a 1ª (data) em datetime64[D], a 2ª (valor) em float64, as demais object"""
+    linhas = db.session.execute(consulta).all()
+    colunas = list(zip(*linhas)) if linhas else [()] * len(consulta.selected_columns)
+    datas, valores, *outras = colunas
+    return (
+        np.array(datas, dtype='datetime64[D]'),
+        np.nan_to_num(np.array(valores, dtype=np.float64)),
+        *(np.array(coluna, dtype=object) for coluna in outras)
+    )
+
+# Consultas do fluxo e do calendário
+
+def consulta_previsto(fim):
+    """Contas em aberto que vencem até `fim` (inclusive as atrasadas)"""
+    return select(ContaPagar.data_vencimento, cast(ContaPagar.valor_original, Float)).where(
+        ContaPagar.status.in_(ContaPagar.status_em_aberto),
+        ContaPagar.data_vencimento <= fim
+    )
+
+def consulta_realizado(inicio, fim):
+    """Pagamentos efetivos (valor_pago na data_pagamento) entre `inicio` e `fim`"""
+    return select(ContaPagar.data_pagamento, cast(ContaPagar.valor_pago, Float)).where(
+        ContaPagar.status == 'PAGO',
+        ContaPagar.data_pagamento.between(inicio, fim)
+    )
+
+def consulta_calendario(inicio, fim):
+    """Contas (exceto canceladas) que vencem entre `inicio` e `fim`"""
+    return select(ContaPagar.data_vencimento, cast(ContaPagar.valor_original, Float), ContaPagar.status).where(
+        ContaPagar.data_vencimento.between(inicio, fim),
+        ContaPagar.status != 'CANCELADO'
+    )
+
+def _serie_diaria(datas, valores, inicio, dias):
+    """Quantidade e soma por dia em [inicio, inicio + dias) via bincount dos deslocamentos"""
+    deslocamentos = (datas - np.datetime64(inicio, 'D')).astype(np.int64)
+    dentro = (deslocamentos >= 0) & (deslocamentos < dias)
+    deslocamentos = deslocamentos[dentro]
+    quantidades = np.bincount(deslocamentos, minlength=dias)
+    somas = np.bincount(deslocamentos, weights=valores[dentro], minlength=dias)
+    return quantidades, somas
+
+def _inicios_periodos(inicio, fim, granularidade):
+    """Primeiro dia de cada período (dia, semana iniciada na segunda ou mês) que toca [inicio, fim]"""
+    if granularidade == 'dia':
+        return [inicio + timedelta(days=i) for i in range((fim - inicio).days + 1)]
+    inicios = [inicio]
+    if granularidade == 'semana':
+        proximo = inicio + timedelta(days=7 - inicio.weekday())
+        while proximo <= fim:
+            inicios.append(proximo)
+            proximo += timedelta(days=7)
+    else:
+        proximo = _somar_meses(inicio, 1)
+        while proximo <= fim:
+            inicios.append(proximo)
+            proximo = _somar_meses(proximo, 1)
+    return inicios
+
+def _agrupar(datas, valores, inicio, fim, granularidade):
+    """Lista de períodos com quantidade e valor, somando a série diária com reduceat"""
+    dias = (fim - inicio).days + 1
+    quantidades, somas = _serie_diaria(datas, valores, inicio, dias)
+    inicios = _inicios_periodos(inicio, fim, granularidade)
+    indices = np.array([(data - inicio).days for data in inicios], dtype=np.int64)
+    quantidades = np.add.reduceat(quantidades, indices)
+    somas = np.add.reduceat(somas, indices)
+    fins = [proximo - timedelta(days=1) for proximo in inicios[1:]] + [fim]
+    return [
+        {
+            'inicio': inicio_periodo.isoformat(),
+            'fim': fim_periodo.isoformat(),
+            'quantidade': int(quantidade),
+            'valor': round(float(soma), 2)
+        }
+        for inicio_periodo, fim_periodo, quantidade, soma in zip(inicios, fins, quantidades, somas)
+    ]
+
+def _total(periodos):
+    return {
+        'quantidade': sum(periodo['quantidade'] for periodo in periodos),
+        'valor': round(sum(periodo['valor'] for periodo in periodos), 2)
+    }
+
+def _calcular_fluxo(meses, granularidade, hoje):
+    # Meses de calendário inteiros: o atual mais `meses` à frente e `meses` para trás
+    fim_previsto = _somar_meses(hoje, meses + 1) - timedelta(days=1)
+    inicio_realizado = _somar_meses(hoje, -meses)
+
+    # Previsto: contas em aberto até o fim do horizonte; as de antes de hoje são atrasadas
+    datas, valores = _arrays(consulta_previsto(fim_previsto))
+    atrasadas = datas < np.datetime64(hoje, 'D')
+    previsto = _agrupar(datas, valores, hoje, fim_previsto, granularidade)
+
+    # Realizado: pagamentos efetivos (valor_pago na data_pagamento)
+    datas_pagamento, valores_pagos = _arrays(consulta_realizado(inicio_realizado, hoje))
+    realizado = _agrupar(datas_pagamento, valores_pagos, inicio_realizado, hoje, granularidade)
+
+    return {
+        'granularidade': granularidade,
+        'meses': meses,
+        'referencia': hoje.isoformat(),
+        'previsto': {
+            'inicio': hoje.isoformat(),
+            'fim': fim_previsto.isoformat(),
+            'em_atraso': {
+                'quantidade': int(atrasadas.sum()),
+                'valor': round(float(valores[atrasadas].sum()), 2)
+            },
+            'total': _total(previsto),
+            'periodos': previsto
+        },
+        'realizado': {
+            'inicio': inicio_realizado.isoformat(),
+            'fim': hoje.isoformat(),
+            'total': _total(realizado),
+            'periodos': realizado
+        }
+    }
+
+def fluxo_caixa(meses=3, granularidade='mes', hoje=None):
+    """Saídas previstas (contas em aberto) de hoje ao fim do `meses`-ésimo mês seguinte e
+    pagamentos realizados desde o início do mês `meses` meses atrás"""
+    if granularidade not in GRANULARIDADES:
+        raise ValueError(f'Granularidade inválida. Use: {", ".join(GRANULARIDADES)}')
+    if not 1 <= meses <= MESES_MAXIMO:
+        raise ValueError(f'Informe de 1 a {MESES_MAXIMO} meses')
+    hoje = hoje or date.today()
+    return em_cache(('fluxo', meses, granularidade, hoje), lambda: _calcular_fluxo(meses, granularidade, hoje))
+
+def _calcular_calendario(ano, mes):
+    inicio = date(ano, mes, 1)
+    fim = _somar_meses(inicio, 1) - timedelta(days=1)
+    dias = fim.day
+
+    datas, valores, status = _arrays(consulta_calendario(inicio, fim))
+    em_aberto = np.isin(status, ContaPagar.status_em_aberto)
+    quantidades, somas = _serie_diaria(datas, valores, inicio, dias)
+    quantidades_abertas, somas_abertas = _serie_diaria(datas[em_aberto], valores[em_aberto], inicio, dias)
+
+    return {
+        'mes': f'{ano:04d}-{mes:02d}',
+        'total': {'quantidade': int(quantidades.sum()), 'valor': round(float(somas.sum()), 2)},
+        'dias': [
+            {
+                'data': (inicio + timedelta(days=dia)).isoformat(),
+                'quantidade': int(quantidades[dia]),
+                'valor': round(float(somas[dia]), 2),
+                'quantidade_em_aberto': int(quantidades_abertas[dia]),
+                'valor_em_aberto': round(float(somas_abertas[dia]), 2)
+            }
+            for dia in range(dias)
+        ]
+    }
+
+def calendario_vencimentos(ano, mes):
+    """Quantidade e valor das contas (exceto canceladas) que vencem em cada dia do mês"""
+    if not 1 <= mes <= 12:
+        raise ValueError('Mês inválido')
+    return em_cache(('calendario', ano, mes), lambda: _calcular_calendario(ano, mes))
@@ -0,0 +1,348 @@
+"""Índices em memória dos nomes dos fornecedores, para achá-los em descrições de extratos.
+
+Cada fornecedor entra com os tokens da razão social e do nome fantasia,
+normalizados: minúsculas, sem acentos, sem pontuação e sem as formas
+societárias e conectivos (LTDA, ME, EIRELI, S/A, de, da...).
+
+- citados(): índice invertido token -> fornecedores. Custa uma consulta ao
+  dicionário por token do texto, em vez de um ILIKE '%palavra%' sobre a
+  tabela inteira para cada palavra. Cada token pesa pelo seu IDF: uma
+  palavra comum a muitos nomes ("comercial", "distribuidora") não identifica
+  ninguém.
+- semelhantes(): os K fornecedores de nome mais parecido com o texto, por
+  trigramas de caracteres, para descrições abreviadas ou cortadas
+  ("PAG TIT DISTRIB ALIM SAO J"). A nota é a de similarity() do pg_trgm
+  (Jaccard dos trigramas, cada palavra com dois espaços antes e um depois).
+  No PostgreSQL com a migração 5 aplicada, a consulta vai para o banco
+  (pg_trgm com índice GIN); nos outros, usa uma matriz de trigramas em
+  memória (CSR em NumPy), recompilada na primeira consulta depois de uma
+  alteração. Na memória os candidatos saem dos trigramas mais raros do
+  texto e só eles recebem a nota exata, o que mantém a consulta abaixo de
+  1 ms com dezenas de milhares de fornecedores
+  (benchmarks/bench_semelhanca_fornecedores.py).
+
+Há um índice por engine. As rotas de fornecedores atualizam o índice depois
+de cada criação, alteração ou exclusão. Gravações por outros caminhos
+(importação de NF-e, outro processo) mudam a versão da tabela fornecedores
+(src/services/versoes.py), e o índice é reconstruído na próxima consulta.
+"""
+import math
+import re
+import threading
+import unicodedata
+import weakref
+import numpy as np
+from sqlalchemy import bindparam, select, text
+from src.models.financeiro import db, Fornecedor
+from src.services.versoes import versoes
+
+TAMANHO_MINIMO_TOKEN = 3
+K_SEMELHANTES = 5
+LIMIAR_SEMELHANCA = 0.2
+LEITURA_MAXIMA = 16384  # posições lidas das listas de trigramas por texto
+CANDIDATOS_VERIFICADOS = 128  # candidatos com a nota exata calculada por texto
+PALAVRAS_IGNORADAS = frozenset({
+    'ltda', 'me', 'epp', 'mei', 'eireli', 'sa', 'cia', 'limitada',
+    'de', 'da', 'do', 'das', 'dos', 'e',
+})
+
+_RE_SA = re.compile(r'\bs\s*[./]\s*a\b\.?')
+_RE_TOKEN = re.compile(r'[a-z0-9]+')
+
+def tokens(texto):
+    """Tokens normalizados de `texto`, na ordem em que aparecem e sem repetição"""
+    if not texto:
+        return []
+    texto = unicodedata.normalize('NFKD', texto).encode('ascii', 'ignore').decode().lower()
+    texto = _RE_SA.sub(' sa ', texto)
+    return list(dict.fromkeys(
+        token for token in _RE_TOKEN.findall(texto)
+        if len(token) >= TAMANHO_MINIMO_TOKEN and token not in PALAVRAS_IGNORADAS
+    ))
+
+def texto_normalizado(texto):
+    return ' '.join(tokens(texto))
+
+def trigramas(textos_normalizados):
+    """Chaves (código do trigrama << 24 | índice do texto), ordenadas e sem repetição, de cada
+    trigrama de cada texto, como o pg_trgm os extrai: cada palavra com dois espaços antes e
+    um depois. O código são os três bytes do trigrama (os textos normalizados são ASCII).
+    """
+    preenchidos = [''.join(f'  {palavra} ' for palavra in texto.split()) for texto in textos_normalizados]
+    caracteres = np.frombuffer(''.join(preenchidos).encode('ascii'), dtype=np.uint8).astype(np.int64)
+    if len(caracteres) < 3:
+        return np.zeros(0, dtype=np.int64)
+    codigos = caracteres[:-2] << 16 | caracteres[1:-1] << 8 | caracteres[2:]
+    # Janelas terminadas em dois espaços atravessam palavras (ou textos) e não são trigramas
+    validas = (caracteres[1:-1] != 32) | (caracteres[2:] != 32)
+    textos = np.repeat(np.arange(len(preenchidos)), [len(texto) for texto in preenchidos])[:-2]
+    chaves = codigos[validas] << 24 | textos[validas]
+    chaves.sort()
+    return chaves[np.r_[True, chaves[1:] != chaves[:-1]]]
+
+class _MatrizTrigramas:
+    """Trigramas de todos os nomes, nos dois sentidos, em CSR.
+
+    Por fornecedor (posição): os códigos dos seus trigramas. Por trigrama:
+    as posições dos fornecedores que o têm, e a frequência de cada um.
+    """
+    __slots__ = ('ids', 'tamanhos', 'inicio_nome', 'codigos_nome', 'brutos', 'inicio', 'posicoes', 'frequencias')
+
+    def __init__(self, nomes):
+        """`nomes`: {fornecedor_id: nome normalizado}"""
+        self.ids = np.fromiter(nomes, dtype=np.int64, count=len(nomes))
+        chaves = trigramas(list(nomes.values()))
+        brutos, self.posicoes = chaves >> 24, chaves & 0xFFFFFF
+        novos = np.r_[True, brutos[1:] != brutos[:-1]] if len(brutos) else np.zeros(0, dtype=bool)
+        self.brutos = brutos[novos]
+        self.inicio = np.r_[np.flatnonzero(novos), len(brutos)]
+        self.frequencias = np.diff(self.inicio)
+
+        ordem = np.argsort(self.posicoes, kind='stable')
+        self.codigos_nome = (np.cumsum(novos) - 1)[ordem]
+        self.tamanhos = np.bincount(self.posicoes, minlength=len(nomes))
+        self.inicio_nome = np.r_[0, np.cumsum(self.tamanhos)]
+
+    def _iguais(self, candidatos, procurados):
+        """Quantos trigramas de cada candidato estão em `procurados` (máscara por código)"""
+        tamanhos = self.tamanhos[candidatos]
+        fins = np.cumsum(tamanhos)
+        deslocamento = np.arange(fins[-1]) - np.repeat(fins - tamanhos, tamanhos)
+        acertos = procurados[self.codigos_nome[np.repeat(self.inicio_nome[candidatos], tamanhos) + deslocamento]]
+        return np.add.reduceat(acertos.astype(np.int64), fins - tamanhos)
+
+    def semelhantes(self, texto_normalizado, k, limiar, permitidos=None):
+        """[(fornecedor_id, nota)] dos até `k` nomes mais parecidos com nota >= `limiar`.
+
+        `permitidos`: máscara booleana por posição, para restringir os fornecedores.
+
+        Os candidatos saem das listas dos trigramas mais raros do texto (a
+        metade mais rara, até LEITURA_MAXIMA posições): são eles que separam um
+        fornecedor dos outros, enquanto os comuns ("com", "dis", "ltd"...)
+        aparecem em milhares de nomes. Os CANDIDATOS_VERIFICADOS que mais
+        aparecem nessas listas recebem a nota exata (Jaccard de todos os
+        trigramas).
+        """
+        brutos = trigramas([texto_normalizado]) >> 24
+        if not len(brutos) or not len(self.brutos):
+            return []
+        lugares = np.minimum(np.searchsorted(self.brutos, brutos), len(self.brutos) - 1)
+        conhecidos = lugares[self.brutos[lugares] == brutos]
+        if not len(conhecidos):
+            return []
+        conhecidos = conhecidos[np.argsort(self.frequencias[conhecidos], kind='stable')]
+
+        lidos = max(1, min((len(conhecidos) + 1) // 2,
+                           int(np.searchsorted(np.cumsum(self.frequencias[conhecidos]), LEITURA_MAXIMA, 'right'))))
+        inicio = self.inicio
+        candidatos, vezes = np.unique(np.concatenate([
+            self.posicoes[inicio[codigo]:inicio[codigo + 1]] for codigo in conhecidos[:lidos].tolist()
+        ]), return_counts=True)
+        if permitidos is not None:
+            dentro = permitidos[candidatos]
+            candidatos, vezes = candidatos[dentro], vezes[dentro]
+        if not len(candidatos):
+            return []
+        if len(candidatos) > CANDIDATOS_VERIFICADOS:
+            candidatos = candidatos[np.argpartition(-vezes, CANDIDATOS_VERIFICADOS - 1)[:CANDIDATOS_VERIFICADOS]]
+
+        procurados = np.zeros(len(self.brutos), dtype=bool)
+        procurados[conhecidos] = True
+        iguais = self._iguais(candidatos, procurados)
+        notas = iguais / (len(brutos) + self.tamanhos[candidatos] - iguais)
+        acima = np.flatnonzero(notas >= limiar)
+        if len(acima) > k:
+            acima = acima[np.argpartition(-notas[acima], k - 1)[:k]]
+        acima = acima[np.argsort(-notas[acima], kind='stable')]
+        return list(zip(self.ids[candidatos[acima]].tolist(), notas[acima].tolist()))
+
+# Mesmo texto normalizado do lado do banco (migração 5), para o índice GIN de trigramas
+_NOME_NO_BANCO = "nome_fornecedor_normalizado(razao_social || ' ' || COALESCE(nome_fantasia, ''))"
+_SEMELHANTES_NO_BANCO = f"""
+    SELECT m.posicao, f.id, f.nota
+    FROM unnest(CAST(:posicoes AS INTEGER[]), CAST(:textos AS TEXT[])) AS m(posicao, texto)
+    CROSS JOIN LATERAL (
+        SELECT id, similarity({_NOME_NO_BANCO}, m.texto) AS nota
+        FROM fornecedores
+        WHERE {_NOME_NO_BANCO} % m.texto {{filtro}}
+        ORDER BY nota DESC
+        LIMIT :k
+    ) f
+"""
+
+class IndiceFornecedores:
+    """token -> IDs dos fornecedores com esse token no nome, e os trigramas dos nomes"""
+
+    def __init__(self, trigramas_no_banco=False):
+        self._por_token = {}
+        self._tokens = {}
+        self._nomes = {}
+        self._matriz = None
+        self._trigramas_no_banco = trigramas_no_banco
+        self._versao = None
+        self._carregado = False
+        self._trava = threading.Lock()
+
+    def _indexar(self, fornecedor_id, razao_social, nome_fantasia):
+        self._remover(fornecedor_id)
+        novos = frozenset(tokens(razao_social)) | frozenset(tokens(nome_fantasia))
+        self._tokens[fornecedor_id] = novos
+        for token in novos:
+            self._por_token.setdefault(token, set()).add(fornecedor_id)
+        if not self._trigramas_no_banco:
+            self._nomes[fornecedor_id] = texto_normalizado(f'{razao_social} {nome_fantasia or ""}')
+            self._matriz = None
+
+    def _remover(self, fornecedor_id):
+        if self._nomes.pop(fornecedor_id, None) is not None:
+            self._matriz = None
+        for token in self._tokens.pop(fornecedor_id, ()):
+            ids = self._por_token[token]
+            ids.discard(fornecedor_id)
+            if not ids:
+                del self._por_token[token]
+
+    def _sincronizar(self):
+        """Reconstrói o índice se a tabela fornecedores mudou por fora das rotas"""
+        versao = versoes(['fornecedores']).get('fornecedores')
+        with self._trava:
+            if self._carregado and versao == self._versao:
+                return
+            self._por_token, self._tokens, self._nomes, self._matriz = {}, {}, {}, None
+            for fornecedor_id, razao_social, nome_fantasia in db.session.execute(
+                select(Fornecedor.id, Fornecedor.razao_social, Fornecedor.nome_fantasia)
+            ):
+                self._indexar(fornecedor_id, razao_social, nome_fantasia)
+            self._versao, self._carregado = versao, True
+
+    def _gravado(self, alterar):
+        """Aplica `alterar` depois do commit de uma rota de fornecedores.
+
+        O commit incrementou a versão da tabela uma vez (ou nenhuma, se nada
+        mudou); se houve outra gravação no meio, o índice é reconstruído na
+        próxima consulta.
+        """
+        versao = versoes(['fornecedores']).get('fornecedores')
+        with self._trava:
+            if not self._carregado:
+                return
+            alterar()
+            if versao == self._versao or (versao and self._versao and versao[0] == self._versao[0] + 1):
+                self._versao = versao
+            else:
+                self._carregado = False
+
+    def atualizar(self, fornecedor):
+        self._gravado(lambda: self._indexar(fornecedor.id, fornecedor.razao_social, fornecedor.nome_fantasia))
+
+    def remover(self, fornecedor_id):
+        self._gravado(lambda: self._remover(fornecedor_id))
+
+    def citados(self, textos, entre=None):
+        """Para cada texto, {fornecedor_id: nota} dos fornecedores com algum token dele no
+        nome (só os de `entre`, se dado). A nota (0 a 1) pondera os tokens pelo IDF:
+        é a fração do peso do nome que o texto cita vezes a raridade do token citado
+        mais raro, então "comercial" ou "alimentos" sozinhos valem pouco e o nome
+        inteiro, ou um token que só aquele fornecedor tem, vale perto de 1.
+        """
+        self._sincronizar()
+        por_token = {}
+        pesos_nome = {}
+        resultado = []
+        with self._trava:
+            referencia = math.log1p(len(self._tokens))
+            for texto in textos:
+                pesos = {}
+                for token in tokens(texto):
+                    if token not in por_token:
+                        ids = self._por_token.get(token)
+                        if not ids:
+                            por_token[token] = ((), 0.0)
+                            continue
+                        por_token[token] = (ids & entre if entre is not None else set(ids), self._idf(token))
+                    ids, idf = por_token[token]
+                    for fornecedor_id in ids:
+                        soma, maior = pesos.get(fornecedor_id, (0.0, 0.0))
+                        pesos[fornecedor_id] = (soma + idf, max(maior, idf))
+                notas = {}
+                for fornecedor_id, (soma, maior) in pesos.items():
+                    if fornecedor_id not in pesos_nome:
+                        pesos_nome[fornecedor_id] = sum(self._idf(token) for token in self._tokens[fornecedor_id])
+                    notas[fornecedor_id] = soma / pesos_nome[fornecedor_id] * maior / referencia
+                resultado.append(notas)
+        return resultado
+
+    def _idf(self, token):
+        """IDF suavizado do token entre os nomes: log(1 + fornecedores / fornecedores com o token)"""
+        return math.log1p(len(self._tokens) / len(self._por_token[token]))
+
+    def com_nome(self, nome):
+        """IDs dos fornecedores com todos os tokens de `nome`; None se `nome` não tiver tokens"""
+        procurados = tokens(nome)
+        if not procurados:
+            return None
+        self._sincronizar()
+        with self._trava:
+            conjuntos = sorted((self._por_token.get(token, set()) for token in procurados), key=len)
+            return set(conjuntos[0]).intersection(*conjuntos[1:])
+
+    def semelhantes(self, textos, k=K_SEMELHANTES, entre=None, limiar=LIMIAR_SEMELHANCA):
+        """Para cada texto, [(fornecedor_id, nota)] dos até `k` fornecedores de nome mais
+        parecido, com nota (0 a 1) >= `limiar`, da maior para a menor (só os de `entre`, se dado)
+        """
+        normalizados = [texto_normalizado(texto) for texto in textos]
+        if self._trigramas_no_banco:
+            return self._semelhantes_no_banco(normalizados, k, entre, limiar)
+
+        self._sincronizar()
+        with self._trava:
+            if self._matriz is None:
+                self._matriz = _MatrizTrigramas(self._nomes)
+            matriz = self._matriz
+        permitidos = np.isin(matriz.ids, list(entre)) if entre is not None else None
+        por_texto = {}
+        resultado = []
+        for normalizado in normalizados:
+            if normalizado not in por_texto:
+                por_texto[normalizado] = matriz.semelhantes(normalizado, k, limiar, permitidos)
+            resultado.append(por_texto[normalizado])
+        return resultado
+
+    def _semelhantes_no_banco(self, normalizados, k, entre, limiar):
+        """pg_trgm: uma consulta para todos os textos distintos, com o índice GIN da migração 5"""
+        distintos = list(dict.fromkeys(texto for texto in normalizados if texto))
+        por_texto = {texto: [] for texto in distintos}
+        if distintos:
+            # O operador % usa este limiar; set_config(..., true) vale só para a transação atual
+            db.session.execute(text("SELECT set_config('pg_trgm.similarity_threshold', :limiar, true)"),
+                               {'limiar': str(limiar)})
+            consulta = text(_SEMELHANTES_NO_BANCO.format(filtro='AND id IN :entre' if entre is not None else ''))
+            parametros = {'posicoes': list(range(len(distintos))), 'textos': distintos, 'k': k}
+            if entre is not None:
+                consulta = consulta.bindparams(bindparam('entre', expanding=True))
+                parametros['entre'] = list(entre) or [0]
+            for posicao, fornecedor_id, nota in db.session.execute(consulta, parametros):
+                por_texto[distintos[posicao]].append((fornecedor_id, nota))
+        return [por_texto.get(texto, []) for texto in normalizados]
+
+def _trigramas_no_banco(engine):
+    """PostgreSQL com pg_trgm e a função da migração 5"""
+    if engine.dialect.name != 'postgresql':
+        return False
+    with engine.connect() as conexao:
+        return bool(conexao.execute(text(
+            "SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm') "
+            "AND to_regprocedure('nome_fornecedor_normalizado(text)') IS NOT NULL"
+        )).scalar())
+
+# Engine -> índice dos fornecedores daquele banco
+_indices = weakref.WeakKeyDictionary()
+_indices_trava = threading.Lock()
+
+def indice_fornecedores():
+    """Índice dos fornecedores do banco da sessão atual"""
+    engine = db.engine
+    with _indices_trava:
+        if engine not in _indices:
+            _indices[engine] = IndiceFornecedores(trigramas_no_banco=_trigramas_no_banco(engine))
+        return _indices[engine]
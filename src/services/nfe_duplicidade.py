@@ -0,0 +1,99 @@
+from src.models.financeiro import db, NotaFiscal, ArquivoNotaFiscal
+from sqlalchemy import select
+import hashlib
+import re
+import threading
+
+# O atributo Id do infNFe aparece logo no início do documento
+BYTES_CABECALHO = 4096
+_RE_CHAVE_ACESSO = re.compile(rb'''Id\s*=\s*["']NFe(\d{44})["']''')
+
+def extrair_chave_acesso(conteudo, limite=BYTES_CABECALHO):
+    """Lê a chave de acesso do atributo Id="NFe..." sem fazer o parse do XML"""
+    match = _RE_CHAVE_ACESSO.search(conteudo, 0, limite)
+    return match.group(1).decode('ascii') if match else None
+
+def hash_conteudo(conteudo):
+    return hashlib.sha256(conteudo).hexdigest()
+
+class IndiceDuplicidadeNFe:
+    """Índice em memória das chaves de acesso e hashes de arquivos já importados.
+
+    Carregado do banco no primeiro uso. As chaves ficam como int e os hashes
+    como bytes para caber em memória mesmo com milhões de notas. Um acerto no
+    índice é confirmado por uma consulta pela chave única antes de recusar o
+    arquivo, porque outro processo pode ter excluído a nota.
+    """
+
+    def __init__(self):
+        self._chaves = set()
+        self._hashes = set()
+        self._carregado = False
+        self._lock = threading.Lock()
+
+    def _carregar(self):
+        with self._lock:
+            if self._carregado:
+                return
+            self._chaves = {
+                int(chave) for chave in db.session.execute(select(NotaFiscal.chave_acesso)).scalars()
+                if chave and chave.isdigit()
+            }
+            self._hashes = {
+                bytes.fromhex(hash_sha256)
+                for hash_sha256 in db.session.execute(select(ArquivoNotaFiscal.hash_sha256)).scalars()
+            }
+            self._carregado = True
+
+    def invalidar(self):
+        with self._lock:
+            self._carregado = False
+            self._chaves = set()
+            self._hashes = set()
+
+    def registrar(self, chave_acesso, hash_sha256=None):
+        if not self._carregado:
+            return
+        if chave_acesso and chave_acesso.isdigit():
+            self._chaves.add(int(chave_acesso))
+        if hash_sha256:
+            self._hashes.add(bytes.fromhex(hash_sha256))
+
+    def remover(self, chave_acesso, hashes=()):
+        if chave_acesso and chave_acesso.isdigit():
+            self._chaves.discard(int(chave_acesso))
+        for hash_sha256 in hashes:
+            self._hashes.discard(bytes.fromhex(hash_sha256))
+
+    def buscar(self, chave_acesso, hash_sha256):
+        """Retorna o ID da nota já importada para a chave/hash, ou None"""
+        self._carregar()
+
+        if hash_sha256 and bytes.fromhex(hash_sha256) in self._hashes:
+            nota_fiscal_id = db.session.execute(
+                select(ArquivoNotaFiscal.nota_fiscal_id).where(ArquivoNotaFiscal.hash_sha256 == hash_sha256)
+            ).scalar()
+            if nota_fiscal_id:
+                return nota_fiscal_id
+            self._hashes.discard(bytes.fromhex(hash_sha256))
+
+        if chave_acesso and chave_acesso.isdigit() and int(chave_acesso) in self._chaves:
+            nota_fiscal_id = db.session.execute(
+                select(NotaFiscal.id).where(NotaFiscal.chave_acesso == chave_acesso)
+            ).scalar()
+            if nota_fiscal_id:
+                return nota_fiscal_id
+            self._chaves.discard(int(chave_acesso))
+
+        return None
+
+indice_duplicidade = IndiceDuplicidadeNFe()
+
+def verificar_duplicidade(conteudo):
+    """Pré-verificação de reenvio a partir dos bytes do arquivo, antes de qualquer parse.
+
+    Retorna (chave_acesso, hash_sha256, nota_fiscal_id existente ou None).
+    """
+    chave_acesso = extrair_chave_acesso(conteudo)
+    hash_sha256 = hash_conteudo(conteudo)
+    return chave_acesso, hash_sha256, indice_duplicidade.buscar(chave_acesso, hash_sha256)
@@ -0,0 +1,341 @@
+from lxml import etree
+from collections import namedtuple
+from datetime import datetime
+from decimal import Decimal
+import io
+import re
+
+NFE_NS = 'http://www.portalfiscal.inf.br/nfe'
+
+def _tag(nome):
+    return f'{{{NFE_NS}}}{nome}'
+
+TAG_INF_NFE = _tag('infNFe')
+TAG_IDE = _tag('ide')
+TAG_EMIT = _tag('emit')
+TAG_DET = _tag('det')
+TAG_ICMS_TOT = _tag('ICMSTot')
+TAG_DUP = _tag('dup')
+TAG_INF_ADIC = _tag('infAdic')
+TAG_SIGNATURE = '{http://www.w3.org/2000/09/xmldsig#}Signature'
+
+# Elementos que o parser precisa ver; o restante é descartado junto com o pai
+_TAGS_STREAM = (
+    TAG_INF_NFE, TAG_IDE, TAG_EMIT, TAG_DET, TAG_ICMS_TOT, TAG_DUP,
+    TAG_INF_ADIC, TAG_SIGNATURE
+)
+
+def _liberar(elem):
+    """Libera o elemento já processado e os irmãos anteriores para manter a memória constante"""
+    elem.clear()
+    parent = elem.getparent()
+    if parent is not None:
+        while elem.getprevious() is not None:
+            del parent[0]
+
+# Conversores
+
+def texto(valor):
+    return valor
+
+def decimal(valor):
+    return Decimal(valor)
+
+def converter_data_emissao(data_emissao_str):
+    """Converte dhEmi da NF-e, descartando o fuso horário"""
+    if not data_emissao_str:
+        return None
+    try:
+        data_emissao_str = data_emissao_str.split('-03:00')[0].split('+')[0]
+        return datetime.fromisoformat(data_emissao_str.replace('T', ' '))
+    except ValueError:
+        return None
+
+def converter_data_vencimento(data_venc_str):
+    if not data_venc_str:
+        return None
+    try:
+        return datetime.strptime(data_venc_str, '%Y-%m-%d').date()
+    except ValueError:
+        return None
+
+def formatar_cnpj_nfe(cnpj):
+    cnpj_limpo = re.sub(r'[^0-9]', '', cnpj or '')
+    if len(cnpj_limpo) == 14:
+        return f"{cnpj_limpo[:2]}.{cnpj_limpo[2:5]}.{cnpj_limpo[5:8]}/{cnpj_limpo[8:12]}-{cnpj_limpo[12:14]}"
+    return ''
+
+class Campo(namedtuple('Campo', 'nome caminho conversor padrao')):
+    """Campo extraído da NF-e: nome no dicionário, caminho relativo ao bloco, conversor e valor padrão"""
+
+class Esquema:
+    """Tabela de campos compilada, no import, em um despachante por tag.
+
+    A extração percorre os filhos do bloco uma única vez e consulta o
+    despachante (tag -> campo, ou sub-despachante para caminhos como
+    'enderEmit/xMun'). Com `descendentes=True` o caminho é só o nome do
+    elemento e a busca vale em qualquer profundidade (primeira ocorrência).
+    """
+
+    def __init__(self, campos, descendentes=False):
+        self.campos = tuple(campos)
+        self.descendentes = descendentes
+        self.padroes = {campo.nome: campo.padrao for campo in self.campos}
+        self.despachante = {}
+
+        for campo in self.campos:
+            partes = campo.caminho.split('/')
+            if descendentes and len(partes) > 1:
+                raise ValueError(f"Caminho aninhado em esquema por descendentes: {campo.caminho}")
+            nivel = self.despachante
+            for parte in partes[:-1]:
+                nivel = nivel.setdefault(_tag(parte), {})
+            nivel[_tag(partes[-1])] = campo
+
+    def extrair(self, elem):
+        dados = dict(self.padroes)
+        if elem is None:
+            return dados
+        if self.descendentes:
+            encontrados = set()
+            for filho in elem.iter(*self.despachante):
+                campo = self.despachante[filho.tag]
+                if campo.nome not in encontrados:
+                    dados[campo.nome] = campo.conversor(filho.text)
+                    encontrados.add(campo.nome)
+        else:
+            self._extrair_nivel(elem, self.despachante, dados)
+        return dados
+
+    def _extrair_nivel(self, elem, despachante, dados):
+        for filho in elem:
+            entrada = despachante.get(filho.tag)
+            if entrada is None:
+                continue
+            if isinstance(entrada, dict):
+                self._extrair_nivel(filho, entrada, dados)
+            else:
+                dados[entrada.nome] = entrada.conversor(filho.text)
+
+# Esquemas de extração: campo -> caminho -> conversor (-> padrão)
+
+ESQUEMA_IDE = Esquema([
+    Campo('numero', 'nNF', texto, ''),
+    Campo('serie', 'serie', texto, ''),
+    Campo('data_emissao', 'dhEmi', converter_data_emissao, None),
+    Campo('natureza_operacao', 'natOp', texto, ''),
+])
+
+ESQUEMA_EMIT = Esquema([
+    Campo('cnpj', 'CNPJ', formatar_cnpj_nfe, ''),
+    Campo('razao_social', 'xNome', texto, ''),
+    Campo('nome_fantasia', 'xFant', texto, ''),
+    Campo('inscricao_estadual', 'IE', texto, ''),
+    Campo('logradouro', 'enderEmit/xLgr', texto, ''),
+    Campo('numero_endereco', 'enderEmit/nro', texto, ''),
+    Campo('complemento', 'enderEmit/xCpl', texto, ''),
+    Campo('bairro', 'enderEmit/xBairro', texto, ''),
+    Campo('cidade', 'enderEmit/xMun', texto, ''),
+    Campo('uf', 'enderEmit/UF', texto, ''),
+    Campo('cep', 'enderEmit/CEP', texto, ''),
+    Campo('telefone', 'enderEmit/fone', texto, ''),
+])
+
+ESQUEMA_PROD = Esquema([
+    Campo('codigo_produto', 'cProd', texto, ''),
+    Campo('descricao', 'xProd', texto, ''),
+    Campo('ncm', 'NCM', texto, ''),
+    Campo('cfop', 'CFOP', texto, ''),
+    Campo('unidade', 'uCom', texto, ''),
+    Campo('quantidade', 'qCom', decimal, Decimal('0')),
+    Campo('valor_unitario', 'vUnCom', decimal, Decimal('0')),
+    Campo('valor_total', 'vProd', decimal, Decimal('0')),
+    Campo('valor_desconto', 'vDesc', decimal, Decimal('0')),
+])
+
+# Os grupos de imposto variam por CST (ICMS00, ICMS20, PISAliq...), por isso a busca é por descendentes
+ESQUEMA_IMPOSTO_ITEM = Esquema([
+    Campo('valor_icms', 'vICMS', decimal, Decimal('0')),
+    Campo('valor_ipi', 'vIPI', decimal, Decimal('0')),
+    Campo('valor_pis', 'vPIS', decimal, Decimal('0')),
+    Campo('valor_cofins', 'vCOFINS', decimal, Decimal('0')),
+], descendentes=True)
+
+ESQUEMA_ICMS_TOT = Esquema([
+    Campo('valor_total', 'vNF', decimal, Decimal('0')),
+    Campo('valor_desconto', 'vDesc', decimal, Decimal('0')),
+    Campo('valor_produtos', 'vProd', decimal, Decimal('0')),
+    Campo('valor_frete', 'vFrete', decimal, Decimal('0')),
+    Campo('valor_seguro', 'vSeg', decimal, Decimal('0')),
+    Campo('valor_outras_despesas', 'vOutro', decimal, Decimal('0')),
+    Campo('valor_icms', 'vICMS', decimal, Decimal('0')),
+    Campo('valor_ipi', 'vIPI', decimal, Decimal('0')),
+    Campo('valor_pis', 'vPIS', decimal, Decimal('0')),
+    Campo('valor_cofins', 'vCOFINS', decimal, Decimal('0')),
+])
+
+ESQUEMA_DUP = Esquema([
+    Campo('numero', 'nDup', texto, ''),
+    Campo('data_vencimento', 'dVenc', converter_data_vencimento, None),
+    Campo('valor', 'vDup', decimal, Decimal('0')),
+])
+
+TAG_PROD = _tag('prod')
+TAG_IMPOSTO = _tag('imposto')
+
+def _cabecalho(inf_nfe, ide):
+    dados = ESQUEMA_IDE.extrair(ide)
+    dados['chave_acesso'] = inf_nfe.get('Id', '').replace('NFe', '')
+    return dados
+
+def _fornecedor(emit):
+    dados = ESQUEMA_EMIT.extrair(emit)
+    tem_endereco = emit.find(_tag('enderEmit')) is not None
+    complemento = dados.pop('complemento')
+    bairro = dados.pop('bairro')
+    endereco = f"{dados.pop('logradouro')}, {dados.pop('numero_endereco')}"
+    if complemento:
+        endereco += f", {complemento}"
+    if bairro:
+        endereco += f", {bairro}"
+    dados['endereco'] = endereco if tem_endereco else ''
+    return dados
+
+def _item(det):
+    prod = det.find(TAG_PROD)
+    if prod is None:
+        return None
+
+    dados = {'numero_item': int(det.get('nItem', 0))}
+    dados.update(ESQUEMA_PROD.extrair(prod))
+    dados.update(ESQUEMA_IMPOSTO_ITEM.extrair(det.find(TAG_IMPOSTO)))
+    return dados
+
+def _totais(icms_tot):
+    dados = ESQUEMA_ICMS_TOT.extrair(icms_tot)
+    dados['valor_liquido'] = dados['valor_total']
+    return dados
+
+def _duplicata(dup):
+    return ESQUEMA_DUP.extrair(dup)
+
+def _dados_vazios():
+    dados = {
+        'numero': '',
+        'serie': '',
+        'chave_acesso': '',
+        'data_emissao': None,
+        'natureza_operacao': '',
+        'valor_liquido': Decimal('0'),
+        'fornecedor': None,
+        'itens': [],
+        'duplicatas': []
+    }
+    dados.update(ESQUEMA_ICMS_TOT.padroes)
+    return dados
+
+def iterar_nfe(source):
+    """Percorre o XML da NF-e em streaming (iterparse), liberando cada bloco já lido.
+
+    Gera tuplas (tipo, dados) com tipo em 'cabecalho', 'fornecedor', 'item',
+    'totais' e 'duplicata', na ordem em que aparecem no documento. `source`
+    pode ser um caminho, um arquivo aberto em modo binário ou os bytes do XML.
+    """
+    if isinstance(source, str):
+        source = source.encode('utf-8')
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+
+    encontrou_inf_nfe = False
+
+    contexto = etree.iterparse(
+        source, events=('end',), tag=_TAGS_STREAM,
+        resolve_entities=False, no_network=True, huge_tree=True
+    )
+    for _, elem in contexto:
+        tag = elem.tag
+        if tag == TAG_DET:
+            item = _item(elem)
+            if item is not None:
+                yield 'item', item
+        elif tag == TAG_DUP:
+            yield 'duplicata', _duplicata(elem)
+        elif tag == TAG_IDE:
+            yield 'cabecalho', _cabecalho(elem.getparent(), elem)
+        elif tag == TAG_EMIT:
+            yield 'fornecedor', _fornecedor(elem)
+        elif tag == TAG_ICMS_TOT:
+            yield 'totais', _totais(elem)
+        elif tag == TAG_INF_NFE:
+            encontrou_inf_nfe = True
+            continue
+
+        _liberar(elem)
+
+    if not encontrou_inf_nfe:
+        raise ValueError("XML inválido: elemento infNFe não encontrado")
+
+def processar_xml_nfe_stream(source):
+    """Versão em streaming de processar_xml_nfe, com o mesmo formato de retorno"""
+    try:
+        dados = _dados_vazios()
+
+        for tipo, valor in iterar_nfe(source):
+            if tipo == 'item':
+                dados['itens'].append(valor)
+            elif tipo == 'duplicata':
+                dados['duplicatas'].append(valor)
+            elif tipo == 'fornecedor':
+                dados['fornecedor'] = valor
+            else:
+                dados.update(valor)
+
+        if dados['fornecedor'] is None:
+            raise ValueError("elemento emit não encontrado")
+
+        return dados
+
+    except Exception as e:
+        raise ValueError(f"Erro ao processar XML: {str(e)}")
+
+def processar_xml_nfe(xml_content):
+    """Processa XML da NFe (documento inteiro em memória) e extrai dados relevantes.
+
+    As rotas e a ingestão usam processar_xml_nfe_stream; esta versão fica só
+    como referência dos benchmarks (bench_nfe_parser, bench_persistencia_nfe).
+    """
+    try:
+        if isinstance(xml_content, str):
+            xml_content = xml_content.encode('utf-8')
+
+        parser = etree.XMLParser(resolve_entities=False, no_network=True, huge_tree=True)
+        root = etree.fromstring(xml_content, parser)
+
+        inf_nfe = next(root.iter(TAG_INF_NFE), None)
+        if inf_nfe is None:
+            raise ValueError("XML inválido: elemento infNFe não encontrado")
+
+        emit = inf_nfe.find(TAG_EMIT)
+        if emit is None:
+            raise ValueError("elemento emit não encontrado")
+
+        dados = _dados_vazios()
+        dados.update(_cabecalho(inf_nfe, inf_nfe.find(TAG_IDE)))
+        dados['fornecedor'] = _fornecedor(emit)
+
+        icms_tot = inf_nfe.find(f'{_tag("total")}/{TAG_ICMS_TOT}')
+        if icms_tot is not None:
+            dados.update(_totais(icms_tot))
+
+        for det in inf_nfe.iterfind(TAG_DET):
+            item = _item(det)
+            if item is not None:
+                dados['itens'].append(item)
+
+        for dup in inf_nfe.iterfind(f'{_tag("cobr")}/{TAG_DUP}'):
+            dados['duplicatas'].append(_duplicata(dup))
+
+        return dados
+
+    except Exception as e:
+        raise ValueError(f"Erro ao processar XML: {str(e)}")
@@ -0,0 +1,148 @@
+from src.models.financeiro import db, NotaFiscal, ItemNotaFiscal, Fornecedor, ContaPagar, TipoDespesa, ArquivoNotaFiscal
+from src.services.busca import sincronizar_busca
+from src.services.resumo_financeiro import contabilizar_contas
+from sqlalchemy import insert, select
+
+def _suporta_returning():
+    return db.session.get_bind().dialect.insert_returning
+
+def _inserir_retornando_id(modelo, valores):
+    """INSERT de uma linha devolvendo o ID (RETURNING quando o banco suporta)"""
+    if _suporta_returning():
+        return db.session.execute(insert(modelo).values(**valores).returning(modelo.id)).scalar_one()
+    resultado = db.session.execute(insert(modelo).values(**valores))
+    return resultado.inserted_primary_key[0]
+
+def _obter_ou_criar_fornecedor(dados_fornecedor):
+    """Retorna (fornecedor_id, criado)"""
+    if not dados_fornecedor['cnpj']:
+        raise ValueError('Dados do fornecedor inválidos')
+
+    fornecedor_id = db.session.execute(
+        select(Fornecedor.id).where(Fornecedor.cnpj == dados_fornecedor['cnpj'])
+    ).scalar()
+    if fornecedor_id:
+        return fornecedor_id, False
+
+    return _inserir_retornando_id(Fornecedor, {
+        'cnpj': dados_fornecedor['cnpj'],
+        'razao_social': dados_fornecedor['razao_social'],
+        'nome_fantasia': dados_fornecedor['nome_fantasia'],
+        'endereco': dados_fornecedor['endereco'],
+        'cidade': dados_fornecedor['cidade'],
+        'uf': dados_fornecedor['uf'],
+        'cep': dados_fornecedor['cep'],
+        'telefone': dados_fornecedor['telefone'],
+        'inscricao_estadual': dados_fornecedor['inscricao_estadual']
+    }), True
+
+def _obter_ou_criar_tipo_fornecedores():
+    tipo_despesa_id = db.session.execute(
+        select(TipoDespesa.id).where(TipoDespesa.nome == 'Fornecedores')
+    ).scalar()
+    if tipo_despesa_id:
+        return tipo_despesa_id
+
+    return _inserir_retornando_id(TipoDespesa, {
+        'nome': 'Fornecedores',
+        'descricao': 'Contas a pagar de fornecedores'
+    })
+
+def salvar_nota_fiscal(dados_nfe, nome_arquivo, hash_arquivo=None):
+    """Persiste a nota fiscal processada, seus itens e as contas a pagar das duplicatas.
+
+    Usa INSERTs em massa (um executemany por tabela) em vez de um objeto ORM
+    por linha. Com `hash_arquivo`, registra o hash do XML para a detecção de
+    reenvio. Não faz commit: quem chama controla a transação. Retorna
+    (nota_fiscal_id, ids das contas a pagar criadas).
+    """
+    fornecedor_id, fornecedor_criado = _obter_ou_criar_fornecedor(dados_nfe['fornecedor'])
+
+    nota_fiscal_id = _inserir_retornando_id(NotaFiscal, {
+        'numero': dados_nfe['numero'],
+        'serie': dados_nfe['serie'],
+        'chave_acesso': dados_nfe['chave_acesso'],
+        'fornecedor_id': fornecedor_id,
+        'data_emissao': dados_nfe['data_emissao'],
+        'valor_total': dados_nfe['valor_total'],
+        'valor_desconto': dados_nfe['valor_desconto'],
+        'valor_produtos': dados_nfe['valor_produtos'] or dados_nfe['valor_total'] - dados_nfe['valor_desconto'],
+        'valor_frete': dados_nfe['valor_frete'],
+        'valor_seguro': dados_nfe['valor_seguro'],
+        'valor_outras_despesas': dados_nfe['valor_outras_despesas'],
+        'valor_icms': dados_nfe['valor_icms'],
+        'valor_ipi': dados_nfe['valor_ipi'],
+        'valor_pis': dados_nfe['valor_pis'],
+        'valor_cofins': dados_nfe['valor_cofins'],
+        'arquivo_xml': nome_arquivo,
+        'status': 'PROCESSADA'
+    })
+
+    if hash_arquivo:
+        db.session.execute(insert(ArquivoNotaFiscal).values(
+            nota_fiscal_id=nota_fiscal_id,
+            hash_sha256=hash_arquivo,
+            chave_acesso=dados_nfe['chave_acesso'],
+            nome_arquivo=nome_arquivo
+        ))
+
+    if dados_nfe['itens']:
+        db.session.execute(insert(ItemNotaFiscal), [
+            {
+                'nota_fiscal_id': nota_fiscal_id,
+                'codigo_produto': item['codigo_produto'],
+                'descricao': item['descricao'],
+                'ncm': item['ncm'],
+                'cfop': item['cfop'],
+                'unidade': item['unidade'],
+                'quantidade': item['quantidade'],
+                'valor_unitario': item['valor_unitario'],
+                'valor_total': item['valor_total'],
+                'valor_desconto': item['valor_desconto'],
+                'valor_icms': item['valor_icms'],
+                'valor_ipi': item['valor_ipi'],
+                'valor_pis': item['valor_pis'],
+                'valor_cofins': item['valor_cofins']
+            }
+            for item in dados_nfe['itens']
+        ])
+
+    contas_ids = []
+    if dados_nfe['duplicatas']:
+        tipo_despesa_id = _obter_ou_criar_tipo_fornecedores()
+        total_parcelas = len(dados_nfe['duplicatas'])
+        contas = [
+            {
+                'fornecedor_id': fornecedor_id,
+                'tipo_despesa_id': tipo_despesa_id,
+                'nota_fiscal_id': nota_fiscal_id,
+                'descricao': f"NF {dados_nfe['numero']}/{dados_nfe['serie']} - Parcela {i}",
+                'valor_original': dup['valor'],
+                'data_vencimento': dup['data_vencimento'],
+                'numero_parcela': i,
+                'total_parcelas': total_parcelas,
+                'numero_documento': dup['numero'],
+                'status': 'PENDENTE'
+            }
+            for i, dup in enumerate(dados_nfe['duplicatas'], 1)
+        ]
+
+        if _suporta_returning():
+            contas_ids = list(db.session.execute(insert(ContaPagar).returning(ContaPagar.id), contas).scalars())
+        else:
+            db.session.execute(insert(ContaPagar), contas)
+            contas_ids = list(db.session.execute(
+                select(ContaPagar.id).where(ContaPagar.nota_fiscal_id == nota_fiscal_id)
+            ).scalars())
+
+        # Idem para o resumo_financeiro dos dashboards
+        contabilizar_contas(contas_ids)
+
+    # INSERTs em massa não passam pelo after_flush: o índice de busca é atualizado aqui
+    sincronizar_busca({
+        'fornecedores': [fornecedor_id] if fornecedor_criado else [],
+        'notas_fiscais': [nota_fiscal_id],
+        'contas_pagar': contas_ids
+    })
+
+    return nota_fiscal_id, contas_ids
@@ -0,0 +1,83 @@
+from lxml import etree
+from functools import lru_cache
+import os
+import re
+import time
+
+# XSDs oficiais do leiaute, um subdiretório por versão: <DIRETORIO_XSD>/4.00/nfe_v4.00.xsd
+DIRETORIO_XSD = os.getenv(
+    'NFE_XSD_DIR',
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), 'schemas', 'nfe')
+)
+
+# Versão e elemento raiz são lidos do início do arquivo, sem parse
+BYTES_CABECALHO = 4096
+MAX_ERROS_REPORTADOS = 5
+_RE_VERSAO = re.compile(rb'''<(?:\w+:)?infNFe\b[^>]*?\bversao\s*=\s*["']([\d.]+)["']''')
+_RE_NFE_PROC = re.compile(rb'<(?:\w+:)?nfeProc\b')
+
+def detectar_versao(conteudo, limite=BYTES_CABECALHO):
+    """Versão do leiaute (atributo versao do infNFe), ou None"""
+    match = _RE_VERSAO.search(conteudo, 0, limite)
+    return match.group(1).decode('ascii') if match else None
+
+def _arquivo_xsd(conteudo, versao):
+    """XSD de entrada: procNFe para notas autorizadas (nfeProc), nfe para a NFe pura"""
+    if _RE_NFE_PROC.search(conteudo, 0, BYTES_CABECALHO):
+        return f'procNFe_v{versao}.xsd'
+    return f'nfe_v{versao}.xsd'
+
+@lru_cache(maxsize=None)
+def carregar_esquema(versao, arquivo):
+    """Compila o XSD uma única vez por processo; None se não estiver disponível localmente"""
+    caminho = os.path.join(DIRETORIO_XSD, versao, arquivo)
+    if not os.path.isfile(caminho):
+        return None
+    # Os includes/imports do XSD são resolvidos relativos ao próprio arquivo
+    return etree.XMLSchema(etree.parse(caminho))
+
+@lru_cache(maxsize=None)
+def xsds_instalados():
+    """Há algum XSD em DIRETORIO_XSD (o repositório traz só o README do diretório)"""
+    for _, _, arquivos in os.walk(DIRETORIO_XSD):
+        if any(arquivo.lower().endswith('.xsd') for arquivo in arquivos):
+            return True
+    return False
+
+def _parser_seguro():
+    return etree.XMLParser(resolve_entities=False, no_network=True, huge_tree=True)
+
+def validar_nfe(conteudo):
+    """Valida o XML da NF-e contra o XSD da sua versão de leiaute.
+
+    Retorna um dict com versao, validado e tempo_ms (tempo que a validação
+    adicionou). Sem XSD local para a versão, retorna validado=False e o motivo.
+    Lança ValueError listando as primeiras violações quando o XML não é conforme,
+    ou quando não tem a versão do leiaute e há XSDs instalados para validá-lo.
+    """
+    if isinstance(conteudo, str):
+        conteudo = conteudo.encode('utf-8')
+
+    versao = detectar_versao(conteudo)
+    if not versao and not xsds_instalados():
+        # Nenhum esquema seria aplicado: o XML segue para o parser como antes da validação
+        return {'versao': None, 'validado': False, 'tempo_ms': 0.0, 'motivo': 'Nenhum XSD de NF-e instalado'}
+    if not versao:
+        raise ValueError('XML não é uma NF-e: versão do leiaute (infNFe/@versao) não encontrada')
+
+    arquivo = _arquivo_xsd(conteudo, versao)
+    esquema = carregar_esquema(versao, arquivo)
+    if esquema is None:
+        return {'versao': versao, 'validado': False, 'tempo_ms': 0.0, 'motivo': f'XSD {arquivo} não disponível'}
+
+    inicio = time.perf_counter()
+    try:
+        documento = etree.fromstring(conteudo, _parser_seguro())
+    except etree.XMLSyntaxError as e:
+        raise ValueError(f'XML malformado: {str(e)}')
+
+    if not esquema.validate(documento):
+        erros = [f'linha {erro.line}: {erro.message}' for erro in list(esquema.error_log)[:MAX_ERROS_REPORTADOS]]
+        raise ValueError(f'XML não conforme ao leiaute NF-e {versao}: ' + '; '.join(erros))
+
+    return {'versao': versao, 'validado': True, 'tempo_ms': round((time.perf_counter() - inicio) * 1000, 3)}
@@ -0,0 +1,198 @@
+"""Leitura em streaming de extratos OFX (SGML do OFX 1.x e XML do OFX 2.x) com várias contas.
+
+ler_ofx(arquivo) lê o arquivo em blocos de TAMANHO_LEITURA bytes e entrega
+LoteTransacoes de até TAMANHO_LOTE transações, conta a conta: cada STMTRS
+(conta corrente) e CCSTMTRS (cartão de crédito) do arquivo vira uma
+sequência de lotes que compartilham a mesma ContaOFX. Só o bloco lido e o
+lote atual ficam em memória, então o consumo não cresce com o arquivo.
+
+No SGML do OFX 1.x os elementos folha não têm tag de fechamento
+(<TRNAMT>-10.00): o valor de um elemento é o texto entre a sua tag e a
+próxima, e as tags de fechamento só importam para os agregados (STMTTRN,
+STMTRS, CCSTMTRS).
+"""
+import codecs
+import re
+import sys
+from array import array
+from datetime import date
+from decimal import Decimal
+from html import unescape
+
+TAMANHO_LEITURA = 1 << 16
+TAMANHO_LOTE = 5000
+
+# Os bancos declaram CHARSET:1252 (ou nada) no cabeçalho SGML; no XML vale o encoding do prólogo
+CODIFICACOES = {'1252': 'cp1252', 'ISO-8859-1': 'latin-1', '8859-1': 'latin-1', 'UTF-8': 'utf-8', 'UTF8': 'utf-8'}
+
+_RE_ELEMENTO = re.compile(r'<([^<>]*)>([^<]*)')
+_RE_CODIFICACAO_SGML = re.compile(rb'^\s*(?:ENCODING|CHARSET)\s*:\s*([\w-]+)', re.MULTILINE)
+_RE_CODIFICACAO_XML = re.compile(rb'<\?xml[^>]*encoding\s*=\s*["\']([\w-]+)')
+_RE_VALOR = re.compile(r'[+-]?(\d*)(?:\.(\d*))?')
+
+EXTRATOS = {'STMTRS': 'CONTA', 'CCSTMTRS': 'CARTAO'}
+CAMPOS_CONTA = {'BANKID': 'banco_id', 'BRANCHID': 'agencia', 'ACCTID': 'conta', 'ACCTTYPE': 'tipo'}
+CAMPOS_TRANSACAO = frozenset(('TRNTYPE', 'DTPOSTED', 'TRNAMT', 'FITID', 'NAME', 'MEMO'))
+
+class ContaOFX:
+    """Conta de um STMTRS/CCSTMTRS; banco é o FI/ORG do SIGNON ou, sem ele, o BANKID"""
+    __slots__ = ('banco', 'banco_id', 'agencia', 'conta', 'tipo')
+
+    def __init__(self, banco, tipo):
+        self.banco = banco
+        self.banco_id = ''
+        self.agencia = ''
+        self.conta = ''
+        self.tipo = tipo
+
+    def to_dict(self):
+        return {
+            'banco': self.banco or self.banco_id,
+            'agencia': self.agencia,
+            'conta': self.conta,
+            'tipo': self.tipo
+        }
+
+class LoteTransacoes:
+    """Transações de uma conta em colunas compactas.
+
+    As datas ficam como ordinais e os valores como inteiros sem a vírgula
+    mais o expoente (-10.50 -> -1050, -2), de onde o Decimal sai exato. Os
+    tipos (DEBIT, CREDIT...) são internados. Iterar devolve tuplas
+    (data, valor, tipo, descricao, id_transacao).
+    """
+    __slots__ = ('conta', 'datas', 'inteiros', 'expoentes', 'tipos', 'descricoes', 'ids')
+
+    def __init__(self, conta):
+        self.conta = conta
+        self.datas = array('l')
+        self.inteiros = array('q')
+        self.expoentes = array('b')
+        self.tipos = []
+        self.descricoes = []
+        self.ids = []
+
+    def __len__(self):
+        return len(self.ids)
+
+    def adicionar(self, campos):
+        inteiro, expoente = _valor(campos.get('TRNAMT', ''))
+        self.datas.append(_data(campos.get('DTPOSTED', '')))
+        self.inteiros.append(inteiro)
+        self.expoentes.append(expoente)
+        self.tipos.append(sys.intern(campos.get('TRNTYPE', '')))
+        self.descricoes.append(campos.get('MEMO') or campos.get('NAME') or '')
+        self.ids.append(campos.get('FITID', ''))
+
+    def periodo(self):
+        return date.fromordinal(min(self.datas)), date.fromordinal(max(self.datas))
+
+    def __iter__(self):
+        for ordinal, inteiro, expoente, tipo, descricao, id_transacao in zip(
+            self.datas, self.inteiros, self.expoentes, self.tipos, self.descricoes, self.ids
+        ):
+            yield date.fromordinal(ordinal), Decimal(inteiro).scaleb(expoente), tipo, descricao, id_transacao
+
+def _data(texto):
+    """Data local do DTPOSTED (AAAAMMDD[HHMMSS[.XXX]][[-3:BRT]]), sem converter o fuso"""
+    try:
+        return date(int(texto[:4]), int(texto[4:6]), int(texto[6:8])).toordinal()
+    except ValueError:
+        raise ValueError(f'Data inválida no OFX: {texto!r}')
+
+def _valor(texto):
+    """TRNAMT como (inteiro, expoente); aceita vírgula decimal, que alguns bancos mandam"""
+    texto = texto.replace(' ', '')
+    if ',' in texto:
+        texto = texto.replace('.', '').replace(',', '.') if texto.rfind(',') > texto.rfind('.') else texto.replace(',', '')
+    correspondencia = _RE_VALOR.fullmatch(texto)
+    if not correspondencia or not (correspondencia.group(1) or correspondencia.group(2)):
+        raise ValueError(f'Valor inválido no OFX: {texto!r}')
+    decimais = correspondencia.group(2) or ''
+    return int(texto.replace('.', '') or 0), -len(decimais)
+
+def _codificacao(cabecalho):
+    """Codificação declarada no cabeçalho SGML (ENCODING, depois CHARSET) ou no prólogo XML"""
+    if cabecalho.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    xml = _RE_CODIFICACAO_XML.search(cabecalho)
+    if xml:
+        declaradas = [xml.group(1)]
+    elif cabecalho.lstrip().startswith(b'<?xml'):
+        return 'utf-8'
+    else:
+        declaradas = _RE_CODIFICACAO_SGML.findall(cabecalho)
+    for declarada in declaradas:
+        declarada = declarada.decode('ascii').upper()
+        if declarada in CODIFICACOES:
+            return CODIFICACOES[declarada]
+        try:
+            return codecs.lookup(declarada).name
+        except LookupError:
+            continue  # USASCII, NONE...
+    return 'cp1252'
+
+def _elementos(arquivo):
+    """(tag, texto até a próxima tag) de cada tag do arquivo binário `arquivo`"""
+    bloco = arquivo.read(TAMANHO_LEITURA)
+    decodificador = codecs.getincrementaldecoder(_codificacao(bloco[:4096]))(errors='replace')
+    pendente = ''
+    while True:
+        fim_do_arquivo = not bloco
+        texto = pendente + decodificador.decode(bloco, final=fim_do_arquivo)
+        # O último elemento do bloco pode continuar no próximo: fica pendente
+        limite = len(texto) if fim_do_arquivo else max(texto.rfind('<'), 0)
+        for correspondencia in _RE_ELEMENTO.finditer(texto, 0, limite):
+            yield correspondencia.group(1), correspondencia.group(2)
+        if fim_do_arquivo:
+            return
+        pendente = texto[limite:]
+        bloco = arquivo.read(TAMANHO_LEITURA)
+
+def ler_ofx(arquivo, tamanho_lote=TAMANHO_LOTE):
+    """Gera LoteTransacoes de cada conta do OFX `arquivo` (caminho ou arquivo binário)"""
+    if isinstance(arquivo, (str, bytes)) or hasattr(arquivo, '__fspath__'):
+        with open(arquivo, 'rb') as aberto:
+            yield from ler_ofx(aberto, tamanho_lote)
+        return
+
+    banco = ''
+    lote = None
+    transacao = None
+    for tag, texto in _elementos(arquivo):
+        tag = tag.strip().rstrip('/').upper()
+        if tag[:1] in ('?', '!'):
+            continue  # prólogo XML, instruções de processamento e comentários
+        if tag[:1] == '/':
+            tag = tag[1:]
+            if tag == 'STMTTRN' and transacao is not None:
+                lote.adicionar(transacao)
+                transacao = None
+                if len(lote) >= tamanho_lote:
+                    yield lote
+                    lote = LoteTransacoes(lote.conta)
+            elif tag in EXTRATOS and lote is not None:
+                if len(lote):
+                    yield lote
+                lote = None
+            continue
+
+        if transacao is not None:
+            if tag in CAMPOS_TRANSACAO:
+                valor = texto.strip()
+                transacao[tag] = unescape(valor) if '&' in valor else valor
+        elif tag == 'STMTTRN' and lote is not None:
+            transacao = {}
+        elif tag in EXTRATOS:
+            lote = LoteTransacoes(ContaOFX(banco, EXTRATOS[tag]))
+        elif lote is not None and tag in CAMPOS_CONTA:
+            setattr(lote.conta, CAMPOS_CONTA[tag], texto.strip())
+        elif tag == 'ORG':
+            banco = unescape(texto.strip())
+
+    # SGML truncado ou sem as tags de fechamento dos agregados
+    if lote is not None:
+        if transacao is not None:
+            lote.adicionar(transacao)
+        if len(lote):
+            yield lote
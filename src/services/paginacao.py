@@ -0,0 +1,76 @@
+from sqlalchemy import tuple_
+from datetime import date, datetime
+import base64
+import json
+
+PER_PAGE_MAXIMO = 100
+
+def _codificar_valor(valor):
+    if isinstance(valor, (date, datetime)):
+        return valor.isoformat()
+    return valor
+
+def _decodificar_valor(coluna, valor):
+    tipo = coluna.type.python_type
+    if tipo is datetime:
+        return datetime.fromisoformat(valor)
+    if tipo is date:
+        return date.fromisoformat(valor)
+    return tipo(valor)
+
+def codificar_cursor(valores):
+    """Cursor opaco com os valores das colunas de ordenação da última linha"""
+    dados = json.dumps([_codificar_valor(valor) for valor in valores], separators=(',', ':'))
+    return base64.urlsafe_b64encode(dados.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decodificar_cursor(cursor, colunas):
+    try:
+        dados = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        valores = json.loads(dados)
+        if len(valores) != len(colunas):
+            raise ValueError
+        return [_decodificar_valor(coluna, valor) for coluna, valor in zip(colunas, valores)]
+    except (ValueError, TypeError):
+        raise ValueError('Cursor de paginação inválido')
+
+def filtrar_keyset(query, colunas, valores=None, descendente=False):
+    """`query` (Query ou select) depois da linha com `valores` nas `colunas`, ordenada por elas"""
+    if valores is not None:
+        chave = tuple_(*colunas)
+        valores = tuple_(*valores)
+        query = query.filter(chave < valores if descendente else chave > valores)
+    return query.order_by(*[coluna.desc() if descendente else coluna.asc() for coluna in colunas])
+
+def paginar_keyset(query, colunas, cursor, per_page, contar=False, descendente=False):
+    """Paginação por cursor (keyset) sobre as colunas de ordenação.
+
+    `colunas` termina em uma coluna única (o id) para desempate. Em vez de
+    OFFSET, filtra pelas linhas depois da última linha da página anterior
+    (comparação de tupla), o que usa o índice e custa o mesmo em qualquer
+    profundidade. COUNT(*) só é feito com `contar`.
+    Retorna (itens, dict de paginação); `per_page` fora de 1..PER_PAGE_MAXIMO
+    lança ValueError.
+    """
+    if not 1 <= per_page <= PER_PAGE_MAXIMO:
+        raise ValueError(f'per_page deve estar entre 1 e {PER_PAGE_MAXIMO}')
+    total = query.order_by(None).count() if contar else None
+
+    valores = decodificar_cursor(cursor, colunas) if cursor else None
+    query = filtrar_keyset(query, colunas, valores, descendente)
+    itens = query.limit(per_page + 1).all()
+    has_next = len(itens) > per_page
+    itens = itens[:per_page]
+
+    next_cursor = None
+    if has_next:
+        ultimo = itens[-1]
+        next_cursor = codificar_cursor([getattr(ultimo, coluna.key) for coluna in colunas])
+
+    paginacao = {
+        'per_page': per_page,
+        'next_cursor': next_cursor,
+        'has_next': has_next
+    }
+    if contar:
+        paginacao['total'] = total
+    return itens, paginacao
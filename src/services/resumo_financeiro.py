@@ -0,0 +1,240 @@
+"""Tabela resumo_financeiro: totais pré-agregados para os dashboards.
+
+Cada linha é um balde (origem, status, mês, fornecedor, tipo de despesa) com
+quantidade e somas de valores, então os dashboards leem O(baldes) em vez de
+varrer contas e extratos:
+
+    CONTA        status da conta, mês do vencimento, fornecedor e tipo de despesa;
+                 valor = valor_original, valor_pago = valor_pago
+    EXTRATO      status do extrato, mês da transação; valor = soma dos débitos
+    CONCILIACAO  tipo da conciliação (AUTOMATICA/MANUAL), mês da conciliação
+
+Nas origens sem fornecedor/tipo de despesa essas chaves valem 0.
+
+As alterações via ORM são aplicadas no after_flush da sessão, na mesma
+transação (subtrai a contribuição antiga da linha e soma a nova). Os caminhos
+que gravam com INSERT/UPDATE em massa chamam contabilizar_contas ou
+mover_status_contas; se o resumo divergir (cargas fora da aplicação),
+reconstrua:
+
+    python -m src.services.resumo_financeiro
+"""
+import os
+import sys
+
+# DON'T CHANGE THIS !!!
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+from sqlalchemy import Date, Numeric, bindparam, delete, event, inspect, text
+from sqlalchemy.orm import Session
+from src.models.financeiro import db, ContaPagar, ExtratoBancario, ConciliacaoBancaria, ResumoFinanceiro
+
+TAMANHO_BLOCO = 500
+
+# Primeiro dia do mês de uma coluna de data, em SQL de cada dialeto
+_MES = {
+    'sqlite': "date({coluna}, 'start of month')",
+    'postgresql': "CAST(date_trunc('month', {coluna}) AS DATE)"
+}
+
+# Contribuição de cada origem, agregada no próprio banco (reconstrução e INSERTs em massa)
+_AGREGADOS = {
+    'CONTA': """
+        SELECT 'CONTA' AS origem, COALESCE(status, 'PENDENTE') AS status, {mes} AS mes,
+               fornecedor_id, tipo_despesa_id, COUNT(*) AS quantidade,
+               COALESCE(SUM(valor_original), 0) AS valor, COALESCE(SUM(valor_pago), 0) AS valor_pago
+        FROM contas_pagar {filtro}
+        GROUP BY COALESCE(status, 'PENDENTE'), {mes}, fornecedor_id, tipo_despesa_id
+    """,
+    'EXTRATO': """
+        SELECT 'EXTRATO' AS origem, COALESCE(status, 'NAO_CONCILIADO') AS status, {mes} AS mes,
+               0 AS fornecedor_id, 0 AS tipo_despesa_id, COUNT(*) AS quantidade,
+               COALESCE(SUM(CASE WHEN valor < 0 THEN valor ELSE 0 END), 0) AS valor, 0 AS valor_pago
+        FROM extratos_bancarios
+        GROUP BY COALESCE(status, 'NAO_CONCILIADO'), {mes}
+    """,
+    'CONCILIACAO': """
+        SELECT 'CONCILIACAO' AS origem, tipo_conciliacao AS status, {mes} AS mes,
+               0 AS fornecedor_id, 0 AS tipo_despesa_id, COUNT(*) AS quantidade,
+               0 AS valor, 0 AS valor_pago
+        FROM conciliacoes_bancarias
+        GROUP BY tipo_conciliacao, {mes}
+    """
+}
+_COLUNA_MES = {'CONTA': 'data_vencimento', 'EXTRATO': 'data_transacao', 'CONCILIACAO': 'data_conciliacao'}
+
+_SOMAR = """
+    INSERT INTO resumo_financeiro (origem, status, mes, fornecedor_id, tipo_despesa_id, quantidade, valor, valor_pago)
+    {origem}
+    ON CONFLICT (origem, status, mes, fornecedor_id, tipo_despesa_id) DO UPDATE SET
+        quantidade = resumo_financeiro.quantidade + excluded.quantidade,
+        valor = resumo_financeiro.valor + excluded.valor,
+        valor_pago = resumo_financeiro.valor_pago + excluded.valor_pago
+"""
+
+# Colunas de cada modelo que definem o balde e os valores somados
+_CAMPOS_RESUMO = {
+    ContaPagar: ('status', 'data_vencimento', 'fornecedor_id', 'tipo_despesa_id', 'valor_original', 'valor_pago'),
+    ExtratoBancario: ('status', 'data_transacao', 'valor'),
+    ConciliacaoBancaria: ('tipo_conciliacao', 'data_conciliacao'),
+}
+
+def _primeiro_dia(data):
+    return date(data.year, data.month, 1)
+
+def _decimal(valor):
+    return Decimal(str(valor)) if valor is not None else Decimal('0')
+
+def _balde(modelo, valores):
+    """(chave do balde, (valor, valor_pago)) de uma linha; None se ela não entra no resumo"""
+    if modelo is ContaPagar:
+        if valores['data_vencimento'] is None:
+            return None
+        chave = ('CONTA', valores['status'] or 'PENDENTE', _primeiro_dia(valores['data_vencimento']),
+                 valores['fornecedor_id'], valores['tipo_despesa_id'])
+        return chave, (_decimal(valores['valor_original']), _decimal(valores['valor_pago']))
+    if modelo is ExtratoBancario:
+        if valores['data_transacao'] is None:
+            return None
+        chave = ('EXTRATO', valores['status'] or 'NAO_CONCILIADO', _primeiro_dia(valores['data_transacao']), 0, 0)
+        return chave, (min(_decimal(valores['valor']), Decimal('0')), Decimal('0'))
+    if valores['data_conciliacao'] is None:
+        return None
+    chave = ('CONCILIACAO', valores['tipo_conciliacao'], _primeiro_dia(valores['data_conciliacao']), 0, 0)
+    return chave, (Decimal('0'), Decimal('0'))
+
+def _valores(obj, antigos):
+    """Valores atuais (ou os de antes do flush, com `antigos`) das colunas do resumo"""
+    estado = inspect(obj)
+    valores = {}
+    for campo in _CAMPOS_RESUMO[type(obj)]:
+        historico = estado.attrs[campo].history
+        if antigos and historico.has_changes():
+            valores[campo] = historico.deleted[0] if historico.deleted else None
+        else:
+            valores[campo] = getattr(obj, campo)
+    return valores
+
+def _foi_alterado(obj):
+    estado = inspect(obj)
+    return any(estado.attrs[campo].history.has_changes() for campo in _CAMPOS_RESUMO[type(obj)])
+
+def _acumular(deltas, modelo, valores, sinal):
+    balde = _balde(modelo, valores)
+    if balde is None:
+        return
+    chave, (valor, valor_pago) = balde
+    acumulado = deltas[chave]
+    acumulado[0] += sinal
+    acumulado[1] += sinal * valor
+    acumulado[2] += sinal * valor_pago
+
+def _aplicar(conexao, deltas):
+    """Soma os deltas {chave: [quantidade, valor, valor_pago]} aos baldes e apaga os que zeraram"""
+    linhas = [
+        {
+            'origem': chave[0], 'status': chave[1], 'mes': chave[2],
+            'fornecedor_id': chave[3], 'tipo_despesa_id': chave[4],
+            'quantidade': quantidade, 'valor': valor, 'valor_pago': valor_pago
+        }
+        for chave, (quantidade, valor, valor_pago) in deltas.items()
+        if quantidade or valor or valor_pago
+    ]
+    if not linhas:
+        return
+    valores = text(_SOMAR.format(origem=(
+        'VALUES (:origem, :status, :mes, :fornecedor_id, :tipo_despesa_id, :quantidade, :valor, :valor_pago)'
+    ))).bindparams(
+        bindparam('mes', type_=Date()),
+        bindparam('valor', type_=Numeric(15, 2)),
+        bindparam('valor_pago', type_=Numeric(15, 2))
+    )
+    conexao.execute(valores, linhas)
+    conexao.execute(text('DELETE FROM resumo_financeiro WHERE quantidade = 0'))
+
+def _somar_agregado(conexao, origem, filtro='', parametros=None, sinal=1, status=None):
+    """Soma (ou subtrai, com sinal=-1) ao resumo o agregado SQL de `origem`.
+
+    Com `status`, as linhas entram nos baldes desse status em vez do atual.
+    """
+    mes = _MES[conexao.dialect.name].format(coluna=_COLUNA_MES[origem])
+    agregado = _AGREGADOS[origem].format(mes=mes, filtro=filtro)
+    if sinal < 0 or status is not None:
+        sinal_sql = '-' if sinal < 0 else ''
+        agregado = f"""
+            SELECT origem, {':status_resumo' if status is not None else 'status'} AS status, mes,
+                   fornecedor_id, tipo_despesa_id, {sinal_sql}SUM(quantidade) AS quantidade,
+                   {sinal_sql}SUM(valor) AS valor, {sinal_sql}SUM(valor_pago) AS valor_pago
+            FROM ({agregado}) agregado
+            GROUP BY origem, {'' if status is not None else 'status, '}mes, fornecedor_id, tipo_despesa_id
+        """
+        if status is not None:
+            parametros = dict(parametros or {}, status_resumo=status)
+    # "WHERE true" evita a ambiguidade do INSERT ... SELECT ... ON CONFLICT no SQLite
+    consulta = text(_SOMAR.format(origem=f'SELECT * FROM ({agregado}) baldes WHERE true'))
+    if parametros and 'ids' in parametros:
+        consulta = consulta.bindparams(bindparam('ids', expanding=True))
+    conexao.execute(consulta, parametros or {})
+
+def contabilizar_contas(ids, sinal=1, conexao=None):
+    """Soma ao resumo (ou subtrai, com sinal=-1) as contas a pagar `ids` como estão no banco.
+
+    Para gravações fora do ORM: depois de um INSERT em massa, chame com
+    sinal=1; em um UPDATE/DELETE em massa, chame com sinal=-1 antes e, no
+    UPDATE, com sinal=1 depois. Roda na transação da sessão.
+    """
+    conexao = conexao or db.session.connection()
+    ids = sorted(set(ids))
+    for inicio in range(0, len(ids), TAMANHO_BLOCO):
+        _somar_agregado(conexao, 'CONTA', 'WHERE id IN :ids', {'ids': ids[inicio:inicio + TAMANHO_BLOCO]}, sinal)
+    if ids:
+        conexao.execute(text('DELETE FROM resumo_financeiro WHERE quantidade = 0'))
+
+def mover_status_contas(filtro, parametros, status, conexao=None):
+    """Passa para os baldes de `status` as contas que casam com `filtro` (SQL sobre contas_pagar).
+
+    Para UPDATEs de status em massa: chame antes do UPDATE, com o mesmo filtro.
+    """
+    conexao = conexao or db.session.connection()
+    _somar_agregado(conexao, 'CONTA', f'WHERE {filtro}', parametros, sinal=-1)
+    _somar_agregado(conexao, 'CONTA', f'WHERE {filtro}', parametros, status=status)
+    conexao.execute(text('DELETE FROM resumo_financeiro WHERE quantidade = 0'))
+
+def reconstruir_resumo(conexao=None):
+    """Recalcula todos os baldes a partir das tabelas (reparo de divergências)"""
+    conexao = conexao or db.session.connection()
+    conexao.execute(delete(ResumoFinanceiro))
+    for origem in _AGREGADOS:
+        _somar_agregado(conexao, origem)
+
+@event.listens_for(Session, 'after_flush')
+def _atualizar_apos_flush(session, flush_context):
+    deltas = defaultdict(lambda: [0, Decimal('0'), Decimal('0')])
+    for obj in session.new:
+        if type(obj) in _CAMPOS_RESUMO:
+            _acumular(deltas, type(obj), _valores(obj, antigos=False), 1)
+    for obj in session.dirty:
+        if type(obj) in _CAMPOS_RESUMO and _foi_alterado(obj):
+            _acumular(deltas, type(obj), _valores(obj, antigos=True), -1)
+            _acumular(deltas, type(obj), _valores(obj, antigos=False), 1)
+    for obj in session.deleted:
+        if type(obj) in _CAMPOS_RESUMO:
+            _acumular(deltas, type(obj), _valores(obj, antigos=True), -1)
+
+    if deltas:
+        _aplicar(session.connection(), deltas)
+
+def main():
+    from src.main import app
+
+    with app.app_context():
+        reconstruir_resumo()
+        db.session.commit()
+        baldes = db.session.execute(text('SELECT COUNT(*) FROM resumo_financeiro')).scalar()
+        print(f'Resumo financeiro reconstruído: {baldes} baldes')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,30 @@
+"""Marcação das contas vencidas: PENDENTE com vencimento passado vira VENCIDO.
+
+Um único UPDATE no banco, sem carregar as contas na sessão. Roda pela tarefa
+diária do agendador (src/agendador.py) e por POST /contas-pagar/atualizar-status.
+"""
+from datetime import date
+from sqlalchemy import update
+from src.models.financeiro import db, ContaPagar
+from src.services.resumo_financeiro import mover_status_contas
+
+def atualizacao_contas_vencidas(hoje):
+    """UPDATE das contas pendentes vencidas antes de `hoje`"""
+    return (
+        update(ContaPagar)
+        .where(ContaPagar.status == 'PENDENTE', ContaPagar.data_vencimento < hoje)
+        .values(status='VENCIDO')
+        .execution_options(synchronize_session=False)
+    )
+
+def marcar_contas_vencidas(hoje=None):
+    """Marca como VENCIDO as contas pendentes vencidas antes de `hoje`; retorna quantas mudaram.
+
+    Não faz commit: quem chama controla a transação.
+    """
+    hoje = hoje or date.today()
+
+    # UPDATE em massa não passa pelo after_flush: o resumo_financeiro é ajustado aqui, antes
+    mover_status_contas("status = 'PENDENTE' AND data_vencimento < :hoje", {'hoje': hoje.isoformat()}, 'VENCIDO')
+
+    return db.session.execute(atualizacao_contas_vencidas(hoje)).rowcount
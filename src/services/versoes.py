@@ -0,0 +1,100 @@
+"""Versão de cada tabela, para as requisições condicionais (ETag/Last-Modified).
+
+Todo INSERT, UPDATE ou DELETE executado pelas engines do SQLAlchemy (flush
+do ORM, gravações em massa e SQL textual) anota na conexão a tabela
+gravada. Depois do commit, quando a conexão volta ao pool, a versão de cada
+tabela anotada sobe uma vez em versoes_tabelas, numa transação curta e
+separada que trava as linhas em ordem alfabética. Assim a transação que
+gravou os dados não segura nenhuma trava de versoes_tabelas até o commit:
+gravações concorrentes nas mesmas tabelas não se enfileiram nem entram em
+deadlock por causa das versões. Se a transação for desfeita, as versões não
+mudam. Uma conexão mantida fora do pool por vários commits incrementa uma
+vez, ao ser devolvida. Alterações feitas direto no banco, fora da
+aplicação, não mudam as versões.
+"""
+import re
+import weakref
+from datetime import datetime
+from sqlalchemy import event, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import Pool
+from src.models.financeiro import db, VersaoTabela
+
+_RE_ESCRITA = re.compile(
+    r'^\s*(?:INSERT\s+(?:OR\s+\w+\s+)?INTO|UPDATE(?:\s+OR\s+\w+)?|DELETE\s+FROM)\s+"?(\w+)"?',
+    re.IGNORECASE
+)
+
+# Nomes vêm do regex (\w+) e a data é gerada aqui: seguros para ir no texto do SQL
+_INCREMENTAR = (
+    "INSERT INTO versoes_tabelas (tabela, versao, atualizado_em) VALUES ('{tabela}', 1, '{agora}') "
+    "ON CONFLICT (tabela) DO UPDATE SET versao = versoes_tabelas.versao + 1, "
+    "atualizado_em = excluded.atualizado_em"
+)
+
+# Engines onde a tabela versoes_tabelas já foi encontrada
+_engines_com_versoes = weakref.WeakKeyDictionary()
+
+def _tem_tabela_versoes(conexao):
+    if conexao.engine not in _engines_com_versoes:
+        if not conexao.dialect.has_table(conexao, VersaoTabela.__tablename__):
+            return False
+        _engines_com_versoes[conexao.engine] = True
+    return True
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _registrar_escrita(conexao, cursor, statement, parameters, context, executemany):
+    encontrado = _RE_ESCRITA.match(statement)
+    if not encontrado:
+        return
+    tabela = encontrado.group(1).lower()
+    if tabela == VersaoTabela.__tablename__ or not _tem_tabela_versoes(conexao):
+        return
+    conexao.info.setdefault('tabelas_gravadas', set()).add(tabela)
+
+@event.listens_for(Engine, 'commit')
+def _confirmar_tabelas(conexao):
+    gravadas = conexao.info.pop('tabelas_gravadas', None)
+    if gravadas:
+        conexao.info.setdefault('tabelas_versionadas', set()).update(gravadas)
+
+@event.listens_for(Engine, 'rollback')
+def _esquecer_tabelas(conexao):
+    # Savepoint desfeito não limpa nada: versão a mais só custa uma revalidação
+    conexao.info.pop('tabelas_gravadas', None)
+
+@event.listens_for(Pool, 'checkin')
+def _incrementar_versoes(conexao_dbapi, registro):
+    tabelas = registro.info.pop('tabelas_versionadas', None)
+    registro.info.pop('tabelas_gravadas', None)
+    if not tabelas or conexao_dbapi is None:
+        return
+    agora = datetime.utcnow().isoformat(sep=' ')
+    # Cursor próprio da DBAPI, fora dos eventos da Engine; ordem fixa das travas entre processos
+    cursor = conexao_dbapi.cursor()
+    try:
+        for tabela in sorted(tabelas):
+            cursor.execute(_INCREMENTAR.format(tabela=tabela, agora=agora))
+        conexao_dbapi.commit()
+    except Exception as e:
+        conexao_dbapi.rollback()
+        print(f"Falha ao incrementar versões de {sorted(tabelas)}: {e}")
+    finally:
+        cursor.close()
+
+@event.listens_for(Pool, 'checkout')
+def _nova_transacao_no_pool(conexao_dbapi, registro, proxy):
+    # Sobras de uma conexão invalidada antes da devolução ao pool
+    registro.info.pop('tabelas_gravadas', None)
+    registro.info.pop('tabelas_versionadas', None)
+
+def versoes(tabelas):
+    """{tabela: (versao, atualizado_em)} das `tabelas` já gravadas alguma vez"""
+    return {
+        tabela: (versao, atualizado_em)
+        for tabela, versao, atualizado_em in db.session.execute(
+            select(VersaoTabela.tabela, VersaoTabela.versao, VersaoTabela.atualizado_em).where(
+                VersaoTabela.tabela.in_(tabelas)
+            )
+        )
+    }
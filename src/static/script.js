@@ -271,7 +271,8 @@ async function buscarContasPagar(page = 1) {
             status: status,
             fornecedor_id: fornecedorId,
             data_inicio: dataInicio,
-            data_fim: dataFim
+            data_fim: dataFim,
+            fields: 'id,descricao,data_vencimento,valor_original,status,fornecedor.razao_social,tipo_despesa.nome'
         });
         
         const response = await fetch(`${API_BASE}/contas-pagar?${params}`);
@@ -435,7 +436,8 @@ async function buscarNotasFiscais(page = 1) {
         const params = new URLSearchParams({
             page: page,
             per_page: 20,
-            search: search
+            search: search,
+            fields: 'id,numero,serie,data_emissao,valor_total,status,fornecedor.razao_social'
         });
         
         const response = await fetch(`${API_BASE}/notas-fiscais?${params}`);